@@ -0,0 +1,86 @@
+"""
+Compare two benchmark reports from benchmarks/run_load.py
+
+    python -m benchmarks.compare baseline.json candidate.json --fail-above 10
+
+Prints throughput and latency percentiles per endpoint and stage with the relative change, and exits
+non-zero if any p95 got slower by more than --fail-above percent.
+"""
+
+import sys
+import json
+import argparse
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+
+def change(before: Optional[float], after: Optional[float]) -> Optional[float]:
+    """Relative change in percent, None if either side is missing or zero"""
+    if not before or after is None:
+        return None
+    return (after - before) / before * 100
+
+
+def rows(baseline: Dict[str, Any], candidate: Dict[str, Any]) -> Iterator[Tuple[str, str, Any, Any]]:
+    """(scope, metric, baseline value, candidate value) for every metric present in either report"""
+    yield "total", "rps", baseline.get("total_rps"), candidate.get("total_rps")
+
+    for endpoint in sorted(set(baseline["endpoints"]) | set(candidate["endpoints"])):
+        before = baseline["endpoints"].get(endpoint, {})
+        after = candidate["endpoints"].get(endpoint, {})
+        yield endpoint, "rps", before.get("rps"), after.get("rps")
+        for percentile in ("p50", "p95", "p99"):
+            yield (
+                endpoint, f"{percentile}_ms",
+                before.get("latency_ms", {}).get(percentile), after.get("latency_ms", {}).get(percentile)
+            )
+
+    for path in sorted(set(baseline["stages_ms"]) | set(candidate["stages_ms"])):
+        before_stages = baseline["stages_ms"].get(path, {})
+        after_stages = candidate["stages_ms"].get(path, {})
+        for stage in sorted(set(before_stages) | set(after_stages)):
+            for percentile in ("p50", "p95"):
+                yield (
+                    f"{path} {stage}", f"{percentile}_ms",
+                    before_stages.get(stage, {}).get(percentile), after_stages.get(stage, {}).get(percentile)
+                )
+
+    for percentile in ("p50", "p99", "max"):
+        yield (
+            "event_loop_lag", f"{percentile}_ms",
+            baseline["event_loop_lag_ms"].get(percentile), candidate["event_loop_lag_ms"].get(percentile)
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--fail-above", type=float, help="fail if a p95 latency grew by more than this percent")
+    args = parser.parse_args()
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.candidate) as f:
+        candidate = json.load(f)
+
+    print(f"baseline {baseline['meta'].get('commit')}  candidate {candidate['meta'].get('commit')}")
+    regressions = []
+    for scope, metric, before, after in rows(baseline, candidate):
+        delta = change(before, after)
+        delta_text = f"{delta:+.1f}%" if delta is not None else "-"
+        print(f"{scope:<55} {metric:<8} {str(before):>10} {str(after):>10} {delta_text:>9}")
+        if (
+            args.fail_above is not None and metric == "p95_ms" and scope != "event_loop_lag"
+            and delta is not None and delta > args.fail_above
+        ):
+            regressions.append(f"{scope} {metric} {delta:+.1f}%")
+
+    if regressions:
+        print(f"\n{len(regressions)} p95 regressions above {args.fail_above}%:")
+        for regression in regressions:
+            print(f"  {regression}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
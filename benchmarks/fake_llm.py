@@ -0,0 +1,72 @@
+"""
+Stand-in chat model for load tests
+Replaces the ChatOpenAI clients of LLMService with a model whose latency and output length follow
+configurable distributions, so runs exercise our own overhead without calling OpenAI
+"""
+
+import math
+import random
+import asyncio
+from typing import AsyncIterator, List
+
+from langchain_core.messages import AIMessage, AIMessageChunk
+
+from services.context_builder import TokenCounter
+
+
+class FakeChatModel:
+    """
+    Implements the parts of ChatOpenAI that LLMService uses (ainvoke and astream).
+
+    Each call waits a time-to-first-token drawn from a log-normal distribution (median ttft_ms,
+    spread ttft_sigma), then emits a uniformly drawn number of output tokens at tokens_per_second.
+    """
+
+    def __init__(
+        self,
+        ttft_ms: float = 400.0,
+        ttft_sigma: float = 0.5,
+        tokens_per_second: float = 60.0,
+        output_tokens: tuple = (60, 200),
+        error_rate: float = 0.0,
+        seed: int = 0
+    ):
+        self.ttft_ms = ttft_ms
+        self.ttft_sigma = ttft_sigma
+        self.tokens_per_second = tokens_per_second
+        self.output_tokens = output_tokens
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+        self._counter = TokenCounter("o200k_base")
+        self.calls = 0
+
+    def _ttft(self) -> float:
+        if self.ttft_ms <= 0:
+            return 0.0
+        return self._random.lognormvariate(math.log(self.ttft_ms / 1000), self.ttft_sigma)
+
+    def _plan(self, messages: list):
+        self.calls += 1
+        if self._random.random() < self.error_rate:
+            raise RuntimeError("Injected LLM failure")
+        output_tokens = self._random.randint(*self.output_tokens)
+        input_tokens = sum(self._counter.count(str(message.content)) for message in messages)
+        usage = {"input_tokens": input_tokens, "output_tokens": output_tokens, "total_tokens": input_tokens + output_tokens}
+        return output_tokens, usage
+
+    @staticmethod
+    def _words(count: int) -> List[str]:
+        return ["word "] * count
+
+    async def ainvoke(self, messages: list, **kwargs) -> AIMessage:
+        output_tokens, usage = self._plan(messages)
+        await asyncio.sleep(self._ttft() + output_tokens / self.tokens_per_second)
+        return AIMessage(content="".join(self._words(output_tokens)), usage_metadata=usage)
+
+    async def astream(self, messages: list, **kwargs) -> AsyncIterator[AIMessageChunk]:
+        output_tokens, usage = self._plan(messages)
+        await asyncio.sleep(self._ttft())
+        for word in self._words(output_tokens):
+            await asyncio.sleep(1 / self.tokens_per_second)
+            yield AIMessageChunk(content=word)
+        yield AIMessageChunk(content="", usage_metadata=usage)
@@ -0,0 +1,108 @@
+"""
+Synthetic patients, check-ins and chat histories for load tests, plus the database stand-ins:
+an in-memory database (mongomock-motor, no server needed) or a throwaway database on a local mongod
+"""
+
+import random
+import logging
+from datetime import datetime, timedelta, UTC
+from typing import List
+
+from bson import ObjectId
+
+import models.database_models as database_models
+from models.context_records import MORNING_FIELDS, EVENING_FIELDS
+
+logger = logging.getLogger(__name__)
+
+LEVELS = ("Very low", "Low", "Moderate", "High", "Very high")
+MESSAGES = (
+    "Slept badly again, mind racing about work.",
+    "Feeling a bit better today, went for a walk.",
+    "Overwhelmed by everything on my plate this week.",
+    "Had a good talk with a friend, felt lighter after.",
+    "Anxious before the meeting, couldn't focus.",
+)
+
+
+async def use_memory_database(database_name: str) -> None:
+    """Point the app at an in-memory database (requires mongomock-motor)"""
+    try:
+        from mongomock_motor import AsyncMongoMockClient
+    except ImportError:
+        raise SystemExit("The in-memory database needs mongomock-motor: pip install mongomock-motor")
+
+    # pymongo >= 4.11 passes sort= to bulk update operations, which mongomock doesn't accept yet
+    import mongomock.collection
+    add_update = mongomock.collection.BulkOperationBuilder.add_update
+
+    def add_update_without_sort(self, *args, sort=None, **kwargs):
+        return add_update(self, *args, **kwargs)
+
+    mongomock.collection.BulkOperationBuilder.add_update = add_update_without_sort
+
+    client = AsyncMongoMockClient()
+    database_models.mongodb.client = client
+    database_models.mongodb.database = client[database_name]
+
+
+async def use_local_database() -> None:
+    """Connect to the mongod at MONGODB_URL / MONGODB_DATABASE the way the app does on startup"""
+    await database_models.connect_to_mongo()
+
+
+async def drop_database() -> None:
+    await database_models.mongodb.client.drop_database(database_models.mongodb.database.name)
+
+
+async def seed_patients(patients: int, history_size: int, checkins_per_patient: int, seed: int = 0) -> List[str]:
+    """
+    Insert synthetic patients with check-ins and chat histories
+
+    Args:
+        patients: Number of patients
+        history_size: Chats per patient
+        checkins_per_patient: Check-ins per patient (alternating morning and evening)
+        seed: Random seed, so runs with the same arguments see the same data
+
+    Returns:
+        The patient IDs
+    """
+    rng = random.Random(seed)
+    db = database_models.get_database()
+    now = datetime.now(UTC)
+    patient_ids = []
+    checkins = []
+    chats = []
+
+    for _ in range(patients):
+        patient = ObjectId()
+        patient_ids.append(str(patient))
+
+        for index in range(checkins_per_patient):
+            checkin_type = "Morning" if index % 2 == 0 else "Evening"
+            fields = MORNING_FIELDS if checkin_type == "Morning" else EVENING_FIELDS
+            checkins.append({
+                "patient": patient,
+                "type": checkin_type,
+                "message": rng.choice(MESSAGES),
+                "totalPoints": rng.randint(0, 30),
+                "riskLevel": rng.choice(("Low", "Moderate", "High")),
+                "createdAt": now - timedelta(hours=12 * (checkins_per_patient - index)),
+                **{field: rng.choice(LEVELS) for _, field in fields}
+            })
+
+        for index in range(history_size):
+            chats.append({
+                "patient": patient,
+                "query": f"{rng.choice(MESSAGES)} ({index})",
+                "response": "That sounds hard. Try a slow breath in for four counts and out for six. " * 3,
+                "createdAt": now - timedelta(minutes=history_size - index)
+            })
+
+    if checkins:
+        await db.dailycheckins.insert_many(checkins)
+    if chats:
+        await db.chats.insert_many(chats)
+    logger.info("[BENCH] Seeded %s patients, %s check-ins, %s chats", patients, len(checkins), len(chats))
+    return patient_ids
@@ -0,0 +1,310 @@
+"""
+End-to-end load test for /agent/kay-bot, /agent/kay-bot/stream and /agent/chat/summary/{patient_id}
+
+Boots main.app in-process against a stand-in database seeded with synthetic patients and a fake
+LLM with configurable latency, drives concurrent load through an ASGI client and reports throughput,
+client latency, per-stage server latency (from the request traces) and event-loop lag as JSON.
+
+    python -m benchmarks.run_load --patients 200 --history 50 --concurrency 32 --duration 30 \\
+        --output bench.json
+
+Use --mongo local to run against a throwaway database on the mongod at MONGODB_URL instead of
+the in-memory one. Compare two runs with benchmarks/compare.py.
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import logging
+import argparse
+import platform
+import subprocess
+from collections import defaultdict
+from datetime import datetime, UTC
+from typing import Any, Dict, List, Optional
+
+ROOT_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_PATH not in sys.path:
+    sys.path.append(ROOT_PATH)
+
+# Settings are read on import; fill in what a benchmark doesn't need for real
+os.environ.setdefault("MONGODB_URL", "mongodb://localhost:27017")
+os.environ.setdefault("MONGODB_DATABASE", "kay_benchmark")
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+os.environ.setdefault("SERVER_API_KEY", "benchmark-key")
+# Every request's stage trace is collected
+os.environ["TRACE_SAMPLE_RATE"] = "1"
+# A few virtual clients hit each patient far more often than real patients do
+os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+
+import httpx
+
+from benchmarks.fake_llm import FakeChatModel
+from benchmarks.fixtures import use_memory_database, use_local_database, drop_database, seed_patients
+
+ENDPOINTS = ("kay_bot", "kay_bot_stream", "chat_summary")
+
+
+def percentiles(values: List[float]) -> Dict[str, Optional[float]]:
+    """p50/p95/p99/max of a list of milliseconds (nearest rank)"""
+    if not values:
+        return {"p50": None, "p95": None, "p99": None, "max": None}
+    ordered = sorted(values)
+
+    def rank(fraction: float) -> float:
+        return round(ordered[min(int(fraction * len(ordered)), len(ordered) - 1)], 2)
+
+    return {"p50": rank(0.50), "p95": rank(0.95), "p99": rank(0.99), "max": round(ordered[-1], 2)}
+
+
+class TraceCollector(logging.Handler):
+    """Collects the [TRACE] records logged by RequestTraceMiddleware"""
+
+    def __init__(self):
+        super().__init__(level=logging.INFO)
+        self.recording = False
+        self.stages: Dict[str, Dict[str, List[float]]] = defaultdict(lambda: defaultdict(list))
+
+    def emit(self, record: logging.LogRecord) -> None:
+        message = record.getMessage()
+        if not self.recording or not message.startswith("[TRACE] "):
+            return
+        trace = json.loads(message[len("[TRACE] "):])
+        for span in trace["spans"]:
+            self.stages[trace["path"]][span["stage"]].append(span["duration_ms"])
+
+
+class EventLoopMonitor:
+    """Measures how late a periodic timer fires, i.e. how long the loop was blocked"""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.lag_ms: List[float] = []
+        self.recording = False
+
+    async def run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            if self.recording:
+                self.lag_ms.append(max(loop.time() - expected, 0.0) * 1000)
+
+
+class LoadGenerator:
+    """Closed-loop load: each virtual client sends its next request as soon as the previous one finishes"""
+
+    def __init__(self, client: httpx.AsyncClient, patient_ids: List[str], args: argparse.Namespace):
+        self.client = client
+        self.patient_ids = patient_ids
+        self.args = args
+        self.headers = {"X-API-Key": os.environ["SERVER_API_KEY"]}
+        self.recording = False
+        self.latency_ms: Dict[str, List[float]] = defaultdict(list)
+        self.statuses: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        self.errors: Dict[str, int] = defaultdict(int)
+
+    def _pick_endpoint(self, rng: random.Random) -> str:
+        roll = rng.random()
+        if roll < self.args.summary_ratio:
+            return "chat_summary"
+        if roll < self.args.summary_ratio + self.args.stream_ratio:
+            return "kay_bot_stream"
+        return "kay_bot"
+
+    async def _request(self, endpoint: str, patient_id: str, sequence: int) -> int:
+        if endpoint == "chat_summary":
+            response = await self.client.get(
+                f"/agent/chat/summary/{patient_id}",
+                params={"force": "true"} if self.args.summary_force else None,
+                headers=self.headers
+            )
+            return response.status_code
+
+        payload = {
+            "patient_id": patient_id,
+            "name": "Benchmark Patient",
+            "age": "34",
+            "gender": "female",
+            # Unique per request so nothing is coalesced as a duplicate
+            "message": f"I have been feeling anxious about work lately ({sequence})"
+        }
+        if endpoint == "kay_bot":
+            response = await self.client.post("/agent/kay-bot", json=payload, headers=self.headers)
+            return response.status_code
+
+        # The ASGI transport buffers the body, so only the complete stream is timed
+        async with self.client.stream("POST", "/agent/kay-bot/stream", json=payload, headers=self.headers) as response:
+            async for _ in response.aiter_bytes():
+                pass
+            return response.status_code
+
+    async def client_loop(self, client_index: int, stop_at: float) -> None:
+        rng = random.Random(self.args.seed * 1000 + client_index)
+        sequence = 0
+        while time.perf_counter() < stop_at:
+            endpoint = self._pick_endpoint(rng)
+            patient_id = rng.choice(self.patient_ids)
+            sequence += 1
+            started = time.perf_counter()
+            try:
+                status_code = await self._request(endpoint, patient_id, client_index * 1_000_000 + sequence)
+            except Exception as e:
+                if self.recording:
+                    self.errors[endpoint] += 1
+                    logging.getLogger("benchmark").warning(f"[BENCH] {endpoint} request failed: {e}")
+                continue
+            if self.recording:
+                self.latency_ms[endpoint].append((time.perf_counter() - started) * 1000)
+                self.statuses[endpoint][str(status_code)] += 1
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_PATH, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    import main
+    from services.agent_service import llm_service
+    from services.db_service import chat_write_queue
+    from config import settings
+
+    collector = TraceCollector()
+    trace_logger = logging.getLogger("services.tracing")
+    trace_logger.setLevel(logging.INFO)
+    trace_logger.propagate = False
+    trace_logger.addHandler(collector)
+
+    if args.mongo == "memory":
+        await use_memory_database(settings.mongodb_database)
+    else:
+        await use_local_database()
+    if settings.chat_write_behind:
+        await chat_write_queue.start()
+
+    patient_ids = await seed_patients(args.patients, args.history, args.checkins, seed=args.seed)
+
+    model = FakeChatModel(
+        ttft_ms=args.llm_ttft_ms,
+        ttft_sigma=args.llm_ttft_sigma,
+        tokens_per_second=args.llm_tokens_per_second,
+        output_tokens=(args.llm_min_tokens, args.llm_max_tokens),
+        error_rate=args.llm_error_rate,
+        seed=args.seed
+    )
+    llm_service.clients = dict.fromkeys(llm_service.tasks, model)
+
+    monitor = EventLoopMonitor()
+    monitor_task = asyncio.create_task(monitor.run())
+    transport = httpx.ASGITransport(app=main.app)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=120) as client:
+            load = LoadGenerator(client, patient_ids, args)
+            started = time.perf_counter()
+            record_from = started + args.warmup
+            stop_at = record_from + args.duration
+
+            async def start_recording() -> None:
+                await asyncio.sleep(args.warmup)
+                load.recording = collector.recording = monitor.recording = True
+
+            recorder = asyncio.create_task(start_recording())
+            await asyncio.gather(*(load.client_loop(index, stop_at) for index in range(args.concurrency)))
+            await recorder
+            # Requests still in flight when the window closed finish after stop_at
+            measured_seconds = time.perf_counter() - record_from
+    finally:
+        monitor_task.cancel()
+        await chat_write_queue.stop()
+        if args.mongo == "local" and not args.keep_data:
+            await drop_database()
+
+    endpoints = {}
+    for endpoint in ENDPOINTS:
+        latencies = load.latency_ms.get(endpoint, [])
+        if not latencies and not load.errors.get(endpoint):
+            continue
+        ok = sum(count for status, count in load.statuses[endpoint].items() if status.startswith("2"))
+        endpoints[endpoint] = {
+            "requests": len(latencies),
+            "rps": round(len(latencies) / measured_seconds, 2),
+            "ok_rps": round(ok / measured_seconds, 2),
+            "statuses": dict(load.statuses[endpoint]),
+            "client_errors": load.errors.get(endpoint, 0),
+            "latency_ms": percentiles(latencies)
+        }
+
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.now(UTC).isoformat(),
+            "python": platform.python_version(),
+            "measured_seconds": round(measured_seconds, 2),
+            "args": vars(args)
+        },
+        "total_rps": round(sum(len(values) for values in load.latency_ms.values()) / measured_seconds, 2),
+        "endpoints": endpoints,
+        "stages_ms": {
+            path: {stage: {"count": len(values), **percentiles(values)} for stage, values in stages.items()}
+            for path, stages in collector.stages.items()
+        },
+        "event_loop_lag_ms": {"samples": len(monitor.lag_ms), **percentiles(monitor.lag_ms)},
+        "llm_calls": model.calls
+    }
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    data = parser.add_argument_group("data")
+    data.add_argument("--mongo", choices=("memory", "local"), default="memory",
+                      help="in-memory database (mongomock-motor) or a throwaway database on MONGODB_URL")
+    data.add_argument("--keep-data", action="store_true", help="don't drop the local database afterwards")
+    data.add_argument("--patients", type=int, default=100)
+    data.add_argument("--history", type=int, default=40, help="chats per patient")
+    data.add_argument("--checkins", type=int, default=4, help="check-ins per patient")
+
+    load = parser.add_argument_group("load")
+    load.add_argument("--concurrency", type=int, default=16, help="virtual clients")
+    load.add_argument("--duration", type=float, default=20.0, help="measured seconds")
+    load.add_argument("--warmup", type=float, default=3.0, help="seconds of load before measuring")
+    load.add_argument("--summary-ratio", type=float, default=0.2, help="fraction of requests to the summary endpoint")
+    load.add_argument("--stream-ratio", type=float, default=0.0, help="fraction of requests to the stream endpoint")
+    load.add_argument("--summary-force", action="store_true", help="regenerate summaries instead of serving stored ones")
+    load.add_argument("--seed", type=int, default=0)
+
+    llm = parser.add_argument_group("fake LLM")
+    llm.add_argument("--llm-ttft-ms", type=float, default=400.0, help="median time to first token (0 for none)")
+    llm.add_argument("--llm-ttft-sigma", type=float, default=0.5, help="log-normal spread of time to first token")
+    llm.add_argument("--llm-tokens-per-second", type=float, default=60.0)
+    llm.add_argument("--llm-min-tokens", type=int, default=60)
+    llm.add_argument("--llm-max-tokens", type=int, default=200)
+    llm.add_argument("--llm-error-rate", type=float, default=0.0)
+
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    return parser.parse_args(argv)
+
+
+def main() -> None:
+    args = parse_args()
+    # Configured before main.py is imported (its configure_logging then leaves the root logger alone):
+    # warnings only, on stderr, so the app's per-request logging stays out of the measurements and the report
+    logging.basicConfig(level=logging.WARNING, stream=sys.stderr, format='%(asctime)s | %(levelname)-8s | %(message)s')
+    report = asyncio.run(run(args))
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
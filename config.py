@@ -1,7 +1,23 @@
 from pydantic_settings import BaseSettings
-from typing import List
+from typing import Any, Dict, List, Literal, Optional
 import random
-from rich import print
+
+# Model and client settings for each LLM task; override single fields per task with LLM_ROUTES, e.g.
+# LLM_ROUTES='{"checkin_summary": {"model": "gpt-4o", "max_tokens": 600}}'
+DEFAULT_LLM_ROUTES: Dict[str, Dict[str, Any]] = {
+    # Patient-facing conversation: the strongest model, warmer sampling
+    "kay_chat": {
+        "model": "gpt-4o", "temperature": 0.8, "max_tokens": None, "timeout": 60.0, "max_retries": 2, "hedge": True
+    },
+    # High-volume, structured summaries: a faster, cheaper model with low temperature
+    "checkin_summary": {
+        "model": "gpt-4o-mini", "temperature": 0.3, "max_tokens": 400, "timeout": 30.0, "max_retries": 2, "hedge": True
+    },
+    # Background fold, nobody is waiting on it
+    "memory_summary": {
+        "model": "gpt-4o-mini", "temperature": 0.3, "max_tokens": 600, "timeout": 30.0, "max_retries": 2, "hedge": False
+    },
+}
 
 class Settings(BaseSettings):
     """Application settings"""
@@ -24,13 +40,142 @@ class Settings(BaseSettings):
     
     # OpenAI settings
     openai_api_key: str = ""
+    llm_routes: Dict[str, Dict[str, Any]] = {}  # Per-task overrides merged over DEFAULT_LLM_ROUTES
 
     # MongoDB settings
     mongodb_url: str
     mongodb_database: str
+    mongodb_ensure_indexes: bool = True  # Create the indexes backing hot queries on startup
+    mongodb_verify_query_plans: str = "warn"  # Check hot query plans on startup: "off", "warn" or "fail" (the API and worker refuse to start)
+
+    # Startup warm-up (see /ready)
+    startup_warm_llm: bool = True  # Open the OpenAI connections (TCP and TLS) during startup
+
+    # Patient session settings
+    session_history_size: int = 40  # Number of recent chats loaded when a patient_sessions document is rebuilt
+    session_max_turns: int = 200  # Hard cap on stored session turns; folds keep the session well below it, so it only drops unfolded turns if folds keep failing
+    session_checkin_refresh_seconds: int = 300  # Re-sync the session's check-in context after this many seconds
+
+    # Rolling conversation memory settings
+    memory_fold_threshold: int = 24  # Fold older turns into the running summary once the session holds this many
+    memory_keep_recent: int = 12  # Raw turns left in the session after a fold
+    memory_summary_token_budget: int = 400  # Maximum tokens of running summary in the Kay prompt
+
+    # Prompt context budgets (tokens counted locally with tiktoken)
+    history_token_budget: int = 3000  # Maximum tokens of conversation history in the Kay prompt
+    checkin_token_budget: int = 600  # Maximum tokens of check-in context in the Kay prompt
+    tokenizer_encoding: str = "o200k_base"  # tiktoken encoding used to count prompt tokens
+
+    # Prompt template variants served at startup, e.g. {"kay_bot": {"default": 90, "brief": 10}} (variants are
+    # registered in prompt_registry.py); weights set through PUT /agent/prompts/{name}/variants are stored in
+    # MongoDB and take precedence in every process
+    prompt_variant_weights: Dict[str, Dict[str, int]] = {}
+    prompt_weights_refresh_seconds: float = 30.0  # Each process re-reads the stored variant weights this often (0 only loads them at startup)
+
+    # Request deadlines and hedged LLM calls
+    kay_request_budget_seconds: float = 30.0  # End-to-end budget for a Kay bot turn (DB reads plus LLM call)
+    summary_request_budget_seconds: float = 45.0  # Budget for a check-in summary
+    llm_hedge_percentile: float = 0.95  # Start a second LLM attempt once the first runs past this latency percentile
+    llm_hedge_min_samples: int = 20  # Latency samples needed before hedging starts
+    llm_hedge_min_delay_seconds: float = 1.0  # Never hedge earlier than this
+    llm_latency_window: int = 200  # Recent calls per task used for the percentile
+
+    # LLM record/replay cassette for offline performance runs (never enable replay in production)
+    llm_cassette_mode: Literal["off", "record", "replay"] = "off"  # Record real calls, or answer from the cassette
+    llm_cassette_path: str = "llm_cassette.jsonl.gz"  # Gzipped JSON lines, one recorded call per line
+    llm_cassette_latency_scale: float = 1.0  # Replayed latency multiplier (0 replays instantly)
+
+    # LLM circuit breaker (one per route)
+    llm_breaker_window_seconds: float = 60.0  # Rolling window for error and slow-call rates
+    llm_breaker_min_calls: int = 10  # Calls needed in the window before the breaker can open
+    llm_breaker_error_rate: float = 0.5  # Open at this failure rate
+    llm_breaker_slow_call_seconds: float = 20.0  # Calls slower than this count as slow
+    llm_breaker_slow_rate: float = 0.8  # Open at this slow-call rate
+    llm_breaker_open_seconds: float = 30.0  # Reject calls this long before probing for recovery
+    llm_breaker_half_open_probes: int = 2  # Successful probe calls needed to close again
+    llm_degraded_regenerate_attempts: int = 3  # Without the job queue, tries to regenerate a degraded reply in the API process (waits for the breaker don't count)
+
+    # LLM admission control (per process): calls beyond max_concurrent wait in a bounded queue,
+    # requests that can't start within the wait budget get a 503 with Retry-After
+    kay_llm_max_concurrent: int = 32  # Concurrent Kay bot LLM calls
+    kay_llm_max_queue: int = 64  # Kay bot requests allowed to wait for a slot
+    kay_llm_max_wait_seconds: float = 5.0  # Longest a Kay bot request waits for a slot
+    summary_llm_max_concurrent: int = 8  # Concurrent check-in summary LLM calls
+    summary_llm_max_queue: int = 32  # Check-in summary requests allowed to wait for a slot
+    summary_llm_max_wait_seconds: float = 10.0  # Longest a check-in summary request waits for a slot
+
+    # Prometheus metrics
+    metrics_enabled: bool = True  # Serve /metrics (unauthenticated; restrict it at the network level)
+
+    # Per-request tracing (every response carries X-Request-ID)
+    server_timing_enabled: bool = True  # Add a Server-Timing header with db/prompt/llm/serialize time
+    trace_sample_rate: float = 0.01  # Fraction of requests whose stage trace is logged
+    trace_slow_request_seconds: float = 10.0  # Always log the trace of requests slower than this
+
+    # Logging
+    log_format: Literal["text", "json"] = "text"  # json: one object per line with request_id and endpoint
+    log_async: bool = True  # Format and write log lines on a background thread, off the event loop
+    log_queue_size: int = 10000  # Records buffered for the log thread; overflow is dropped and counted
+    log_request_sample_rate: float = 1.0  # Fraction of requests whose INFO lines are kept (warnings always are)
+    log_redact_phi: bool = True  # Mask emails, phone numbers and SSNs in log output
+
+    # Per-patient serialization of Kay bot turns
+    patient_lock_wait_seconds: float = 30.0  # Longest a message waits for the patient's previous turn (409 after)
+    patient_lock_ttl_seconds: float = 60.0  # Redis lock expiry, in case the holding process dies
+    redis_url: Optional[str] = None  # e.g. redis://localhost:6379/0 to serialize turns, share rate limits and invalidate context caches across processes
+    kay_duplicate_window_seconds: float = 10.0  # Repeat of the last message within this window returns its reply (0 disables)
+
+    # Bulk check-in summarization settings
+    summary_bulk_concurrency: int = 8  # Maximum concurrent LLM calls per bulk summary request (each also takes a summary LLM slot)
+    summary_bulk_max_patients: int = 500  # Maximum patient IDs accepted per bulk summary request
+
+    # Durable job queue settings (worker.py processes the jobs collection)
+    job_queue_enabled: bool = False  # Accept /agent/jobs requests (run worker.py alongside the API)
+    job_worker_concurrency: int = 4  # Jobs processed concurrently by each worker process
+    job_lease_seconds: int = 120  # A claimed job is handed to another worker if not renewed within this time
+    job_max_attempts: int = 3  # Attempts before a job is marked failed
+    job_result_ttl_seconds: int = 86400  # Finished jobs are deleted this long after completing
+    job_poll_interval_ms: int = 250  # Idle workers and long-polling clients check for changes this often
+    job_max_wait_seconds: int = 30  # Longest wait allowed on GET /agent/jobs/{job_id}
+    worker_metrics_port: int = 0  # Serve the worker's Prometheus metrics on this port (0 disables)
+
+    # In-process context cache settings (with several processes and no redis_url, another process's writes
+    # only show up once the cached entry expires: run a single API process or set redis_url)
+    cache_ttl_seconds: int = 300  # Cached check-in/session context expires after this many seconds
+    cache_max_entries: int = 5000  # Maximum number of patients held per cache
+    cache_max_bytes: int = 64 * 1024 * 1024  # Approximate memory cap per cache
+
+    # Chat write-behind settings
+    chat_write_behind: bool = False  # Batch chat inserts in the background instead of writing inline
+    chat_write_batch_size: int = 100  # Flush once this many chats are queued
+    chat_write_flush_interval_ms: int = 200  # Flush at least this often
+    chat_write_max_pending: int = 10000  # Fall back to inline writes above this queue depth
     
     # API Authentication settings
-    server_api_key: str = ""  # Secret key for Node.js server authentication 
+    server_api_key: str = ""  # Secret key for Node.js server authentication (key name "default")
+    server_api_keys: Dict[str, str] = {}  # More named keys, e.g. {"admin-tools": "<secret>"}; each is rate limited separately
+
+    # Rate limiting (token buckets; 429 with Retry-After and RateLimit-* headers)
+    rate_limit_enabled: bool = True
+    rate_limit_key_per_minute: int = 1200  # Sustained requests per minute per API key
+    rate_limit_key_burst: int = 200  # Requests an API key can make at once
+    rate_limit_key_overrides: Dict[str, Dict[str, int]] = {}  # Per key name, e.g. {"admin-tools": {"per_minute": 60, "burst": 10}}
+    rate_limit_patient_per_minute: int = 20  # Sustained Kay bot requests per minute per patient
+    rate_limit_patient_burst: int = 5  # Kay bot requests a patient can make at once
+    rate_limit_summary_per_minute: int = 60  # Sustained check-in summary requests per minute per patient (Node polls these)
+    rate_limit_summary_burst: int = 10  # Check-in summary requests for a patient at once
+    rate_limit_bulk_per_minute: int = 1000  # Sustained patients per minute in bulk summary requests per API key
+    rate_limit_bulk_burst: int = 500  # Patients an API key can request in bulk at once (keep >= summary_bulk_max_patients)
+
+    def get_llm_routes(self) -> Dict[str, Dict[str, Any]]:
+        """The LLM routing table: DEFAULT_LLM_ROUTES with llm_routes overrides applied field by field"""
+        routes = {task: dict(route) for task, route in DEFAULT_LLM_ROUTES.items()}
+        for task, overrides in self.llm_routes.items():
+            routes.setdefault(
+                task, {"temperature": 0.7, "max_tokens": None, "timeout": 60.0, "max_retries": 2, "hedge": False}
+            )
+            routes[task].update(overrides)
+        return routes
 
     class Config:
         env_file = ".env"
@@ -1,23 +1,32 @@
 import sys
 import os
-import logging
-
-# Configure logging to show in terminal
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s | %(levelname)-8s | %(message)s',
-    handlers=[
-        logging.StreamHandler(sys.stdout)
-    ]
-)
+import time
+
+# Startup timing starts here (interpreter start-up itself isn't included)
+IMPORT_STARTED = time.perf_counter()
 
 # Add project root to path for imports
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from fastapi import FastAPI
+# Configure logging to show in terminal (before the services log their startup lines)
+from services.log_pipeline import configure_logging
+configure_logging()
+
+from fastapi import FastAPI, Response
+from fastapi.responses import JSONResponse
+from prometheus_client import generate_latest, CONTENT_TYPE_LATEST
 from fastapi.middleware.cors import CORSMiddleware
-from routers.agent import router as agent_router
-from models.database_models import connect_to_mongo, close_mongo_connection
+from routers.agent import router as agent_router, agent_service, memory_service, llm_service
+from services.metrics import refresh_service_gauges
+from services.tracing import RequestTraceMiddleware
+from models.database_models import connect_to_mongo, close_mongo_connection, provision_database
+from services.db_service import chat_write_queue
+from services.cache_invalidation import cache_invalidation
+from services.prompt_weights import prompt_weights
+from services.startup import startup_warmup
+from config import settings
+
+startup_warmup.record("imports", time.perf_counter() - IMPORT_STARTED)
 
 app = FastAPI(
     title="Mental Health Bot API",
@@ -32,8 +41,13 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Let browser clients read the per-request timing headers
+    expose_headers=["X-Request-ID", "Server-Timing"],
 )
 
+# Request IDs and Server-Timing headers
+app.add_middleware(RequestTraceMiddleware)
+
 @app.get("/")
 async def root():
     return {"message": "Welcome to Mental Health Bot API"}
@@ -42,15 +56,43 @@ async def root():
 async def health_check():
     return {"status": "healthy"}
 
+@app.get("/ready")
+async def readiness_check():
+    """Readiness probe: 200 once the startup warm-up has finished, 503 while warming up, failed or draining"""
+    readiness = startup_warmup.get_status()
+    return JSONResponse(readiness, status_code=200 if readiness["status"] == "ready" else 503)
+
+if settings.metrics_enabled:
+    @app.get("/metrics", include_in_schema=False)
+    async def metrics():
+        """Prometheus metrics for this process"""
+        refresh_service_gauges(llm_service, memory_service, chat_write_queue)
+        return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
 # Startup and shutdown events
 @app.on_event("startup")
 async def startup_event():
-    """Initialize MongoDB connection on startup"""
-    await connect_to_mongo()
+    """Initialize MongoDB connection on startup, then warm up in the background (see /ready)"""
+    await startup_warmup.timed("mongo_connect", connect_to_mongo(provision=False))
+    if settings.mongodb_verify_query_plans == "fail":
+        # Checked before startup completes, so a hot query without an index stops the API instead of being served
+        await startup_warmup.timed("mongo_provision", provision_database())
+    if settings.chat_write_behind:
+        await chat_write_queue.start()
+    await cache_invalidation.start()
+    await prompt_weights.start()
+    startup_warmup.start(llm_service)
 
 @app.on_event("shutdown")
 async def shutdown_event():
-    """Close MongoDB connection on shutdown"""
+    """Drain pending chat writes and close MongoDB connection on shutdown"""
+    startup_warmup.drain()
+    await agent_service.stop_regenerations()
+    await memory_service.wait_idle()
+    await llm_service.flush_cassette()
+    await chat_write_queue.stop()
+    await cache_invalidation.stop()
+    await prompt_weights.stop()
     await close_mongo_connection()
 
 # Include routers
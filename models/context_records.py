@@ -0,0 +1,205 @@
+"""
+Compact records for the conversation and check-in context read on every Kay bot turn
+Decoded once from MongoDB documents fetched with the projections below
+"""
+
+import hashlib
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+
+# History text used when a patient has no previous turns
+DEFAULT_CONVERSATIONAL_CONTEXT = "This is the beginning of our conversation."
+
+# Only the chat fields used to build conversation history
+CHAT_TURN_PROJECTION = {"query": 1, "response": 1, "createdAt": 1, "degraded": 1}
+
+# (label, document field) pairs rendered for each check-in type
+MORNING_FIELDS: Tuple[Tuple[str, str], ...] = (
+    ("Sleep Quality", "sleepQuality"),
+    ("Body Sensation", "bodySensation"),
+    ("Energy Level", "energyLevel"),
+    ("Mental State", "mentalState"),
+)
+EVENING_FIELDS: Tuple[Tuple[str, str], ...] = (
+    ("Emotion Category", "emotionCategory"),
+    ("Overwhelm Amount", "overwhelmAmount"),
+    ("Emotion in Moment", "emotionInMoment"),
+    ("Surroundings Impact", "surroundingsImpact"),
+    ("Social Engagement Level", "socialEngagementLevel"),
+    ("Meaningful Moments Quantity", "meaningfulMomentsQuantity"),
+)
+
+# Only the check-in fields rendered into the context string
+CHECKIN_PROJECTION = {
+    field: 1
+    for field in (
+        "patient", "type", "createdAt", "executiveTasks", "totalPoints", "riskLevel", "message",
+        "originalMessage", "summaryHash",
+        *(field for _, field in MORNING_FIELDS),
+        *(field for _, field in EVENING_FIELDS),
+    )
+}
+
+
+class ChatTurn:
+    """One query/response exchange between a patient and Kay"""
+
+    __slots__ = ("chat_id", "query", "response", "created_at", "degraded", "token_count")
+
+    def __init__(
+        self, chat_id: str, query: str, response: str, created_at: Optional[datetime], degraded: bool = False
+    ):
+        self.chat_id = chat_id
+        self.query = query
+        self.response = response
+        self.created_at = created_at
+        # The response is the degraded-mode reply, waiting to be regenerated
+        self.degraded = degraded
+        # Filled in lazily by the context builder
+        self.token_count: Optional[int] = None
+
+    @classmethod
+    def from_chat_document(cls, document: Dict[str, Any]) -> "ChatTurn":
+        """Decode a document from the chats collection"""
+        return cls(
+            str(document["_id"]), document["query"], document["response"], document.get("createdAt"),
+            document.get("degraded", False)
+        )
+
+    @classmethod
+    def from_session_turn(cls, turn: Dict[str, Any]) -> "ChatTurn":
+        """Decode a turn stored on a patient_sessions document"""
+        return cls(turn.get("chatId"), turn["query"], turn["response"], turn.get("createdAt"), turn.get("degraded", False))
+
+    def to_session_turn(self) -> Dict[str, Any]:
+        """Encode as a turn for the patient_sessions document"""
+        turn = {
+            "chatId": self.chat_id,
+            "query": self.query,
+            "response": self.response,
+            "createdAt": self.created_at
+        }
+        if self.degraded:
+            turn["degraded"] = True
+        return turn
+
+    def __repr__(self) -> str:
+        return f"ChatTurn(chat_id={self.chat_id!r}, created_at={self.created_at!r})"
+
+
+class CheckinSnapshot:
+    """The rendered fields of a single dailycheckins document"""
+
+    __slots__ = (
+        "document_id", "patient_id", "checkin_type", "created_at",
+        "fields", "executive_tasks", "total_points", "risk_level", "message",
+        "original_message", "summary_hash"
+    )
+
+    def __init__(
+        self,
+        document_id: str,
+        patient_id: str,
+        checkin_type: str,
+        created_at: Any,
+        fields: Tuple[Tuple[str, Any], ...],
+        executive_tasks: str,
+        total_points: Any,
+        risk_level: Any,
+        message: Any,
+        original_message: Any = None,
+        summary_hash: Optional[str] = None
+    ):
+        self.document_id = document_id
+        self.patient_id = patient_id
+        self.checkin_type = checkin_type
+        self.created_at = created_at
+        self.fields = fields
+        self.executive_tasks = executive_tasks
+        self.total_points = total_points
+        self.risk_level = risk_level
+        self.message = message
+        # Patient-written message, kept aside once message holds a generated summary
+        self.original_message = original_message
+        # summary_key of the input the stored summary was generated from
+        self.summary_hash = summary_hash
+
+    @classmethod
+    def from_document(cls, document: Dict[str, Any]) -> "CheckinSnapshot":
+        """Decode a document from the dailycheckins collection"""
+        checkin_type = document.get("type", "Unknown")
+        type_fields = MORNING_FIELDS if checkin_type == "Morning" else EVENING_FIELDS
+
+        # Format executive tasks for display
+        executive_tasks = document.get("executiveTasks", "Not specified")
+        if isinstance(executive_tasks, list):
+            executive_tasks = ", ".join(executive_tasks) if executive_tasks else "Not specified"
+        elif not executive_tasks:
+            executive_tasks = "Not specified"
+
+        return cls(
+            document_id=str(document["_id"]),
+            patient_id=str(document.get("patient")),
+            checkin_type=checkin_type,
+            created_at=document.get("createdAt", "Not specified"),
+            fields=tuple((label, document.get(field, "Not specified")) for label, field in type_fields),
+            executive_tasks=executive_tasks,
+            total_points=document.get("totalPoints", "Not specified"),
+            risk_level=document.get("riskLevel", "Not specified"),
+            message=document.get("message", "No message"),
+            original_message=document.get("originalMessage"),
+            summary_hash=document.get("summaryHash")
+        )
+
+    @property
+    def summary_source_message(self) -> Any:
+        """The patient's own message, never a previously generated summary"""
+        if self.summary_hash is not None:
+            return self.original_message if self.original_message is not None else "No message"
+        return self.message
+
+    def to_summary_input(self) -> str:
+        """Render the check-in for the summary prompt, with the patient's message rather than a stored summary"""
+        return self.to_context_string(message=self.summary_source_message)
+
+    def summary_key(self) -> str:
+        """Key identifying the summary input: the document ID plus a hash of the rendered fields"""
+        digest = hashlib.sha256(f"{self.document_id}\n{self.to_summary_input()}".encode("utf-8")).hexdigest()
+        return digest[:16]
+
+    def has_current_summary(self) -> bool:
+        """Whether the stored message is a summary generated from the check-in as it is now"""
+        return self.summary_hash is not None and self.summary_hash == self.summary_key()
+
+    def with_summary(self, summary: str, summary_hash: str) -> "CheckinSnapshot":
+        """Copy of this check-in after a generated summary has been stored in its message field"""
+        return CheckinSnapshot(
+            document_id=self.document_id,
+            patient_id=self.patient_id,
+            checkin_type=self.checkin_type,
+            created_at=self.created_at,
+            fields=self.fields,
+            executive_tasks=self.executive_tasks,
+            total_points=self.total_points,
+            risk_level=self.risk_level,
+            message=summary,
+            original_message=self.summary_source_message,
+            summary_hash=summary_hash
+        )
+
+    def to_context_string(self, message: Any = None) -> str:
+        """Render the check-in into the context string used in prompts"""
+        if message is None:
+            message = self.message
+        heading = "Morning Check-in Summary:" if self.checkin_type == "Morning" else "Evening Check-in Summary:"
+        lines = [heading]
+        lines.extend(f"- {label}: {value}" for label, value in self.fields)
+        lines.append(f"- Executive Tasks: {self.executive_tasks}")
+        lines.append(f"- Total Points: {self.total_points}")
+        lines.append(f"- Risk Level: {self.risk_level}")
+        lines.append(f"- Message: {message}")
+        lines.append(f"- Check-in Date: {self.created_at}")
+        return "\n".join(lines)
+
+    def __repr__(self) -> str:
+        return f"CheckinSnapshot(document_id={self.document_id!r}, checkin_type={self.checkin_type!r})"
@@ -1,5 +1,10 @@
 from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
-from typing import Optional
+from pymongo import IndexModel, ASCENDING, DESCENDING
+from pymongo.errors import OperationFailure
+from bson import ObjectId
+from datetime import datetime, UTC
+from typing import Optional, Dict, List, Any
+import asyncio
 import os
 import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -16,8 +21,43 @@ class MongoDB:
 # Global database instance
 mongodb = MongoDB()
 
-async def connect_to_mongo():
-    """Create database connection with connection pooling"""
+# Indexes backing the hot queries, provisioned idempotently by connect_to_mongo
+REQUIRED_INDEXES: Dict[str, List[IndexModel]] = {
+    # DatabaseService.get_patient_recent_chats: find({patient}).sort(createdAt, -1)
+    "chats": [
+        IndexModel([("patient", ASCENDING), ("createdAt", DESCENDING)], name="patient_1_createdAt_-1"),
+    ],
+    # DatabaseService.get_patient_checkin_context: find_one({patient}, sort=[(createdAt, -1)])
+    "dailycheckins": [
+        IndexModel([("patient", ASCENDING), ("createdAt", DESCENDING)], name="patient_1_createdAt_-1"),
+    ],
+    # JobQueue.claim: find_one_and_update({status in [...], availableAt <= now}, sort=[(availableAt, 1)])
+    # and the TTL that deletes finished jobs
+    "jobs": [
+        IndexModel([("status", ASCENDING), ("availableAt", ASCENDING)], name="status_1_availableAt_1"),
+        IndexModel([("expireAt", ASCENDING)], name="expireAt_1", expireAfterSeconds=0),
+    ],
+}
+
+# Hot queries checked with explain(): (name, collection, filter, sort, limit)
+HOT_QUERIES = [
+    ("recent_chats", "chats", {"patient": ObjectId()}, [("createdAt", DESCENDING)], 20),
+    ("latest_checkin", "dailycheckins", {"patient": ObjectId()}, [("createdAt", DESCENDING)], 1),
+    ("patient_session", "patient_sessions", {"_id": ObjectId()}, None, 1),
+    ("job_claim", "jobs", {"status": {"$in": ["queued", "running"]}, "availableAt": {"$lte": datetime.now(UTC)}},
+     [("availableAt", ASCENDING)], 1),
+]
+
+# Plan stages that mean a query is scanning the collection or sorting in memory
+BAD_PLAN_STAGES = {"COLLSCAN", "SORT"}
+
+async def connect_to_mongo(provision: bool = True):
+    """
+    Create database connection with connection pooling
+
+    Args:
+        provision: Also create indexes and check hot query plans (the API does this in its startup warm-up)
+    """
     try:
         # Connection pool configuration
         mongodb.client = AsyncIOMotorClient(
@@ -38,10 +78,7 @@ async def connect_to_mongo():
         
         mongodb.database = mongodb.client[settings.mongodb_database]
         
-        # Test the connection
-        await mongodb.client.admin.command('ping')
-        
-        # Log connection pool info
+        # Test the connection and log the server version in one round trip
         server_info = await mongodb.client.server_info()
         logger.info(f"Successfully connected to MongoDB with connection pooling")
         logger.info(f"MongoDB version: {server_info.get('version', 'Unknown')}")
@@ -51,6 +88,106 @@ async def connect_to_mongo():
         logger.error(f"Failed to connect to MongoDB: {e}")
         raise
 
+    if provision:
+        await provision_database()
+
+async def provision_database():
+    """Create the declared indexes and check the hot query plans, as configured"""
+    if settings.mongodb_ensure_indexes:
+        await ensure_indexes()
+
+    if settings.mongodb_verify_query_plans != "off":
+        await verify_query_plans(fail_on_bad_plan=settings.mongodb_verify_query_plans == "fail")
+
+async def warm_connection_pool() -> Dict[str, int]:
+    """
+    Open the pool's minPoolSize connections now (concurrent pings each need their own connection)
+    instead of during the first requests
+
+    Returns:
+        Dictionary with the number of connections opened
+    """
+    size = mongodb.client.options.pool_options.min_pool_size
+    await asyncio.gather(*(mongodb.client.admin.command('ping') for _ in range(size)))
+    return {"connections": size}
+
+async def ensure_indexes() -> Dict[str, List[str]]:
+    """
+    Create the declared indexes if they do not exist yet (safe to run on every startup)
+
+    Returns:
+        Dictionary mapping collection name to the index names that are in place
+    """
+    database = get_database()
+    provisioned = {}
+    for collection_name, indexes in REQUIRED_INDEXES.items():
+        try:
+            provisioned[collection_name] = await database[collection_name].create_indexes(indexes)
+            logger.info("Indexes in place on %s: %s", collection_name, provisioned[collection_name])
+        except OperationFailure as e:
+            # e.g. the same keys already indexed under another name, or missing createIndex privileges
+            logger.warning(f"Could not provision indexes on {collection_name}: {e}")
+            provisioned[collection_name] = []
+    return provisioned
+
+def _collect_plan_stages(plan: Any) -> List[str]:
+    """Recursively collect every stage name in an explain() plan tree"""
+    stages = []
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            stages.append(plan["stage"])
+        for value in plan.values():
+            stages.extend(_collect_plan_stages(value))
+    elif isinstance(plan, list):
+        for item in plan:
+            stages.extend(_collect_plan_stages(item))
+    return stages
+
+async def verify_query_plans(fail_on_bad_plan: bool = False) -> List[Dict[str, Any]]:
+    """
+    Run explain() on each hot query and check the winning plan uses an index without an in-memory sort
+
+    Args:
+        fail_on_bad_plan: Raise instead of logging a warning when a plan is a COLLSCAN or SORT
+
+    Returns:
+        List of per-query results with the winning plan stages
+
+    Raises:
+        RuntimeError: If fail_on_bad_plan is set and a query has a bad plan
+    """
+    database = get_database()
+    results = []
+    for name, collection_name, query, sort, limit in HOT_QUERIES:
+        cursor = database[collection_name].find(query).limit(limit)
+        if sort:
+            cursor = cursor.sort(sort)
+        try:
+            explain = await cursor.explain()
+        except OperationFailure as e:
+            logger.warning(f"Could not explain hot query {name}: {e}")
+            results.append({"query": name, "collection": collection_name, "ok": None, "error": str(e)})
+            continue
+
+        stages = _collect_plan_stages(explain.get("queryPlanner", {}).get("winningPlan", {}))
+        bad_stages = sorted(BAD_PLAN_STAGES.intersection(stages))
+        results.append({
+            "query": name,
+            "collection": collection_name,
+            "ok": not bad_stages,
+            "stages": stages,
+            "bad_stages": bad_stages
+        })
+        if bad_stages:
+            logger.warning(f"Hot query {name} on {collection_name} uses {bad_stages} (plan: {stages})")
+        else:
+            logger.info("Hot query %s on %s plan OK: %s", name, collection_name, stages)
+
+    bad_queries = [result["query"] for result in results if result["ok"] is False]
+    if bad_queries and fail_on_bad_plan:
+        raise RuntimeError(f"Hot queries without a usable index: {bad_queries}")
+    return results
+
 async def close_mongo_connection():
     """Close database connection and connection pool"""
     if mongodb.client:
@@ -95,10 +232,28 @@ async def get_connection_pool_stats():
                     'note': 'Limited stats due to user permissions'
                 }
             
-            logger.info(f"Connection pool stats: {stats}")
+            logger.info("Connection pool stats: %s", stats)
             return stats
         else:
             return {"error": "Database not connected"}
     except Exception as e:
         logger.error(f"Error getting connection pool stats: {e}")
-        return {"error": str(e)}
\ No newline at end of file
+        return {"error": str(e)}
+
+
+if __name__ == "__main__":
+    # Provision indexes and verify hot query plans: python models/database_models.py
+    import json
+
+    async def check_indexes():
+        mongodb.client = AsyncIOMotorClient(settings.mongodb_url, serverSelectionTimeoutMS=5000)
+        mongodb.database = mongodb.client[settings.mongodb_database]
+        try:
+            await ensure_indexes()
+            results = await verify_query_plans()
+            print(json.dumps(results, indent=2))
+            return all(result["ok"] is not False for result in results)
+        finally:
+            mongodb.client.close()
+
+    sys.exit(0 if asyncio.run(check_indexes()) else 1)
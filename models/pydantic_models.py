@@ -7,10 +7,48 @@ class ChatSummaryResponse(BaseModel):
     document_id: str
     summary: str
     update_success: bool
+    cached: bool = False
+
+class BulkSummaryRequest(BaseModel):
+    patient_ids: List[str]
+    force: bool = False
+
+class BulkSummaryResult(BaseModel):
+    patient_id: str
+    status: str  # summarized, cached, not_found, invalid_id, failed or shed (over capacity)
+    document_id: Optional[str] = None
+    summary: Optional[str] = None
+    update_success: bool = False
+    error: Optional[str] = None
+
+class BulkSummaryResponse(BaseModel):
+    results: List[BulkSummaryResult]
+    summarized: int
+    cached: int
+    failed: int
+
+class JobAcceptedResponse(BaseModel):
+    job_id: str
+    status: str
+    status_url: str
+
+class JobStatusResponse(BaseModel):
+    job_id: str
+    type: str
+    status: str  # queued, running, succeeded or failed
+    attempts: int
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    created_at: datetime
+    updated_at: datetime
+    finished_at: Optional[datetime] = None
 
 class KayBotPayload(BaseModel):
     age: str
     gender: str
     name: str
     patient_id: str
-    message: str
\ No newline at end of file
+    message: str
+
+class PromptVariantWeights(BaseModel):
+    weights: Dict[str, int]
\ No newline at end of file
@@ -1,3 +1,16 @@
+"""
+Prompt templates for the Kay bot and summarization tasks.
+
+Each template is compiled once at import time into static segments and {{variable}} slots,
+renders in a single join, validates its variables, and carries a version and content hash
+for logging and cache keys. Variants of a template can be registered and selected (or split
+by weight) at runtime through the registry.
+"""
+
+import re
+import hashlib
+from typing import Dict, List, Optional, Tuple
+
 kay_bot_prompt = """
 # Role & Core Identity
 You are "Kay," an AI companion from KindPath. Your primary role is to be a supportive, empathetic partner in conversation. You are exceptionally patient, insightful, and validating. You listen more than you talk, and your responses are always gentle and encouraging.
@@ -7,8 +20,8 @@ You are "Kay," an AI companion from KindPath. Your primary role is to be a suppo
 # Input Context
 Your responses must be grounded in these two inputs:
 
-1.  **`checkin_context`**: A JSON object containing the user's profile (`first_name`, `age`) and their daily check-in data (e.g., `mental_state`, `sleep_quality`). This is your foundational understanding of the user.
-2.  **`conversation_history`**: The list of messages in the current conversation. The last message is always the most recent user input. Analyze this to understand the immediate context and emotional state.
+1.  **`checkin_context`**: The user's profile (`first_name`, `age`) and their daily check-in data (e.g., `mental_state`, `sleep_quality`), given in the system message that follows these instructions, together with a summary of earlier conversations when one exists. This is your foundational understanding of the user.
+2.  **`conversation_history`**: The messages exchanged with the user after the system messages. The last message is always the most recent user input. Analyze this to understand the immediate context and emotional state.
 
 # Processing Logic: Chain of Thought
 For each response, follow this internal process:
@@ -79,13 +92,26 @@ Adapt your language to the user's specified age group from the `checkin_context`
 - **PRIORITIZE ACTIONABLE TECHNIQUES** over validation or questions.
 - If a user is in crisis, offer immediate coping technique + encourage professional help.
 - Keep responses concise and focused on providing therapeutic support.
+"""
 
----
+# Variant of kay_bot_prompt for A/B testing shorter replies (served once given a weight, see
+# PUT /agent/prompts/kay_bot/variants)
+kay_bot_brief_prompt = kay_bot_prompt + """
+# Response Length
+- Keep every reply under 80 words: at most one sentence of validation, then a single technique or question.
+- Offer one technique per reply, never a list of options.
+"""
+
+# Per-patient context sent as a second system message after the static kay_bot_prompt,
+# so the large static prefix stays byte-identical across every request (provider prompt caching)
+kay_bot_context_prompt = """
 **User Context (checkin_context):**
 {{checkin_context}}
+"""
 
-**Conversation History (conversation_history):**
-{{conversation_history}}
+kay_bot_summary_section = """
+**Summary of Earlier Conversations:**
+{{conversation_summary}}
 """
 
 summary_prompt = """
@@ -118,3 +144,176 @@ Instructions:
 - "The patient reported feeling very tense and low in energy during the morning check-in. They are experiencing a moderate risk level. Encourage them to focus on self-care activities today."
 """
 
+
+memory_summary_prompt = """
+You maintain a running memory of an ongoing supportive conversation between a user and Kay, an AI companion.
+Fold the new conversation turns into the existing running summary so that Kay can keep continuity in later conversations.
+
+Instructions:
+- Keep what matters for continuity: the user's recurring feelings and concerns, important life events and people they mentioned, coping techniques Kay suggested and how the user responded, and any safety concerns.
+- Drop small talk, greetings and repeated details.
+- Prefer the newer information when it contradicts the existing summary.
+- Write in plain third-person sentences about "the user", without headers or bullet points.
+- Keep the result under 200 words.
+
+### Existing running summary:
+{{running_summary}}
+
+### New conversation turns (oldest first):
+{{new_turns}}
+"""
+
+
+# Template placeholder syntax: {{variable_name}}
+PLACEHOLDER_PATTERN = re.compile(r"\{\{(\w+)\}\}")
+
+
+class PromptRenderError(ValueError):
+    """Raised when a template is rendered with missing or unexpected variables"""
+
+
+class PromptTemplate:
+    """A prompt compiled into static segments and variable slots"""
+
+    __slots__ = ("name", "variant", "version", "text", "content_hash", "variables", "_segments", "_slots")
+
+    def __init__(self, name: str, text: str, version: str, variant: str = "default"):
+        self.name = name
+        self.variant = variant
+        self.version = version
+        self.text = text
+        self.content_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()[:12]
+
+        # re.split alternates static text and captured variable names: [text, var, text, var, ..., text]
+        parts = PLACEHOLDER_PATTERN.split(text)
+        self._segments: List[str] = parts[0::2]
+        self._slots: List[str] = parts[1::2]
+        self.variables = frozenset(self._slots)
+
+    @property
+    def key(self) -> str:
+        """Identifier for logs and cache keys, e.g. kay_bot:default@2#1a2b3c4d5e6f"""
+        return f"{self.name}:{self.variant}@{self.version}#{self.content_hash}"
+
+    def render(self, **values: str) -> str:
+        """
+        Render the template in a single join
+
+        Args:
+            **values: A value for every variable in the template
+
+        Returns:
+            str: The rendered prompt
+
+        Raises:
+            PromptRenderError: If a variable is missing or an unknown variable is passed
+        """
+        missing = self.variables.difference(values)
+        unexpected = set(values).difference(self.variables)
+        if missing or unexpected:
+            raise PromptRenderError(
+                f"Template {self.key}: missing variables {sorted(missing)}, unexpected variables {sorted(unexpected)}"
+            )
+        if not self._slots:
+            return self.text
+
+        pieces = [self._segments[0]]
+        for slot, segment in zip(self._slots, self._segments[1:]):
+            pieces.append(values[slot])
+            pieces.append(segment)
+        return "".join(pieces)
+
+
+class PromptRegistry:
+    """Holds every template variant and which variant(s) are served for each template name"""
+
+    def __init__(self):
+        self._templates: Dict[str, Dict[str, PromptTemplate]] = {}
+        # name -> [(variant, weight)], weights are relative
+        self._weights: Dict[str, List[Tuple[str, int]]] = {}
+
+    def register(self, template: PromptTemplate) -> PromptTemplate:
+        """Register a template variant; the first variant registered for a name is served by default"""
+        variants = self._templates.setdefault(template.name, {})
+        variants[template.variant] = template
+        self._weights.setdefault(template.name, [(template.variant, 1)])
+        return template
+
+    def set_variant_weights(self, name: str, weights: Dict[str, int]) -> None:
+        """
+        Choose which variants of a template are served, e.g. {"default": 90, "v3": 10} once a
+        PromptTemplate(name, text, version, variant="v3") is registered next to the default
+
+        Args:
+            name: Template name
+            weights: Relative weight per registered variant (a single variant with any weight serves only it)
+
+        Raises:
+            KeyError: If the template or a variant is not registered
+            ValueError: If no variant has a positive weight
+        """
+        if name not in self._templates:
+            raise KeyError(f"Unknown template {name!r}")
+        variants = self._templates[name]
+        for variant in weights:
+            if variant not in variants:
+                raise KeyError(f"Unknown variant {variant!r} for template {name!r}")
+        selected = [(variant, weight) for variant, weight in weights.items() if weight > 0]
+        if not selected:
+            raise ValueError("At least one variant needs a positive weight")
+        self._weights[name] = selected
+
+    def get_variant_weights(self, name: str) -> Dict[str, int]:
+        """The variants of a template being served and their weights (empty for an unknown template)"""
+        return dict(self._weights.get(name, []))
+
+    def get(self, name: str, bucket_key: Optional[str] = None) -> PromptTemplate:
+        """
+        Get the template variant to serve
+
+        Args:
+            name: Template name
+            bucket_key: Stable key (e.g. patient ID) so the same caller always gets the same A/B variant
+
+        Returns:
+            PromptTemplate: The selected variant
+        """
+        weights = self._weights[name]
+        if len(weights) == 1:
+            return self._templates[name][weights[0][0]]
+
+        total = sum(weight for _, weight in weights)
+        digest = hashlib.sha256(f"{name}:{bucket_key or ''}".encode("utf-8")).digest()
+        point = int.from_bytes(digest[:8], "big") % total
+        for variant, weight in weights:
+            if point < weight:
+                return self._templates[name][variant]
+            point -= weight
+        return self._templates[name][weights[-1][0]]
+
+    def variants(self, name: str) -> List[PromptTemplate]:
+        """Every registered variant of a template"""
+        return list(self._templates[name].values())
+
+    def describe(self) -> Dict[str, Dict]:
+        """Describe every template, its variants (version and hash) and the active weights"""
+        return {
+            name: {
+                "variants": {
+                    variant: {"version": template.version, "hash": template.content_hash,
+                              "variables": sorted(template.variables)}
+                    for variant, template in variants.items()
+                },
+                "weights": self.get_variant_weights(name)
+            }
+            for name, variants in self._templates.items()
+        }
+
+
+registry = PromptRegistry()
+registry.register(PromptTemplate("kay_bot", kay_bot_prompt, version="2"))
+registry.register(PromptTemplate("kay_bot", kay_bot_brief_prompt, version="1", variant="brief"))
+registry.register(PromptTemplate("kay_bot_context", kay_bot_context_prompt, version="1"))
+registry.register(PromptTemplate("kay_bot_summary_section", kay_bot_summary_section, version="1"))
+registry.register(PromptTemplate("checkin_summary", summary_prompt, version="1"))
+registry.register(PromptTemplate("memory_summary", memory_summary_prompt, version="1"))
@@ -1,12 +1,13 @@
 import sys
 import os
 import json
+import asyncio
 import logging
-from typing import Dict, Any, Optional
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Depends, HTTPException, status
-from fastapi.security import HTTPBearer
-from sqlalchemy.orm import Session
+from typing import Dict, Any
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.responses import StreamingResponse
 from datetime import datetime, UTC
+from bson import ObjectId
 
 # Add project root to path for imports
 ROOT_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -14,69 +15,61 @@ if ROOT_PATH not in sys.path:
     sys.path.append(ROOT_PATH)
 
 from models.database_models import get_db, get_connection_pool_stats
-from services.db_service import DatabaseService
-from services.openai_service import LLMService
-from services.api_auth_service import get_verified_api_key, APIAuthService
+from services.db_service import DatabaseService, chat_write_queue
+from services.agent_service import agent_service, llm_service, memory_service
+from services.job_queue import job_queue
+from services.deadline import Deadline, DeadlineExceeded, run_stage, stage_stats
+from services.circuit_breaker import CircuitOpenError, CLOSED
+from services.openai_service import KAY_DEGRADED_RESPONSE
+from services.admission import kay_admission, AdmissionRejected, retry_after_header, get_admission_stats
+from services.patient_lock import patient_serializer, PatientBusy
+from services.rate_limiter import rate_limiter
+from services.prompt_weights import prompt_weights
+from services.metrics import MetricsRoute
+from services.tracing import TimedJSONResponse
+from starlette.background import BackgroundTask
+from services.api_auth_service import (
+    get_verified_api_key, get_rate_limited_api_key, get_summary_rate_limited_api_key,
+    get_bulk_rate_limited_api_key, APIAuthService
+)
 from config import settings
-from langchain_core.messages import SystemMessage, HumanMessage
-from prompt_registry import *
-from models.pydantic_models import KayBotPayload
+from prompt_registry import registry
+from models.pydantic_models import (
+    KayBotPayload, PromptVariantWeights, BulkSummaryRequest, BulkSummaryResponse, JobAcceptedResponse,
+    JobStatusResponse
+)
 
 logger = logging.getLogger(__name__)
-router = APIRouter(prefix="/agent", tags=["Mental Health Agent"])
+router = APIRouter(
+    prefix="/agent",
+    tags=["Mental Health Agent"],
+    route_class=MetricsRoute,
+    default_response_class=TimedJSONResponse
+)
 
-# Initialize services
-llm_service = LLMService()
+def format_sse_event(event: str, data: Dict[str, Any]) -> str:
+    """Format a Server-Sent Event frame"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
 
 @router.post("/kay-bot")
-async def generate_response(payload: KayBotPayload, api_key: str = Depends(get_verified_api_key)):
+async def generate_response(payload: KayBotPayload, api_key: str = Depends(get_rate_limited_api_key)):
     """Generate a response from the Kay bot using patient context and chat history"""
     
     try:
-        # Get patient's recent chat history (last 20 conversations)
-        chat_history_result = await DatabaseService.get_patient_recent_chats(payload.patient_id, limit=20)
-        conversational_context = chat_history_result.get('conversational_context', "This is the beginning of our conversation.")
-        logger.info(f"[KAY-BOT] Retrieved {chat_history_result['total_count']} recent chats for patient {payload.patient_id}")
-        
-        # Get patient's checkin context
-        checkin_result = await DatabaseService.get_patient_checkin_context(payload.patient_id)
-        logger.info(f"[KAY-BOT] Checkin context found: {checkin_result['found']}")
-        registered_checkin_context = ""
-        if checkin_result['found']:
-            registered_checkin_context = checkin_result['context_string']
-        else:
-            # Create basic context from payload if no checkin data
-            registered_checkin_context = f"Patient: {payload.name}, Age: {payload.age}, Gender: {payload.gender}"
-        
-        # Generate response using LLM service
-        response = await llm_service.generate_kay_response(
-            user_message=payload.message,
-            patient_name=payload.name,
-            patient_age=payload.age,
-            patient_gender=payload.gender,
-            checkin_context=registered_checkin_context,
-            conversational_context=conversational_context
+        # Turns for one patient run one at a time; a duplicate of an in-flight message shares its reply
+        return await patient_serializer.run(
+            payload.patient_id, payload.message, lambda: agent_service.run_kay_bot(payload)
         )
-        
-        # Save the conversation to database
-        save_result = await DatabaseService.save_chat_message(
-            patient_id=payload.patient_id,
-            query=payload.message,
-            response=response
+
+    except PatientBusy as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+    except AdmissionRejected as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e), headers=retry_after_header(e)
         )
-        
-        if not save_result['success']:
-            logger.error(f"Failed to save chat message for patient {payload.patient_id}")
-        
-        logger.info(f"[KAY-BOT] Generated response for patient {payload.patient_id}")
-        
-        return {
-            "response": response,
-            "patient_id": payload.patient_id,
-            "chat_saved": save_result['success'],
-            "chat_id": save_result.get('chat_id', None)
-        }
-        
+    except DeadlineExceeded as e:
+        logger.error(f"Error in generate_response: {e}")
+        raise HTTPException(status_code=status.HTTP_504_GATEWAY_TIMEOUT, detail=str(e))
     except Exception as e:
         logger.error(f"Error in generate_response: {e}")
         raise HTTPException(
@@ -84,13 +77,158 @@ async def generate_response(payload: KayBotPayload, api_key: str = Depends(get_v
             detail=f"Error generating response: {str(e)}"
         )
 
+@router.post("/kay-bot/stream")
+async def stream_response(
+    payload: KayBotPayload, request: Request, api_key: str = Depends(get_rate_limited_api_key)
+):
+    """Stream a response from the Kay bot as Server-Sent Events, saving the reply once complete"""
+
+    deadline = Deadline(settings.kay_request_budget_seconds)
+    patient_lock = None
+    permit = None
+
+    async def release_turn() -> None:
+        if permit is not None:
+            permit.release()
+        if patient_lock is not None:
+            await patient_lock.release()
+
+    try:
+        # One turn per patient at a time, held until the reply is saved, so this turn reads the previous one
+        patient_lock = await patient_serializer.acquire(payload.patient_id)
+        registered_checkin_context, session_result = await run_stage(
+            "db_context", agent_service.load_kay_context(payload), deadline
+        )
+        duplicate = agent_service.find_duplicate_turn(payload, session_result)
+        if duplicate is None:
+            # Take the LLM slot before the response starts so an overloaded process can still answer 503
+            permit = await kay_admission.acquire(deadline)
+    except PatientBusy as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+    except AdmissionRejected as e:
+        await release_turn()
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e), headers=retry_after_header(e)
+        )
+    except DeadlineExceeded as e:
+        await release_turn()
+        logger.error(f"Error in stream_response: {e}")
+        raise HTTPException(status_code=status.HTTP_504_GATEWAY_TIMEOUT, detail=str(e))
+    except Exception as e:
+        await release_turn()
+        logger.error(f"Error in stream_response: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error generating response: {str(e)}"
+        )
+
+    async def event_stream():
+        chunks = []
+        completed = False
+        try:
+            if duplicate is not None:
+                # A retry of the message that was just answered
+                completed = True
+                yield format_sse_event("token", {"token": duplicate.response})
+                yield format_sse_event("done", {
+                    "patient_id": payload.patient_id,
+                    "chat_saved": True,
+                    "chat_id": duplicate.chat_id,
+                    "degraded": duplicate.response == KAY_DEGRADED_RESPONSE
+                })
+                return
+
+            async for token in llm_service.stream_kay_response(
+                user_message=payload.message,
+                patient_name=payload.name,
+                patient_age=payload.age,
+                patient_gender=payload.gender,
+                checkin_context=registered_checkin_context,
+                conversation_turns=session_result['turns'],
+                conversation_summary=session_result['summary'],
+                prompt_bucket=payload.patient_id,
+                deadline=deadline
+            ):
+                chunks.append(token)
+                yield format_sse_event("token", {"token": token})
+            completed = True
+
+            # Save the assembled reply, shielded so a disconnect right now doesn't drop the write
+            save_result = await asyncio.shield(
+                agent_service.save_kay_reply(payload, session_result, "".join(chunks))
+            )
+
+            logger.info("[KAY-BOT] Streamed response for patient %s", payload.patient_id)
+
+            yield format_sse_event("done", {
+                "patient_id": payload.patient_id,
+                "chat_saved": save_result['success'],
+                "chat_id": save_result.get('chat_id', None),
+                "degraded": False
+            })
+
+        except CircuitOpenError as e:
+            # Raised before any token: answer with the degraded response and regenerate it later
+            completed = True
+            save_result = await asyncio.shield(
+                agent_service.save_degraded_reply(payload, session_result, e.retry_after)
+            )
+            yield format_sse_event("token", {"token": KAY_DEGRADED_RESPONSE})
+            yield format_sse_event("done", {
+                "patient_id": payload.patient_id,
+                "chat_saved": save_result['success'],
+                "chat_id": save_result.get('chat_id', None),
+                "degraded": True
+            })
+        except DeadlineExceeded as e:
+            # The response has already started, so the timeout is reported in the stream; nothing is saved
+            logger.error(f"Error in stream_response: {e}")
+            yield format_sse_event("error", {"detail": str(e)})
+        except (asyncio.CancelledError, GeneratorExit):
+            if not completed:
+                logger.info("[KAY-BOT] Client disconnected mid-stream for patient %s, reply not saved", payload.patient_id)
+            raise
+        except Exception as e:
+            logger.error(f"Error in stream_response: {e}")
+            yield format_sse_event("error", {"detail": f"Error generating response: {str(e)}"})
+        finally:
+            await release_turn()
+
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    # The dependency's response headers are only merged into JSON responses
+    rate_limit = getattr(request.state, "rate_limit", None)
+    if rate_limit is not None:
+        headers.update(rate_limit.headers())
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers=headers,
+        # Also releases the slot and the patient lock if the stream never started
+        background=BackgroundTask(release_turn)
+    )
+
 @router.get("/health")
 async def health_check():
     """Health check endpoint"""
+    breaker_stats = llm_service.get_breaker_stats()
     return {
-        "status": "healthy", 
+        # Degraded while Kay is answering with the degraded-mode response
+        "status": "healthy" if breaker_stats["kay_chat"]["state"] == CLOSED else "degraded",
         "service": "mental-health-agent",
-        "api_auth": APIAuthService.get_api_key_info()
+        "api_auth": APIAuthService.get_api_key_info(),
+        "cache": DatabaseService.get_cache_stats(),
+        "chat_write_behind": chat_write_queue.get_stats(),
+        "prompt_tokens": llm_service.get_prompt_token_stats(),
+        "llm_usage": llm_service.get_usage_stats(),
+        "llm_latency": llm_service.get_latency_stats(),
+        "llm_breakers": breaker_stats,
+        "llm_cassette": llm_service.get_cassette_stats(),
+        "deadlines": stage_stats.get_stats(),
+        "admission": get_admission_stats(),
+        "patient_serialization": patient_serializer.get_stats(),
+        "rate_limits": rate_limiter.get_stats(),
+        "conversation_memory": memory_service.get_stats(),
+        "degraded_regenerations": agent_service.get_regeneration_stats()
     }
 
 @router.get("/health/db")
@@ -108,6 +246,7 @@ async def database_health_check():
             "status": "healthy",
             "database": "connected",
             "connection_pool": pool_stats,
+            "jobs": await job_queue.get_stats() if settings.job_queue_enabled else None,
             "timestamp": datetime.now(UTC).isoformat()
         }
     except Exception as e:
@@ -122,43 +261,46 @@ async def database_health_check():
 
 # Endpoint for creating the summary against registered checkin id
 @router.get("/chat/summary/{patient_id}")
-async def get_chat_summary(patient_id: str, api_key: str = Depends(get_verified_api_key)):
-    """Get the summary of the chat session and update the checkin document"""
+async def get_chat_summary(
+    patient_id: str, force: bool = False, api_key: str = Depends(get_summary_rate_limited_api_key)
+):
+    """
+    Get the summary of the chat session and update the checkin document.
+
+    The stored summary is returned without an LLM call while the check-in is unchanged; force=true regenerates it.
+    """
 
     try:
-        # Getting the checkin context and document ID
-        checkin_result = await DatabaseService.get_patient_checkin_context(patient_id)
-        logger.info(f"[SYSTEM] Checkin result: {checkin_result}")
+        result = await agent_service.summarize_checkin(patient_id, force=force)
 
-        if not checkin_result['found']:
+        if result['status'] == "not_found":
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"No checkin found for patient {patient_id}"
             )
-
-        # Getting the summary of the chat session using the context string
-        context_string = checkin_result['context_string']
-        summary = await llm_service.get_chat_summary(context_string)
-        logger.info(f"[SYSTEM] Generated summary: {summary}")
-
-        # Update the checkin document with the generated summary
-        document_id = checkin_result['document_id']
-        update_result = await DatabaseService.add_checkin_summary(document_id, summary)
-        logger.info(f"[SYSTEM] Update result: {update_result}")
-
-        if not update_result['success']:
-            logger.error(f"Failed to add checkin summary for document_id: {document_id}")
-            # Continue with the response even if updating fails
+        if result['status'] == "failed":
+            raise HTTPException(
+                status_code=status.HTTP_502_BAD_GATEWAY,
+                detail=f"Summary generation failed for patient {patient_id}"
+            )
 
         return {
             "patient_id": patient_id,
-            "document_id": document_id,
-            "summary": summary,
-            "update_success": update_result['success']
+            "document_id": result['document_id'],
+            "summary": result['summary'],
+            "update_success": result['update_success'],
+            "cached": result['cached']
         }
 
     except HTTPException:
         raise
+    except AdmissionRejected as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e), headers=retry_after_header(e)
+        )
+    except DeadlineExceeded as e:
+        logger.error(f"Error in get_chat_summary: {e}")
+        raise HTTPException(status_code=status.HTTP_504_GATEWAY_TIMEOUT, detail=str(e))
     except Exception as e:
         logger.error(f"Error in get_chat_summary: {e}")
         raise HTTPException(
@@ -166,6 +308,146 @@ async def get_chat_summary(patient_id: str, api_key: str = Depends(get_verified_
             detail=f"Error generating summary: {str(e)}"
         )
 
+# Endpoint for clinician dashboards that need summaries for many patients at once
+@router.post("/chat/summary/bulk", response_model=BulkSummaryResponse)
+async def get_chat_summaries_bulk(payload: BulkSummaryRequest, api_key: str = Depends(get_bulk_rate_limited_api_key)):
+    """
+    Summarize the latest check-in of many patients: one aggregation to load the check-ins,
+    LLM calls under a concurrency limit and one bulk write for the summaries
+    """
+
+    if len(set(payload.patient_ids)) > settings.summary_bulk_max_patients:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {settings.summary_bulk_max_patients} patient IDs per request"
+        )
+
+    try:
+        return await agent_service.summarize_checkins_bulk(payload.patient_ids, force=payload.force)
+    except Exception as e:
+        logger.error(f"Error in get_chat_summaries_bulk: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error generating summaries: {str(e)}"
+        )
+
+# Endpoint for the Node.js server to call after it writes a new checkin for a patient
+@router.post("/cache/invalidate/{patient_id}")
+async def invalidate_patient_cache(patient_id: str, api_key: str = Depends(get_verified_api_key)):
+    """Drop the cached check-in and conversation context for a patient"""
+
+    try:
+        invalidate_result = await DatabaseService.invalidate_patient_cache(patient_id)
+        logger.info("[SYSTEM] Cache invalidation result: %s", invalidate_result)
+        return invalidate_result
+
+    except Exception as e:
+        logger.error(f"Error in invalidate_patient_cache: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error invalidating cache: {str(e)}"
+        )
+
+def require_job_queue() -> None:
+    """Reject job requests unless the job queue (and its worker.py tier) is enabled"""
+    if not settings.job_queue_enabled:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Job queue is not enabled"
+        )
+
+async def enqueue_job(job_type: str, payload: Dict[str, Any]) -> JobAcceptedResponse:
+    """Enqueue a job and build the 202 response pointing at its status URL"""
+    try:
+        job_id = await job_queue.enqueue(job_type, payload)
+    except Exception as e:
+        logger.error(f"Error enqueueing {job_type} job: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error enqueueing job: {str(e)}"
+        )
+    return JobAcceptedResponse(job_id=job_id, status="queued", status_url=f"{router.prefix}/jobs/{job_id}")
+
+@router.post("/jobs/kay-bot", status_code=status.HTTP_202_ACCEPTED, response_model=JobAcceptedResponse)
+async def enqueue_kay_bot_job(payload: KayBotPayload, api_key: str = Depends(get_rate_limited_api_key)):
+    """Queue a Kay bot turn for the worker tier; poll GET /agent/jobs/{job_id} for the reply"""
+    require_job_queue()
+    return await enqueue_job("kay_bot", payload.model_dump())
+
+@router.post("/jobs/chat/summary/bulk", status_code=status.HTTP_202_ACCEPTED, response_model=JobAcceptedResponse)
+async def enqueue_bulk_summary_job(payload: BulkSummaryRequest, api_key: str = Depends(get_bulk_rate_limited_api_key)):
+    """Queue a bulk check-in summary for the worker tier; the job result is a BulkSummaryResponse"""
+    require_job_queue()
+    if len(set(payload.patient_ids)) > settings.summary_bulk_max_patients:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {settings.summary_bulk_max_patients} patient IDs per request"
+        )
+    return await enqueue_job("bulk_summary", payload.model_dump())
+
+@router.post("/jobs/chat/summary/{patient_id}", status_code=status.HTTP_202_ACCEPTED, response_model=JobAcceptedResponse)
+async def enqueue_summary_job(
+    patient_id: str, force: bool = False, api_key: str = Depends(get_summary_rate_limited_api_key)
+):
+    """Queue a check-in summary for the worker tier"""
+    require_job_queue()
+    return await enqueue_job("checkin_summary", {"patient_id": patient_id, "force": force})
+
+@router.get("/jobs/{job_id}", response_model=JobStatusResponse)
+async def get_job(job_id: str, wait: float = 0, api_key: str = Depends(get_verified_api_key)):
+    """
+    Get a job's status and result. With wait > 0 the request long-polls for up to that many seconds
+    (capped at job_max_wait_seconds) and returns as soon as the job finishes.
+    """
+    if not ObjectId.is_valid(job_id):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Job {job_id} not found")
+
+    try:
+        if wait > 0:
+            job = await job_queue.wait(job_id, timeout=min(wait, settings.job_max_wait_seconds))
+        else:
+            job = await job_queue.get(job_id)
+    except Exception as e:
+        logger.error(f"Error in get_job: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error reading job: {str(e)}"
+        )
+
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Job {job_id} not found")
+    return job
+
+@router.get("/prompts")
+async def list_prompts(api_key: str = Depends(get_verified_api_key)):
+    """List prompt templates with their variants (version and content hash) and the weights being served"""
+    return {"success": True, "prompts": registry.describe(), "weights_refresh": prompt_weights.get_stats()}
+
+@router.put("/prompts/{name}/variants")
+async def set_prompt_variants(name: str, payload: PromptVariantWeights, api_key: str = Depends(get_verified_api_key)):
+    """
+    Choose which variants of a prompt template are served, e.g. {"weights": {"default": 90, "brief": 10}}.
+    Only registered variants can be weighted (GET /agent/prompts lists them); unknown ones are a 404.
+    The weights apply here at once and in the other API processes and workers within
+    prompt_weights_refresh_seconds.
+    """
+
+    try:
+        await prompt_weights.save(name, payload.weights)
+    except KeyError as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=e.args[0])
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error in set_prompt_variants: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error saving prompt variant weights: {str(e)}"
+        )
+
+    logger.info("[SYSTEM] Prompt variant weights for %s set to %s", name, payload.weights)
+    return {"success": True, "name": name, "prompt": registry.describe()[name]}
+
 @router.get("/auth/test")
 async def test_authentication(api_key: str = Depends(get_verified_api_key)):
     """Test endpoint to verify API key authentication is working"""
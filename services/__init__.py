@@ -1,2 +1 @@
-from .db_service import *
-from .openai_service import *
+# Services package
@@ -0,0 +1,200 @@
+"""
+Admission control for the LLM stage
+Caps concurrent LLM calls per process with a bounded wait queue; requests that can't start within
+the wait budget are shed with a retry hint instead of piling onto a saturated provider
+"""
+
+import math
+import time
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence
+
+from config import settings
+from services.deadline import Deadline
+
+logger = logging.getLogger(__name__)
+
+# Histogram bucket upper bounds
+WAIT_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+QUEUE_DEPTH_BUCKETS = (0, 1, 2, 5, 10, 25, 50, 100, 250)
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request can't get an LLM slot within its wait budget"""
+
+    def __init__(self, name: str, reason: str, retry_after: float):
+        super().__init__(f"{name} is over capacity ({reason})")
+        self.name = name
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class Histogram:
+    """Cumulative-bucket histogram of observed values"""
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = tuple(buckets)
+        self._counts: List[int] = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value: float) -> None:
+        index = next((i for i, bound in enumerate(self.buckets) if value <= bound), len(self.buckets))
+        self._counts[index] += 1
+        self.count += 1
+        self.total += value
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Observations per bucket (cumulative, keyed by upper bound) plus count and sum"""
+        cumulative = 0
+        buckets = {}
+        for bound, count in zip(self.buckets + ("+Inf",), self._counts):
+            cumulative += count
+            buckets[str(bound)] = cumulative
+        return {"buckets": buckets, "count": self.count, "sum": round(self.total, 3)}
+
+
+class Permit:
+    """A held LLM slot; release() is idempotent so it can be called from more than one cleanup path"""
+
+    __slots__ = ("_controller", "_acquired_at", "_released")
+
+    def __init__(self, controller: "AdmissionController"):
+        self._controller = controller
+        self._acquired_at = time.monotonic()
+        self._released = False
+
+    def release(self) -> None:
+        if self._released:
+            return
+        self._released = True
+        self._controller._release(time.monotonic() - self._acquired_at)
+
+
+class AdmissionController:
+    """Concurrency limiter with a bounded FIFO wait queue"""
+
+    def __init__(self, name: str, max_concurrent: int, max_queue: int, max_wait_seconds: float):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.max_wait_seconds = max_wait_seconds
+
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self.in_flight = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = {"queue_full": 0, "wait_timeout": 0}
+        # Moving average of how long a slot is held, used for the Retry-After estimate
+        self._hold_seconds = 1.0
+        self.wait_ms = Histogram(WAIT_BUCKETS_MS)
+        self.queue_depth = Histogram(QUEUE_DEPTH_BUCKETS)
+
+    def retry_after(self) -> float:
+        """Rough seconds until the current queue drains"""
+        return max(self._hold_seconds * (self.waiting + 1) / self.max_concurrent, 1.0)
+
+    def _reject(self, reason: str) -> AdmissionRejected:
+        self.rejected[reason] += 1
+        logger.warning(
+            f"[ADMISSION] {self.name} shedding request ({reason}): "
+            f"{self.in_flight} in flight, {self.waiting} waiting"
+        )
+        return AdmissionRejected(self.name, reason, self.retry_after())
+
+    async def acquire(self, deadline: Optional[Deadline] = None) -> Permit:
+        """
+        Wait for an LLM slot
+
+        Args:
+            deadline: The request deadline; the wait never runs past it
+
+        Returns:
+            Permit: The held slot, to be released once the LLM stage finishes
+
+        Raises:
+            AdmissionRejected: If the wait queue is full or no slot frees up within the wait budget
+        """
+        self.queue_depth.observe(self.waiting)
+        started = time.monotonic()
+
+        if self.waiting == 0 and not self._semaphore.locked():
+            await self._semaphore.acquire()
+        else:
+            if self.waiting >= self.max_queue:
+                raise self._reject("queue_full")
+
+            timeout = self.max_wait_seconds
+            if deadline is not None:
+                timeout = min(timeout, deadline.remaining())
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), timeout=timeout)
+            except asyncio.TimeoutError:
+                raise self._reject("wait_timeout")
+            finally:
+                self.waiting -= 1
+
+        self.wait_ms.observe((time.monotonic() - started) * 1000)
+        self.in_flight += 1
+        self.admitted += 1
+        return Permit(self)
+
+    def _release(self, held_seconds: float) -> None:
+        self.in_flight -= 1
+        self._hold_seconds = 0.9 * self._hold_seconds + 0.1 * held_seconds
+        self._semaphore.release()
+
+    @asynccontextmanager
+    async def slot(self, deadline: Optional[Deadline] = None) -> AsyncIterator[Permit]:
+        """Hold an LLM slot for the duration of the block (see acquire)"""
+        permit = await self.acquire(deadline)
+        try:
+            yield permit
+        finally:
+            permit.release()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get limiter state and wait histograms (for debugging/monitoring)
+
+        Returns:
+            dict: Limits, current in-flight and waiting counts, admissions, rejections and histograms
+        """
+        return {
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "admitted": self.admitted,
+            "rejected": dict(self.rejected),
+            "avg_hold_seconds": round(self._hold_seconds, 3),
+            "wait_ms": self.wait_ms.get_stats(),
+            "queue_depth": self.queue_depth.get_stats()
+        }
+
+
+def retry_after_header(error: AdmissionRejected) -> Dict[str, str]:
+    """Retry-After header (whole seconds) for a shed request"""
+    return {"Retry-After": str(math.ceil(error.retry_after))}
+
+
+kay_admission = AdmissionController(
+    "kay_chat",
+    max_concurrent=settings.kay_llm_max_concurrent,
+    max_queue=settings.kay_llm_max_queue,
+    max_wait_seconds=settings.kay_llm_max_wait_seconds
+)
+summary_admission = AdmissionController(
+    "checkin_summary",
+    max_concurrent=settings.summary_llm_max_concurrent,
+    max_queue=settings.summary_llm_max_queue,
+    max_wait_seconds=settings.summary_llm_max_wait_seconds
+)
+
+
+def get_admission_stats() -> Dict[str, Any]:
+    """Stats of every admission controller, keyed by name"""
+    return {controller.name: controller.get_stats() for controller in (kay_admission, summary_admission)}
@@ -0,0 +1,523 @@
+"""
+Kay bot and check-in summary pipelines
+Shared by the API handlers (inline requests) and the job worker (queued requests)
+"""
+
+import math
+import asyncio
+import logging
+from datetime import datetime, UTC
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from bson import ObjectId
+
+from config import settings
+from models.pydantic_models import KayBotPayload, BulkSummaryResult, BulkSummaryResponse
+from models.context_records import ChatTurn
+from services.db_service import DatabaseService
+from services.openai_service import LLMService, KAY_FALLBACK_RESPONSE, KAY_DEGRADED_RESPONSE
+from services.memory_service import ConversationMemoryService
+from services.deadline import Deadline, run_stage
+from services.circuit_breaker import CircuitOpenError
+from services.admission import kay_admission, summary_admission, AdmissionRejected
+from services.job_queue import job_queue
+from services.patient_lock import patient_serializer, PatientBusy
+from services.metrics import track_stage
+
+logger = logging.getLogger(__name__)
+
+
+class AgentService:
+    """Runs the Kay bot and check-in summary pipelines on top of LLMService and DatabaseService"""
+
+    def __init__(self, llm_service: LLMService, memory_service: ConversationMemoryService):
+        self.llm_service = llm_service
+        self.memory_service = memory_service
+        # Regenerations of degraded replies waiting in this process (when the job queue is disabled)
+        self._regenerations: Set[asyncio.Task] = set()
+        self.regenerations_lost = 0
+
+    async def load_kay_context(self, payload: KayBotPayload) -> Tuple[str, Dict[str, Any]]:
+        """Load the checkin context and the session (recent turns and running summary) for a Kay bot turn"""
+
+        # Get patient's recent chat history and checkin context from the session document
+        with track_stage("session_read"):
+            session_result = await DatabaseService.get_patient_session(payload.patient_id)
+        logger.info("[KAY-BOT] Retrieved %s recent chats for patient %s", session_result['total_count'], payload.patient_id)
+
+        checkin_result = session_result['checkin']
+        logger.info("[KAY-BOT] Checkin context found: %s", checkin_result['found'])
+        registered_checkin_context = ""
+        if checkin_result['found']:
+            registered_checkin_context = checkin_result['context_string']
+        else:
+            # Create basic context from payload if no checkin data
+            registered_checkin_context = f"Patient: {payload.name}, Age: {payload.age}, Gender: {payload.gender}"
+
+        return registered_checkin_context, session_result
+
+    async def save_kay_reply(
+        self,
+        payload: KayBotPayload,
+        session_result: Dict[str, Any],
+        response: str,
+        chat_id: Optional[str] = None,
+        degraded: bool = False
+    ) -> Dict[str, Any]:
+        """
+        Save a Kay bot reply and schedule a memory fold if the session has grown past the threshold
+
+        Args:
+            payload: The Kay bot request
+            session_result: The session the reply was generated from
+            response: The generated reply
+            chat_id: ID to store the chat under (ObjectId string), None to generate one
+            degraded: The reply is the degraded-mode response (not folded into the memory until regenerated)
+
+        Returns:
+            Dictionary containing the save result (see DatabaseService.save_chat_message)
+        """
+        with track_stage("chat_insert"):
+            save_result = await DatabaseService.save_chat_message(
+                patient_id=payload.patient_id,
+                query=payload.message,
+                response=response,
+                chat_id=chat_id,
+                degraded=degraded
+            )
+
+        if not save_result['success']:
+            logger.error(f"Failed to save chat message for patient {payload.patient_id}")
+        elif not degraded:
+            self.memory_service.schedule_fold(payload.patient_id, session_result['total_count'] + 1)
+        return save_result
+
+    async def save_degraded_reply(
+        self,
+        payload: KayBotPayload,
+        session_result: Dict[str, Any],
+        retry_after: float,
+        chat_id: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Save the degraded-mode reply and schedule its regeneration for when the LLM recovers: as a job
+        with the job queue enabled, otherwise in this process (see schedule_regeneration)
+
+        Args:
+            payload: The Kay bot request
+            session_result: The session the reply was answered from
+            retry_after: Seconds until the kay_chat breaker lets calls through again
+            chat_id: ID to store the chat under (ObjectId string), None to generate one
+
+        Returns:
+            Dictionary containing the save result plus regeneration_job_id (None if not queued as a job)
+        """
+        logger.warning(f"[KAY-BOT] LLM unavailable, sending the degraded response to patient {payload.patient_id}")
+        save_result = await self.save_kay_reply(
+            payload, session_result, KAY_DEGRADED_RESPONSE, chat_id=chat_id, degraded=True
+        )
+
+        regeneration_job_id = None
+        if save_result['success'] and not settings.job_queue_enabled:
+            self.schedule_regeneration(payload, save_result['chat_id'], retry_after)
+        elif save_result['success']:
+            try:
+                regeneration_job_id = await job_queue.enqueue(
+                    "kay_regenerate",
+                    {**payload.model_dump(), "chat_id": save_result['chat_id']},
+                    delay_seconds=retry_after
+                )
+            except Exception as e:
+                logger.error(f"Failed to queue regeneration of chat {save_result['chat_id']}: {e}")
+
+        return {**save_result, "regeneration_job_id": regeneration_job_id}
+
+    def schedule_regeneration(self, payload: KayBotPayload, chat_id: str, retry_after: float) -> None:
+        """
+        Regenerate a degraded reply in the background once the kay_chat breaker lets calls through.
+        Pending regenerations are lost if the process stops; enable the job queue to keep them durable.
+
+        Args:
+            payload: The original Kay bot request
+            chat_id: ID of the degraded chat (ObjectId string)
+            retry_after: Seconds until the kay_chat breaker lets calls through again
+        """
+        task = asyncio.create_task(self._regenerate_later(payload, chat_id, retry_after))
+        self._regenerations.add(task)
+        task.add_done_callback(self._regenerations.discard)
+
+    async def _regenerate_later(self, payload: KayBotPayload, chat_id: str, delay: float) -> None:
+        attempts = 0
+        while True:
+            await asyncio.sleep(delay)
+            try:
+                patient_lock = await patient_serializer.acquire(payload.patient_id)
+                try:
+                    await self.regenerate_kay_reply(payload, chat_id)
+                finally:
+                    await patient_lock.release()
+                return
+            except (CircuitOpenError, AdmissionRejected) as e:
+                # Wait out the outage or overload without using up attempts
+                delay = max(e.retry_after, 1.0)
+            except PatientBusy:
+                delay = 1.0
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                attempts += 1
+                if attempts >= settings.llm_degraded_regenerate_attempts:
+                    logger.error(f"[KAY-BOT] Giving up regenerating chat {chat_id}: {e}")
+                    return
+                delay = 2.0 ** attempts
+                logger.warning(f"[KAY-BOT] Regenerating chat {chat_id} failed, retrying in {delay:.0f}s: {e}")
+
+    async def stop_regenerations(self) -> None:
+        """Cancel the regenerations still waiting in this process (used on shutdown)"""
+        if not self._regenerations:
+            return
+        self.regenerations_lost += len(self._regenerations)
+        logger.warning(
+            "[KAY-BOT] %s degraded replies not regenerated before shutdown", len(self._regenerations)
+        )
+        for task in self._regenerations:
+            task.cancel()
+        await asyncio.gather(*self._regenerations, return_exceptions=True)
+
+    def get_regeneration_stats(self) -> Dict[str, Any]:
+        """
+        Get in-process regeneration counters (for debugging/monitoring)
+
+        Returns:
+            dict: Degraded replies waiting to be regenerated in this process, and those dropped on shutdown
+        """
+        return {
+            "durable": settings.job_queue_enabled,
+            "pending": len(self._regenerations),
+            "lost": self.regenerations_lost
+        }
+
+    @staticmethod
+    def find_duplicate_turn(payload: KayBotPayload, session_result: Dict[str, Any]) -> Optional[ChatTurn]:
+        """
+        Find a just-saved turn for the same message, e.g. a client retry that reached another process
+        after the first attempt finished
+
+        Args:
+            payload: The Kay bot request
+            session_result: The session loaded for the request (turns newest first)
+
+        Returns:
+            The latest turn if it has the same message and is within kay_duplicate_window_seconds, else None
+        """
+        if settings.kay_duplicate_window_seconds <= 0 or not session_result['turns']:
+            return None
+        latest = session_result['turns'][0]
+        if latest.query != payload.message or latest.created_at is None or latest.response == KAY_FALLBACK_RESPONSE:
+            return None
+        created_at = latest.created_at if latest.created_at.tzinfo else latest.created_at.replace(tzinfo=UTC)
+        if (datetime.now(UTC) - created_at).total_seconds() > settings.kay_duplicate_window_seconds:
+            return None
+        return latest
+
+    async def run_kay_bot(self, payload: KayBotPayload, chat_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Generate and save a Kay bot reply within the kay_request_budget_seconds deadline.
+        The context read and the LLM call share the budget; the save always runs so a generated reply isn't lost.
+
+        Args:
+            payload: The Kay bot request
+            chat_id: ID to store the chat under (ObjectId string), None to generate one
+
+        Returns:
+            Dictionary with the response, patient_id, chat_saved, chat_id and degraded
+            (True if the LLM's breaker was open and the degraded-mode response was sent)
+
+        Raises:
+            DeadlineExceeded: If the context read or the LLM call uses up the whole budget (nothing is saved)
+            AdmissionRejected: If no LLM slot frees up within the wait budget
+        """
+        deadline = Deadline(settings.kay_request_budget_seconds)
+        registered_checkin_context, session_result = await run_stage(
+            "db_context", self.load_kay_context(payload), deadline
+        )
+
+        duplicate = self.find_duplicate_turn(payload, session_result)
+        if duplicate is not None:
+            logger.info("[KAY-BOT] Repeated message for patient %s, returning the saved reply", payload.patient_id)
+            return {
+                "response": duplicate.response,
+                "patient_id": payload.patient_id,
+                "chat_saved": True,
+                "chat_id": duplicate.chat_id,
+                "degraded": duplicate.response == KAY_DEGRADED_RESPONSE
+            }
+
+        # Generate response using LLM service
+        try:
+            async with kay_admission.slot(deadline):
+                response = await self.llm_service.generate_kay_response(
+                    user_message=payload.message,
+                    patient_name=payload.name,
+                    patient_age=payload.age,
+                    patient_gender=payload.gender,
+                    checkin_context=registered_checkin_context,
+                    conversation_turns=session_result['turns'],
+                    conversation_summary=session_result['summary'],
+                    prompt_bucket=payload.patient_id,
+                    deadline=deadline
+                )
+        except CircuitOpenError as e:
+            save_result = await self.save_degraded_reply(payload, session_result, e.retry_after, chat_id=chat_id)
+            return {
+                "response": KAY_DEGRADED_RESPONSE,
+                "patient_id": payload.patient_id,
+                "chat_saved": save_result['success'],
+                "chat_id": save_result.get('chat_id', None),
+                "degraded": True
+            }
+
+        # Save the conversation to database
+        save_result = await self.save_kay_reply(payload, session_result, response, chat_id=chat_id)
+
+        logger.info("[KAY-BOT] Generated response for patient %s", payload.patient_id)
+
+        return {
+            "response": response,
+            "patient_id": payload.patient_id,
+            "chat_saved": save_result['success'],
+            "chat_id": save_result.get('chat_id', None),
+            "degraded": False
+        }
+
+    async def regenerate_kay_reply(self, payload: KayBotPayload, chat_id: str) -> Dict[str, Any]:
+        """
+        Replace a degraded-mode reply with a generated one, using the history from before that turn
+
+        Args:
+            payload: The original Kay bot request
+            chat_id: ID of the degraded chat (ObjectId string)
+
+        Returns:
+            Dictionary with the response, patient_id, chat_id and regenerated
+            (False if the chat was already regenerated or no longer exists)
+
+        Raises:
+            CircuitOpenError: If the kay_chat breaker is still open
+            AdmissionRejected: If no LLM slot frees up within the wait budget
+            DeadlineExceeded: If the LLM call doesn't finish within the request budget
+            RuntimeError: If the LLM call failed
+        """
+        registered_checkin_context, session_result = await self.load_kay_context(payload)
+
+        # Only the turns the patient had sent before the degraded one (turns are newest first)
+        turns = session_result['turns']
+        position = next((i for i, turn in enumerate(turns) if turn.chat_id == chat_id), None)
+        if position is not None:
+            turns = turns[position + 1:]
+
+        deadline = Deadline(settings.kay_request_budget_seconds)
+        async with kay_admission.slot(deadline):
+            response = await self.llm_service.generate_kay_response(
+                user_message=payload.message,
+                patient_name=payload.name,
+                patient_age=payload.age,
+                patient_gender=payload.gender,
+                checkin_context=registered_checkin_context,
+                conversation_turns=turns,
+                conversation_summary=session_result['summary'],
+                prompt_bucket=payload.patient_id,
+                deadline=deadline
+            )
+        if response == KAY_FALLBACK_RESPONSE:
+            raise RuntimeError(f"Regenerating chat {chat_id} failed")
+
+        with track_stage("chat_update"):
+            update_result = await DatabaseService.replace_chat_response(chat_id, payload.patient_id, response)
+        logger.info("[KAY-BOT] Regenerate chat %s: %s", chat_id, update_result['message'])
+
+        return {
+            "response": response,
+            "patient_id": payload.patient_id,
+            "chat_id": chat_id,
+            "regenerated": update_result['success']
+        }
+
+    async def summarize_checkin(self, patient_id: str, force: bool = False) -> Dict[str, Any]:
+        """
+        Summarize a patient's latest check-in and store the summary on the checkin document.
+        The stored summary is returned without an LLM call while the check-in is unchanged, unless force is set.
+
+        Args:
+            patient_id: ID of the patient (ObjectId string)
+            force: Regenerate the summary even if the stored one is current
+
+        Returns:
+            Dictionary with status (summarized, cached, not_found or failed), patient_id, document_id,
+            summary, update_success and cached
+
+        Raises:
+            AdmissionRejected: If no LLM slot frees up within the wait budget
+        """
+        deadline = Deadline(settings.summary_request_budget_seconds)
+
+        # Getting the checkin context and document ID
+        with track_stage("checkin_read"):
+            checkin_result = await run_stage(
+                "db_checkin", DatabaseService.get_patient_checkin_context(patient_id), deadline
+            )
+
+        if checkin_result['found'] and (force or not checkin_result['checkin'].has_current_summary()):
+            # About to call the LLM: re-read the document in case another worker summarized it since it was cached
+            with track_stage("checkin_read"):
+                checkin_result = await run_stage(
+                    "db_checkin", DatabaseService.get_patient_checkin_context(patient_id, use_cache=False), deadline
+                )
+
+        if not checkin_result['found']:
+            return {"status": "not_found", "patient_id": patient_id}
+
+        checkin = checkin_result['checkin']
+        document_id = checkin_result['document_id']
+        summary_hash = checkin.summary_key()
+
+        if not force and checkin.has_current_summary():
+            logger.info("[SYSTEM] Check-in %s unchanged since its last summary, returning the stored summary", document_id)
+            return {
+                "status": "cached",
+                "patient_id": patient_id,
+                "document_id": document_id,
+                "summary": checkin.message,
+                "update_success": True,
+                "cached": True
+            }
+
+        # Summarize the check-in with the patient's own message, not a previously stored summary
+        async with summary_admission.slot(deadline):
+            summary = await self.llm_service.get_chat_summary(checkin.to_summary_input(), deadline=deadline)
+        if summary is None:
+            return {"status": "failed", "patient_id": patient_id, "document_id": document_id}
+        # Only the length: the summary describes the patient's check-in
+        logger.info("[SYSTEM] Generated summary for check-in %s (%s chars)", document_id, len(summary))
+
+        # Update the checkin document with the generated summary
+        with track_stage("summary_write"):
+            update_result = await DatabaseService.add_checkin_summary(
+                document_id,
+                summary,
+                summary_hash=summary_hash,
+                original_message=checkin.summary_source_message
+            )
+        logger.info("[SYSTEM] Stored summary for check-in %s: %s", document_id, update_result['success'])
+
+        if not update_result['success']:
+            logger.error(f"Failed to add checkin summary for document_id: {document_id}")
+            # Continue with the response even if updating fails
+
+        return {
+            "status": "summarized",
+            "patient_id": patient_id,
+            "document_id": document_id,
+            "summary": summary,
+            "update_success": update_result['success'],
+            "cached": False
+        }
+
+    async def summarize_checkins_bulk(self, patient_ids: List[str], force: bool = False) -> BulkSummaryResponse:
+        """
+        Summarize the latest check-in of many patients: one aggregation to load the check-ins,
+        LLM calls under a concurrency limit and one bulk write for the summaries
+
+        Args:
+            patient_ids: IDs of the patients (duplicates are ignored)
+            force: Regenerate summaries even where the stored one is current
+
+        Returns:
+            BulkSummaryResponse: One result per patient, in request order, plus totals
+        """
+        patient_ids = list(dict.fromkeys(patient_ids))
+
+        results: Dict[str, BulkSummaryResult] = {}
+        valid_ids = []
+        for patient_id in patient_ids:
+            if ObjectId.is_valid(patient_id):
+                valid_ids.append(patient_id)
+            else:
+                results[patient_id] = BulkSummaryResult(patient_id=patient_id, status="invalid_id")
+
+        with track_stage("checkin_read"):
+            checkins = await DatabaseService.get_latest_checkins(valid_ids) if valid_ids else {}
+
+        semaphore = asyncio.Semaphore(settings.summary_bulk_concurrency)
+        generated = []
+
+        async def summarize(patient_id: str, checkin) -> None:
+            if not force and checkin.has_current_summary():
+                results[patient_id] = BulkSummaryResult(
+                    patient_id=patient_id, status="cached", document_id=checkin.document_id,
+                    summary=checkin.message, update_success=True
+                )
+                return
+
+            async with semaphore:
+                # Each call gets its own budget once it has a slot, and shares the process-wide summary
+                # LLM capacity with single summaries
+                deadline = Deadline(settings.summary_request_budget_seconds)
+                try:
+                    async with summary_admission.slot(deadline):
+                        summary = await self.llm_service.get_chat_summary(
+                            checkin.to_summary_input(), deadline=deadline
+                        )
+                except AdmissionRejected as e:
+                    results[patient_id] = BulkSummaryResult(
+                        patient_id=patient_id, status="shed", document_id=checkin.document_id,
+                        error=f"Over capacity ({e.reason}), retry in {math.ceil(e.retry_after)}s"
+                    )
+                    return
+            if summary is None:
+                results[patient_id] = BulkSummaryResult(
+                    patient_id=patient_id, status="failed", document_id=checkin.document_id,
+                    error="Summary generation failed"
+                )
+                return
+
+            results[patient_id] = BulkSummaryResult(
+                patient_id=patient_id, status="summarized", document_id=checkin.document_id, summary=summary
+            )
+            generated.append({"checkin": checkin, "summary": summary, "summary_hash": checkin.summary_key()})
+
+        await asyncio.gather(*(summarize(patient_id, checkin) for patient_id, checkin in checkins.items()))
+
+        # Write every generated summary back at once
+        with track_stage("summary_write"):
+            update_results = await DatabaseService.add_checkin_summaries_bulk(generated)
+        for entry in generated:
+            result = results[entry['checkin'].patient_id]
+            update_result = update_results[entry['checkin'].document_id]
+            result.update_success = update_result['success']
+            if not update_result['success']:
+                result.error = update_result['message']
+
+        for patient_id in valid_ids:
+            if patient_id not in results:
+                results[patient_id] = BulkSummaryResult(patient_id=patient_id, status="not_found")
+
+        ordered = [results[patient_id] for patient_id in patient_ids]
+        summarized = sum(1 for result in ordered if result.status == "summarized")
+        cached = sum(1 for result in ordered if result.status == "cached")
+        failed = sum(
+            1 for result in ordered
+            if result.status in ("failed", "shed") or (result.status == "summarized" and not result.update_success)
+        )
+        logger.info(
+            "[SYSTEM] Bulk summary for %d patients: %d summarized, %d cached, %d failed",
+            len(patient_ids), summarized, cached, failed
+        )
+
+        return BulkSummaryResponse(results=ordered, summarized=summarized, cached=cached, failed=failed)
+
+
+# Shared by the API process and the job worker
+llm_service = LLMService()
+memory_service = ConversationMemoryService(llm_service)
+agent_service = AgentService(llm_service, memory_service)
@@ -4,15 +4,20 @@ Handles authentication between Node.js server and FastAPI server using secret ke
 """
 
 import logging
-from fastapi import Security, HTTPException, status
+from fastapi import Security, Depends, HTTPException, Request, Response, status
 from fastapi.security import APIKeyHeader
 from config import settings
+from services.rate_limiter import rate_limiter, RateLimitExceeded
 
 logger = logging.getLogger(__name__)
 
 # API Key configuration
 API_KEY_NAME = "X-API-Key"
 API_KEY = settings.server_api_key
+# Accepted keys by value -> key name (used for per-key rate limits)
+API_KEYS = {key: name for name, key in settings.server_api_keys.items() if key}
+if API_KEY:
+    API_KEYS[API_KEY] = "default"
 
 # Create API key header security scheme
 api_key_header = APIKeyHeader(name=API_KEY_NAME, auto_error=False)
@@ -44,8 +49,8 @@ class APIAuthService:
                     headers={"WWW-Authenticate": "ApiKey"}
                 )
             
-            # Check if API key matches the configured key
-            if api_key != API_KEY:
+            # Check if API key matches one of the configured keys
+            if api_key not in API_KEYS:
                 logger.warning(f"Invalid API key provided: {api_key[:8]}...")
                 raise HTTPException(
                     status_code=status.HTTP_401_UNAUTHORIZED,
@@ -67,6 +72,19 @@ class APIAuthService:
                 detail="Internal authentication error"
             )
     
+    @staticmethod
+    def get_key_name(api_key: str) -> str:
+        """
+        Get the name of a verified API key
+
+        Args:
+            api_key: The verified API key
+
+        Returns:
+            str: The key's name ("default" for server_api_key)
+        """
+        return API_KEYS.get(api_key, "unknown")
+
     @staticmethod
     def is_api_key_configured() -> bool:
         """
@@ -89,7 +107,8 @@ class APIAuthService:
             "api_key_configured": APIAuthService.is_api_key_configured(),
             "api_key_header_name": API_KEY_NAME,
             "api_key_length": len(API_KEY) if API_KEY else 0,
-            "api_key_prefix": API_KEY[:8] + "..." if API_KEY and len(API_KEY) > 8 else "Not configured"
+            "api_key_prefix": API_KEY[:8] + "..." if API_KEY and len(API_KEY) > 8 else "Not configured",
+            "api_key_names": sorted(API_KEYS.values())
         }
 
 # Convenience function for dependency injection
@@ -104,3 +123,79 @@ async def get_verified_api_key(api_key: str = Security(api_key_header)) -> str:
             pass
     """
     return await APIAuthService.verify_api_key(api_key)
+
+async def rate_limit_request(request: Request, response: Response, api_key: str, patient_scope: str) -> None:
+    """
+    Take a token from the key's bucket and, when the request names a patient (patient_id path parameter
+    or JSON body field), from the patient's bucket for patient_scope. With patient_scope "bulk" it
+    instead takes one token per distinct patient_ids entry in the JSON body from the key's bulk bucket. The RateLimit-* headers are set on
+    the dependency response (merged into JSON responses) and the decision is kept on
+    request.state.rate_limit for endpoints that return their own Response, like streams.
+
+    Raises:
+        HTTPException: 429 with Retry-After and RateLimit-* headers if a bucket is empty
+    """
+    patient_id = request.path_params.get("patient_id")
+    bulk_patients = 0
+    if patient_id is None and request.headers.get("content-type", "").startswith("application/json"):
+        # Already read and cached on the request by FastAPI while parsing the endpoint's payload
+        body = await request.json()
+        if isinstance(body, dict) and patient_scope == "bulk":
+            bulk_patients = len(set(map(str, body.get("patient_ids") or [])))
+        elif isinstance(body, dict) and body.get("patient_id"):
+            patient_id = str(body["patient_id"])
+
+    try:
+        decision = await rate_limiter.check(
+            APIAuthService.get_key_name(api_key), patient_id, patient_scope, bulk_patients=bulk_patients
+        )
+    except RateLimitExceeded as e:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=str(e),
+            headers=e.decision.headers()
+        )
+    request.state.rate_limit = decision
+    response.headers.update(decision.headers())
+
+async def get_rate_limited_api_key(
+    request: Request, response: Response, api_key: str = Depends(get_verified_api_key)
+) -> str:
+    """
+    FastAPI dependency for API key verification plus rate limiting against the key's bucket and the
+    patient's Kay bot bucket. Use it on endpoints that call the LLM.
+
+    Raises:
+        HTTPException: 429 with Retry-After and RateLimit-* headers if a bucket is empty
+    """
+    if settings.rate_limit_enabled:
+        await rate_limit_request(request, response, api_key, "patient")
+    return api_key
+
+async def get_summary_rate_limited_api_key(
+    request: Request, response: Response, api_key: str = Depends(get_verified_api_key)
+) -> str:
+    """
+    Like get_rate_limited_api_key, but charges the patient's check-in summary bucket, so the Node
+    server polling a patient's summary doesn't use up that patient's Kay bot turns
+
+    Raises:
+        HTTPException: 429 with Retry-After and RateLimit-* headers if a bucket is empty
+    """
+    if settings.rate_limit_enabled:
+        await rate_limit_request(request, response, api_key, "summary")
+    return api_key
+
+async def get_bulk_rate_limited_api_key(
+    request: Request, response: Response, api_key: str = Depends(get_verified_api_key)
+) -> str:
+    """
+    Like get_rate_limited_api_key, but for bulk summary requests: charges one token per requested
+    patient from the key's bulk bucket, so a single call for hundreds of patients costs accordingly
+
+    Raises:
+        HTTPException: 429 with Retry-After and RateLimit-* headers if a bucket doesn't have enough tokens
+    """
+    if settings.rate_limit_enabled:
+        await rate_limit_request(request, response, api_key, "bulk")
+    return api_key
@@ -0,0 +1,134 @@
+"""
+Cross-process invalidation of the context caches
+The check-in and session caches live in each process. With redis_url set, every process publishes the
+patients whose context it wrote, and drops its cached entries for patients written by other processes
+(API processes and job workers), so a process doesn't keep serving context another one has changed.
+Without redis_url there is no invalidation between processes: run a single API process, or accept
+context up to cache_ttl_seconds old after another process writes. Pub/sub delivery is best effort,
+so a message lost while a process is reconnecting also falls back to the TTL.
+"""
+
+import uuid
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional, Set
+
+from config import settings
+from services.cache_service import TTLCache
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "kay:cache:invalidate"
+
+
+class CacheInvalidationBus:
+    """Publishes written patient IDs to a Redis channel and invalidates the registered caches on messages from other processes"""
+
+    def __init__(self, redis_url: Optional[str] = None, channel: str = CHANNEL):
+        self.redis_url = redis_url
+        self.channel = channel
+        # Identifies this process's own messages, which need no invalidation (writes update the cache directly)
+        self.origin = uuid.uuid4().hex
+        self.caches: List[TTLCache] = []
+        self._redis = None
+        self._listener: Optional[asyncio.Task] = None
+        self._publishes: Set[asyncio.Task] = set()
+
+        self.published = 0
+        self.received = 0
+        self.errors = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.redis_url is not None
+
+    def _get_redis(self):
+        if self._redis is None:
+            # Only needed for multi-process deployments
+            import redis.asyncio as redis
+            self._redis = redis.from_url(self.redis_url)
+        return self._redis
+
+    def register(self, *caches: TTLCache) -> None:
+        """Caches (keyed by patient ID) to invalidate when another process writes a patient's context"""
+        self.caches.extend(caches)
+
+    def publish(self, *patient_ids: str) -> None:
+        """
+        Tell the other processes these patients' context changed. Sent in the background so the
+        write path doesn't wait on Redis.
+
+        Args:
+            patient_ids: IDs of the patients whose check-in or session was written
+        """
+        if not self.enabled or not patient_ids:
+            return
+        task = asyncio.create_task(self._publish(f"{self.origin} {','.join(patient_ids)}"))
+        self._publishes.add(task)
+        task.add_done_callback(self._publishes.discard)
+
+    async def _publish(self, message: str) -> None:
+        try:
+            await self._get_redis().publish(self.channel, message)
+            self.published += 1
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"[CACHE] Failed to publish cache invalidation: {e}")
+
+    def _apply(self, message: bytes) -> None:
+        origin, _, patient_ids = message.decode().partition(" ")
+        if origin == self.origin:
+            return
+        self.received += 1
+        for patient_id in patient_ids.split(","):
+            for cache in self.caches:
+                cache.invalidate(patient_id)
+
+    async def _listen(self) -> None:
+        while True:
+            pubsub = self._get_redis().pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.subscribe(self.channel)
+                async for message in pubsub.listen():
+                    if message.get("type") == "message":
+                        self._apply(message["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.errors += 1
+                logger.warning(f"[CACHE] Invalidation subscription lost, reconnecting: {e}")
+                await asyncio.sleep(1.0)
+            finally:
+                await pubsub.aclose()
+
+    async def start(self) -> None:
+        """Start listening for other processes' invalidations (no-op without redis_url)"""
+        if self.enabled and self._listener is None:
+            self._listener = asyncio.create_task(self._listen())
+
+    async def stop(self) -> None:
+        """Stop listening and wait for in-flight publishes"""
+        if self._listener is not None:
+            self._listener.cancel()
+            await asyncio.gather(self._listener, return_exceptions=True)
+            self._listener = None
+        if self._publishes:
+            await asyncio.wait(list(self._publishes), timeout=5.0)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get invalidation counters (for debugging/monitoring)
+
+        Returns:
+            dict: Whether invalidation is shared between processes, messages published and received, errors
+        """
+        return {
+            "cross_process": self.enabled,
+            "published": self.published,
+            "received": self.received,
+            "errors": self.errors
+        }
+
+
+# Global cache invalidation instance
+cache_invalidation = CacheInvalidationBus(settings.redis_url)
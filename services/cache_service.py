@@ -0,0 +1,163 @@
+"""
+In-process LRU cache with TTL expiry and a memory cap
+Used by DatabaseService to avoid re-reading patient context written by this same process
+"""
+
+import sys
+import time
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def estimate_size(value: Any) -> int:
+    """
+    Roughly estimate the memory footprint of a cached value in bytes
+
+    Args:
+        value: The value to measure (nested dicts, lists, strings, scalars)
+
+    Returns:
+        int: Approximate size in bytes
+    """
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(estimate_size(k) + estimate_size(v) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(estimate_size(item) for item in value)
+    if hasattr(type(value), "__slots__"):
+        return sys.getsizeof(value) + sum(
+            estimate_size(getattr(value, slot, None)) for slot in type(value).__slots__
+        )
+    return sys.getsizeof(value)
+
+
+class TTLCache:
+    """Bounded LRU cache whose entries expire after a fixed time-to-live"""
+
+    def __init__(self, name: str, max_entries: int, max_bytes: int, ttl_seconds: float):
+        self.name = name
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        # key -> (expires_at, size, value), ordered from least to most recently used
+        self._entries: "OrderedDict[Hashable, Tuple[float, int, Any]]" = OrderedDict()
+        self._total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """
+        Get a value from the cache
+
+        Args:
+            key: The cache key
+
+        Returns:
+            The cached value, or None on a miss or expired entry
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        expires_at, _, value = entry
+        if expires_at <= time.monotonic():
+            self._remove(key)
+            self.expirations += 1
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """
+        Store a value, evicting least recently used entries past the entry or memory cap
+
+        Args:
+            key: The cache key
+            value: The value to store
+        """
+        size = estimate_size(value)
+        if size > self.max_bytes:
+            logger.warning(f"[CACHE] {self.name}: value for {key} exceeds the cache memory cap, not cached")
+            self._remove(key)
+            return
+
+        self._remove(key)
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, size, value)
+        self._total_bytes += size
+
+        while len(self._entries) > self.max_entries or self._total_bytes > self.max_bytes:
+            oldest_key = next(iter(self._entries))
+            self._remove(oldest_key)
+            self.evictions += 1
+
+    def peek(self, key: Hashable) -> Optional[Any]:
+        """
+        Get a live value without touching LRU order or hit/miss counters (used for write-through)
+
+        Args:
+            key: The cache key
+
+        Returns:
+            The cached value, or None if absent or expired
+        """
+        entry = self._entries.get(key)
+        if entry is None or entry[0] <= time.monotonic():
+            return None
+        return entry[2]
+
+    def invalidate(self, key: Hashable) -> bool:
+        """
+        Remove a key from the cache
+
+        Args:
+            key: The cache key
+
+        Returns:
+            bool: True if an entry was removed
+        """
+        if key in self._entries:
+            self._remove(key)
+            self.invalidations += 1
+            return True
+        return False
+
+    def clear(self) -> None:
+        """Remove every entry from the cache"""
+        self._entries.clear()
+        self._total_bytes = 0
+
+    def _remove(self, key: Hashable) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._total_bytes -= entry[1]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get cache statistics (for debugging/monitoring)
+
+        Returns:
+            dict: Entry counts, memory usage and hit/miss/eviction counters
+        """
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "bytes": self._total_bytes,
+            "max_bytes": self.max_bytes,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations
+        }
@@ -0,0 +1,201 @@
+"""
+Write-behind queue for chat persistence
+Buffers chat documents in memory and flushes them to MongoDB in batches on a size/time threshold
+"""
+
+import time
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Flush callback: receives a batch of chat documents and returns the documents that failed to persist
+FlushCallback = Callable[[List[Dict[str, Any]]], Awaitable[List[Dict[str, Any]]]]
+
+
+class ChatWriteBehindQueue:
+    """In-process async queue that batches chat inserts"""
+
+    def __init__(
+        self,
+        flush_callback: FlushCallback,
+        batch_size: int,
+        flush_interval_ms: int,
+        max_pending: int,
+        max_attempts: int = 5
+    ):
+        self.flush_callback = flush_callback
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_pending = max_pending
+        self.max_attempts = max_attempts
+
+        self._buffer: List[Dict[str, Any]] = []
+        # patient ObjectId string -> documents enqueued but not yet persisted (read-your-writes)
+        self._pending_by_patient: Dict[str, List[Dict[str, Any]]] = {}
+        self._attempts: Dict[Any, int] = {}
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+
+        # Stats
+        self.enqueued = 0
+        self.flushed = 0
+        self.dropped = 0
+        self.batches = 0
+        self.failed_batches = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+        self._total_flush_ms = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    @property
+    def depth(self) -> int:
+        return len(self._buffer)
+
+    def has_capacity(self) -> bool:
+        """Check whether the queue is running and below its pending limit"""
+        return self.running and not self._stopping and len(self._buffer) < self.max_pending
+
+    async def start(self) -> None:
+        """Start the background flusher"""
+        if self.running:
+            return
+        self._stopping = False
+        self._task = asyncio.create_task(self._run())
+        logger.info(
+            f"Chat write-behind queue started: batch_size={self.batch_size}, "
+            f"flush_interval={self.flush_interval}s, max_pending={self.max_pending}"
+        )
+
+    async def stop(self) -> None:
+        """Stop the flusher and drain every pending document"""
+        if self._task is None:
+            return
+        self._stopping = True
+        self._wakeup.set()
+        await self._task
+        self._task = None
+
+        # Drain until empty; documents are dropped after max_attempts so this terminates
+        while self._buffer:
+            await self.flush()
+        logger.info("Chat write-behind queue drained: flushed=%d, dropped=%d", self.flushed, self.dropped)
+
+    def enqueue(self, chat_document: Dict[str, Any]) -> None:
+        """
+        Add a chat document to the queue. The document must already carry its _id.
+
+        Args:
+            chat_document: The chat document to persist
+        """
+        self._buffer.append(chat_document)
+        patient_id = str(chat_document['patient'])
+        self._pending_by_patient.setdefault(patient_id, []).append(chat_document)
+        self.enqueued += 1
+        if len(self._buffer) >= self.batch_size:
+            self._wakeup.set()
+
+    def pending_for(self, patient_id: str) -> List[Dict[str, Any]]:
+        """
+        Get the chat documents for a patient that are queued but not yet persisted
+
+        Args:
+            patient_id: ID of the patient (ObjectId string)
+
+        Returns:
+            List of pending chat documents, oldest first
+        """
+        return list(self._pending_by_patient.get(patient_id, []))
+
+    async def _run(self) -> None:
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Unexpected error in chat write-behind flusher: {e}")
+
+    async def flush(self) -> None:
+        """Flush buffered documents in batches of batch_size"""
+        async with self._flush_lock:
+            while self._buffer:
+                batch = self._buffer[:self.batch_size]
+                del self._buffer[:len(batch)]
+
+                start = time.perf_counter()
+                try:
+                    failed = await self.flush_callback(batch)
+                except Exception as e:
+                    logger.error(f"Chat write-behind flush failed for {len(batch)} documents: {e}")
+                    failed = batch
+                elapsed_ms = (time.perf_counter() - start) * 1000
+
+                self.batches += 1
+                self.last_flush_ms = elapsed_ms
+                self.max_flush_ms = max(self.max_flush_ms, elapsed_ms)
+                self._total_flush_ms += elapsed_ms
+
+                failed_ids = {doc['_id'] for doc in failed}
+                for doc in batch:
+                    if doc['_id'] not in failed_ids:
+                        self._mark_done(doc)
+                        self.flushed += 1
+
+                if failed:
+                    self.failed_batches += 1
+                    retry = []
+                    for doc in failed:
+                        attempts = self._attempts.get(doc['_id'], 0) + 1
+                        if attempts >= self.max_attempts:
+                            logger.error(
+                                f"Dropping chat {doc['_id']} for patient {doc['patient']} after {attempts} failed attempts"
+                            )
+                            self._mark_done(doc)
+                            self.dropped += 1
+                        else:
+                            self._attempts[doc['_id']] = attempts
+                            retry.append(doc)
+                    # Put failures back at the front and wait for the next interval before retrying
+                    self._buffer[:0] = retry
+                    break
+
+    def _mark_done(self, doc: Dict[str, Any]) -> None:
+        self._attempts.pop(doc['_id'], None)
+        patient_id = str(doc['patient'])
+        pending = self._pending_by_patient.get(patient_id)
+        if pending is None:
+            return
+        pending[:] = [item for item in pending if item['_id'] != doc['_id']]
+        if not pending:
+            del self._pending_by_patient[patient_id]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get queue statistics (for debugging/monitoring)
+
+        Returns:
+            dict: Queue depth, throughput counters and flush latency
+        """
+        return {
+            "running": self.running,
+            "depth": self.depth,
+            "max_pending": self.max_pending,
+            "enqueued": self.enqueued,
+            "flushed": self.flushed,
+            "dropped": self.dropped,
+            "batches": self.batches,
+            "failed_batches": self.failed_batches,
+            "last_flush_ms": round(self.last_flush_ms, 2),
+            "avg_flush_ms": round(self._total_flush_ms / self.batches, 2) if self.batches else 0.0,
+            "max_flush_ms": round(self.max_flush_ms, 2)
+        }
@@ -0,0 +1,187 @@
+"""
+Circuit breaker for the LLM dependency
+Tracks the rolling error and slow-call rate of each LLM route and fails fast while the upstream is unhealthy
+"""
+
+import time
+import logging
+from collections import deque
+from typing import Any, Deque, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling the dependency while its breaker is open"""
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"Circuit breaker {name} is open")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Rolling-window circuit breaker.
+
+    Closed: calls go through; the breaker opens once the window holds at least min_calls and the
+    error rate or slow-call rate reaches its threshold. Open: calls are rejected for open_seconds.
+    Half-open: up to half_open_probes calls go through; if they all succeed the breaker closes,
+    any failure opens it again.
+
+    allow_request hands out the current state generation; a call's result is only counted if the
+    breaker is still in the generation the call started in, so calls that outlive a transition
+    (e.g. started while closed, finished after the breaker went half-open) can't act as probes.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        window_seconds: float,
+        min_calls: int,
+        error_rate_threshold: float,
+        slow_call_seconds: float,
+        slow_rate_threshold: float,
+        open_seconds: float,
+        half_open_probes: int
+    ):
+        self.name = name
+        self.window_seconds = window_seconds
+        self.min_calls = min_calls
+        self.error_rate_threshold = error_rate_threshold
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_rate_threshold = slow_rate_threshold
+        self.open_seconds = open_seconds
+        self.half_open_probes = half_open_probes
+
+        self.state = CLOSED
+        # Incremented on every transition
+        self._generation = 1
+        # (finished_at, failed, slow) per call, oldest first
+        self._calls: Deque[Tuple[float, bool, bool]] = deque()
+        self._opened_at = 0.0
+        self._probes_in_flight = 0
+        self._probe_successes = 0
+        self.times_opened = 0
+        self.rejected = 0
+
+    def allow_request(self) -> Optional[int]:
+        """
+        Check whether a call may go through
+
+        Returns:
+            int: The generation the call runs in, to be passed to record_success, record_failure or
+                record_cancelled; None if the call is rejected
+        """
+        if self.state == OPEN:
+            if time.monotonic() - self._opened_at < self.open_seconds:
+                self.rejected += 1
+                return None
+            self._transition(HALF_OPEN)
+
+        if self.state == HALF_OPEN:
+            if self._probes_in_flight >= self.half_open_probes:
+                self.rejected += 1
+                return None
+            self._probes_in_flight += 1
+        return self._generation
+
+    def retry_after(self) -> float:
+        """Seconds until an open breaker lets probe calls through"""
+        if self.state != OPEN:
+            return 0.0
+        return max(self.open_seconds - (time.monotonic() - self._opened_at), 0.0)
+
+    def record_success(self, generation: int, latency_seconds: float) -> None:
+        if generation != self._generation:
+            return
+        slow = latency_seconds >= self.slow_call_seconds
+        if self.state == HALF_OPEN:
+            self._probes_in_flight -= 1
+            if slow:
+                self._transition(OPEN)
+                return
+            self._probe_successes += 1
+            if self._probe_successes >= self.half_open_probes:
+                self._transition(CLOSED)
+            return
+        self._add_call(failed=False, slow=slow)
+
+    def record_failure(self, generation: int) -> None:
+        if generation != self._generation:
+            return
+        if self.state == HALF_OPEN:
+            self._probes_in_flight -= 1
+            self._transition(OPEN)
+            return
+        self._add_call(failed=True, slow=False)
+
+    def record_cancelled(self, generation: int) -> None:
+        """The caller gave up (e.g. client disconnect); says nothing about the dependency's health"""
+        if generation == self._generation and self.state == HALF_OPEN:
+            self._probes_in_flight -= 1
+
+    def _add_call(self, failed: bool, slow: bool) -> None:
+        now = time.monotonic()
+        self._calls.append((now, failed, slow))
+        self._prune(now)
+        if self.state != CLOSED or len(self._calls) < self.min_calls:
+            return
+
+        error_rate, slow_rate = self._rates()
+        if error_rate >= self.error_rate_threshold or slow_rate >= self.slow_rate_threshold:
+            logger.warning(
+                f"[BREAKER] {self.name} opening: error rate {error_rate:.0%}, slow-call rate {slow_rate:.0%} "
+                f"over the last {len(self._calls)} calls"
+            )
+            self._transition(OPEN)
+
+    def _prune(self, now: float) -> None:
+        while self._calls and now - self._calls[0][0] > self.window_seconds:
+            self._calls.popleft()
+
+    def _rates(self) -> Tuple[float, float]:
+        if not self._calls:
+            return 0.0, 0.0
+        failures = sum(1 for _, failed, _ in self._calls if failed)
+        slow = sum(1 for _, _, is_slow in self._calls if is_slow)
+        return failures / len(self._calls), slow / len(self._calls)
+
+    def _transition(self, state: str) -> None:
+        previous, self.state = self.state, state
+        # Results of calls still running from the previous state are ignored from now on
+        self._generation += 1
+        if state == OPEN:
+            self._opened_at = time.monotonic()
+            self.times_opened += 1
+        elif state == HALF_OPEN:
+            self._probes_in_flight = 0
+            self._probe_successes = 0
+        elif state == CLOSED:
+            # Start the closed state with a clean window
+            self._calls.clear()
+        logger.info("[BREAKER] %s: %s -> %s", self.name, previous, state)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get breaker state and rolling-window statistics (for debugging/monitoring)
+
+        Returns:
+            dict: State, window call count, error and slow-call rates, open count and rejections
+        """
+        self._prune(time.monotonic())
+        error_rate, slow_rate = self._rates()
+        retry_after: Optional[float] = round(self.retry_after(), 1) if self.state == OPEN else None
+        return {
+            "state": self.state,
+            "window_calls": len(self._calls),
+            "error_rate": round(error_rate, 4),
+            "slow_rate": round(slow_rate, 4),
+            "times_opened": self.times_opened,
+            "rejected": self.rejected,
+            "retry_after_seconds": retry_after
+        }
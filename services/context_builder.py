@@ -0,0 +1,198 @@
+"""
+Token-budgeted context builder for Kay bot prompts
+Fits the check-in, running summary and conversation history sections into configurable token budgets
+"""
+
+import logging
+import threading
+from typing import List, Optional, Tuple
+
+from config import settings
+from models.context_records import ChatTurn
+
+logger = logging.getLogger(__name__)
+
+# Approximate per-message overhead of the chat format (role and delimiters)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+class TokenCounter:
+    """
+    Counts tokens locally with tiktoken.
+
+    tiktoken loads its BPE file from TIKTOKEN_CACHE_DIR (pre-seed it for fully offline hosts);
+    if the encoding cannot be loaded, counts fall back to a ~4 characters per token estimate.
+    """
+
+    CHARS_PER_TOKEN = 4
+
+    def __init__(self, encoding_name: str):
+        self.encoding_name = encoding_name
+        self._encoding = None
+        self._loaded = False
+        # The startup warm-up loads the encoding in a thread while requests may already count tokens
+        self._lock = threading.Lock()
+
+    def _load(self) -> None:
+        with self._lock:
+            if self._loaded:
+                return
+            try:
+                import tiktoken
+                self._encoding = tiktoken.get_encoding(self.encoding_name)
+            except Exception as e:
+                logger.warning(f"tiktoken encoding {self.encoding_name} unavailable, estimating tokens from length: {e}")
+            # Only once the encoding is in place, so nobody estimates while it is still loading
+            self._loaded = True
+
+    @property
+    def exact(self) -> bool:
+        """Whether counts come from the real tokenizer rather than the length estimate"""
+        if not self._loaded:
+            self._load()
+        return self._encoding is not None
+
+    def count(self, text: str) -> int:
+        """
+        Count the tokens in a string
+
+        Args:
+            text: The text to count
+
+        Returns:
+            int: Number of tokens
+        """
+        if not self._loaded:
+            self._load()
+        if self._encoding is not None:
+            return len(self._encoding.encode(text, disallowed_special=()))
+        return (len(text) + self.CHARS_PER_TOKEN - 1) // self.CHARS_PER_TOKEN
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """
+        Cut a string down to at most max_tokens tokens
+
+        Args:
+            text: The text to truncate
+            max_tokens: Maximum number of tokens to keep
+
+        Returns:
+            str: The truncated text
+        """
+        if not self._loaded:
+            self._load()
+        if self._encoding is not None:
+            tokens = self._encoding.encode(text, disallowed_special=())
+            return self._encoding.decode(tokens[:max_tokens])
+        return text[:max_tokens * self.CHARS_PER_TOKEN]
+
+
+class PromptContext:
+    """The budgeted prompt sections and their token counts"""
+
+    __slots__ = (
+        "checkin_context", "summary", "history_turns", "checkin_tokens", "summary_tokens", "history_tokens",
+        "turns_included", "turns_available", "checkin_truncated"
+    )
+
+    def __init__(
+        self,
+        checkin_context: str,
+        summary: str,
+        history_turns: List[ChatTurn],
+        checkin_tokens: int,
+        summary_tokens: int,
+        history_tokens: int,
+        turns_included: int,
+        turns_available: int,
+        checkin_truncated: bool
+    ):
+        self.checkin_context = checkin_context
+        self.summary = summary
+        self.history_turns = history_turns
+        self.checkin_tokens = checkin_tokens
+        self.summary_tokens = summary_tokens
+        self.history_tokens = history_tokens
+        self.turns_included = turns_included
+        self.turns_available = turns_available
+        self.checkin_truncated = checkin_truncated
+
+
+class ContextBuilder:
+    """Builds the check-in and conversation history prompt sections within token budgets"""
+
+    TRUNCATION_MARKER = " [truncated]"
+
+    def __init__(
+        self,
+        history_token_budget: int,
+        checkin_token_budget: int,
+        summary_token_budget: int,
+        counter: Optional[TokenCounter] = None
+    ):
+        self.history_token_budget = history_token_budget
+        self.checkin_token_budget = checkin_token_budget
+        self.summary_token_budget = summary_token_budget
+        self.counter = counter or TokenCounter(settings.tokenizer_encoding)
+
+    def count_turn(self, turn: ChatTurn) -> int:
+        """
+        Count the tokens of a turn sent as a user message plus an assistant message,
+        memoized on the turn (cached turns are reused across requests)
+        """
+        if turn.token_count is None:
+            turn.token_count = (
+                self.counter.count(turn.query) + self.counter.count(turn.response) + 2 * MESSAGE_OVERHEAD_TOKENS
+            )
+        return turn.token_count
+
+    def _fit(self, text: str, budget: int) -> Tuple[str, int, bool]:
+        """Truncate text to a token budget, returning the text, its token count and whether it was cut"""
+        tokens = self.counter.count(text)
+        if tokens <= budget:
+            return text, tokens, False
+        text = self.counter.truncate(text, budget) + self.TRUNCATION_MARKER
+        return text, self.counter.count(text), True
+
+    def build(self, checkin_context: str, turns: List[ChatTurn], summary: str = "") -> PromptContext:
+        """
+        Fit the check-in context, running summary and conversation history into their token budgets
+
+        Args:
+            checkin_context: The rendered check-in context
+            turns: Conversation turns, newest first
+            summary: Running summary of turns older than those in the session ("" if none)
+
+        Returns:
+            PromptContext: The budgeted sections (history oldest first) and their token counts
+        """
+        # Check-in and summary sections: truncate if they exceed their budgets
+        checkin_context, checkin_tokens, checkin_truncated = self._fit(checkin_context, self.checkin_token_budget)
+        summary_tokens = 0
+        if summary:
+            summary, summary_tokens, _ = self._fit(summary, self.summary_token_budget)
+
+        # History section: include turns newest first until the budget is used up
+        included = []
+        history_tokens = 0
+        for turn in turns:
+            turn_tokens = self.count_turn(turn)
+            if history_tokens + turn_tokens > self.history_token_budget:
+                break
+            included.append(turn)
+            history_tokens += turn_tokens
+
+        # History is sent oldest first so the message list only grows by appending
+        included.reverse()
+
+        return PromptContext(
+            checkin_context=checkin_context,
+            summary=summary,
+            history_turns=included,
+            checkin_tokens=checkin_tokens,
+            summary_tokens=summary_tokens,
+            history_tokens=history_tokens,
+            turns_included=len(included),
+            turns_available=len(turns),
+            checkin_truncated=checkin_truncated
+        )
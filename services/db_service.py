@@ -1,98 +1,129 @@
 import logging
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
 from datetime import datetime, UTC
 from models.database_models import get_database
+from config import settings
+from services.cache_service import TTLCache
+from services.cache_invalidation import cache_invalidation
+from services.chat_writer import ChatWriteBehindQueue
+from models.context_records import (
+    ChatTurn, CheckinSnapshot, CHAT_TURN_PROJECTION, CHECKIN_PROJECTION, DEFAULT_CONVERSATIONAL_CONTEXT
+)
 from bson import ObjectId
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError
 
 logger = logging.getLogger(__name__)
 
+# Only the session fields used to build context
+SESSION_PROJECTION = {"turns": 1, "checkin": 1, "checkinSyncedAt": 1, "initialized": 1, "summary": 1}
+
 class DatabaseService:
     """Service class for database operations related to check-ins"""
-    
+
+    DEFAULT_CONVERSATIONAL_CONTEXT = DEFAULT_CONVERSATIONAL_CONTEXT
+
+    # In-process caches keyed by patient ID, kept current by write-through on every write path.
+    # Writes from other processes invalidate them through cache_invalidation when redis_url is set;
+    # without it they can serve another process's stale data for up to cache_ttl_seconds.
+    checkin_cache = TTLCache(
+        "checkin",
+        max_entries=settings.cache_max_entries,
+        max_bytes=settings.cache_max_bytes,
+        ttl_seconds=settings.cache_ttl_seconds
+    )
+    session_cache = TTLCache(
+        "session",
+        max_entries=settings.cache_max_entries,
+        max_bytes=settings.cache_max_bytes,
+        ttl_seconds=settings.cache_ttl_seconds
+    )
+
+    @staticmethod
+    def _build_conversational_context(turns: List[ChatTurn]) -> str:
+        """
+        Join chat turns (newest first) into the conversation history string used in prompts
+
+        Args:
+            turns: Chat turns, newest first
+
+        Returns:
+            The formatted conversation history string
+        """
+        if not turns:
+            return DatabaseService.DEFAULT_CONVERSATIONAL_CONTEXT
+        chat_strings = [f"User: {turn.query}\nAssistant: {turn.response}" for turn in turns]
+        return "\n\n".join(chat_strings)
+
+    @staticmethod
+    def _checkin_result_from_document(patient_id: str, checkin: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Build the get_patient_checkin_context result for a dailycheckins document
+
+        Args:
+            patient_id: ID of the patient (ObjectId string)
+            checkin: The dailycheckins document
+
+        Returns:
+            Dictionary containing the decoded snapshot, document ID, context string and checkin type
+        """
+        return DatabaseService._checkin_result_from_snapshot(patient_id, CheckinSnapshot.from_document(checkin))
+
+    @staticmethod
+    def _checkin_result_from_snapshot(patient_id: str, snapshot: CheckinSnapshot) -> Dict[str, Any]:
+        """Build the get_patient_checkin_context result for a decoded check-in"""
+        return {
+            "patient_id": patient_id,
+            "checkin": snapshot,
+            "document_id": snapshot.document_id,  # Return the document ID for updating
+            "context_string": snapshot.to_context_string(),
+            "checkin_type": snapshot.checkin_type,
+            "found": True
+        }
+
     @staticmethod
-    async def get_patient_checkin_context(patient_id: str) -> Dict[str, Any]:
+    async def get_patient_checkin_context(patient_id: str, use_cache: bool = True) -> Dict[str, Any]:
         """
         Get the most recent daily checkin for a specific patient from the dailycheckins collection.
         
         Args:
             patient_id: ID of the patient (ObjectId string)
+            use_cache: Set to False to read the document from the database (the result is still cached)
             
         Returns:
             Dictionary containing the most recent daily checkin for the patient.
         """
+        if use_cache:
+            cached = DatabaseService.checkin_cache.get(patient_id)
+            if cached is not None:
+                return cached
+
         try:
             db = get_database()
 
             # Query for the most recent document from dailycheckins collection for the given patient
             checkin = await db.dailycheckins.find_one(
                 {"patient": ObjectId(patient_id)},
+                projection=CHECKIN_PROJECTION,
                 sort=[("createdAt", -1)]
             )
 
             if not checkin:
-                logger.info(f"No daily checkins found for patient {patient_id}")
-                return {
+                logger.info("No daily checkins found for patient %s", patient_id)
+                result = {
                     "patient_id": patient_id,
                     "checkin": None,
                     "found": False
                 }
+                DatabaseService.checkin_cache.set(patient_id, result)
+                return result
 
-            # Convert ObjectId to string for JSON serialization
-            checkin_data = dict(checkin)
-            if "patient" in checkin_data:
-                checkin_data["patient"] = str(checkin_data["patient"])
+            result = DatabaseService._checkin_result_from_document(patient_id, checkin)
 
-            # Format executive tasks for display
-            executive_tasks = checkin_data.get('executiveTasks', 'Not specified')
-            if isinstance(executive_tasks, list):
-                executive_tasks_str = ', '.join(executive_tasks) if executive_tasks else 'Not specified'
-            else:
-                executive_tasks_str = executive_tasks if executive_tasks else 'Not specified'
-
-            # Format check-in date
-            checkin_date = checkin_data.get('createdAt', 'Not specified')
-
-            # Create context string based on checkin type
-            if checkin_data.get('type') == 'Morning':
-                context_string = (
-                    "Morning Check-in Summary:\n"
-                    f"- Sleep Quality: {checkin_data.get('sleepQuality', 'Not specified')}\n"
-                    f"- Body Sensation: {checkin_data.get('bodySensation', 'Not specified')}\n"
-                    f"- Energy Level: {checkin_data.get('energyLevel', 'Not specified')}\n"
-                    f"- Mental State: {checkin_data.get('mentalState', 'Not specified')}\n"
-                    f"- Executive Tasks: {executive_tasks_str}\n"
-                    f"- Total Points: {checkin_data.get('totalPoints', 'Not specified')}\n"
-                    f"- Risk Level: {checkin_data.get('riskLevel', 'Not specified')}\n"
-                    f"- Message: {checkin_data.get('message', 'No message')}\n"
-                    f"- Check-in Date: {checkin_date}"
-                )
-            else:
-                context_string = (
-                    "Evening Check-in Summary:\n"
-                    f"- Emotion Category: {checkin_data.get('emotionCategory', 'Not specified')}\n"
-                    f"- Overwhelm Amount: {checkin_data.get('overwhelmAmount', 'Not specified')}\n"
-                    f"- Emotion in Moment: {checkin_data.get('emotionInMoment', 'Not specified')}\n"
-                    f"- Surroundings Impact: {checkin_data.get('surroundingsImpact', 'Not specified')}\n"
-                    f"- Social Engagement Level: {checkin_data.get('socialEngagementLevel', 'Not specified')}\n"
-                    f"- Meaningful Moments Quantity: {checkin_data.get('meaningfulMomentsQuantity', 'Not specified')}\n"
-                    f"- Executive Tasks: {executive_tasks_str}\n"
-                    f"- Total Points: {checkin_data.get('totalPoints', 'Not specified')}\n"
-                    f"- Risk Level: {checkin_data.get('riskLevel', 'Not specified')}\n"
-                    f"- Message: {checkin_data.get('message', 'No message')}\n"
-                    f"- Check-in Date: {checkin_date}"
-                )
+            logger.info("Retrieved most recent daily checkin for patient %s and created context string", patient_id)
 
-            logger.info(
-                f"Retrieved most recent daily checkin for patient {patient_id} and created context string"
-            )
-
-            return {
-                "patient_id": patient_id,
-                "document_id": str(checkin_data["_id"]),  # Return the document ID for updating
-                "context_string": context_string,
-                "checkin_type": checkin_data.get('type', 'Unknown'),
-                "found": True
-            }
+            DatabaseService.checkin_cache.set(patient_id, result)
+            return result
 
         except Exception as e:
             logger.error(f"Error retrieving daily checkin for patient {patient_id}: {e}")
@@ -104,33 +135,49 @@ class DatabaseService:
             }
     
     @staticmethod
-    async def add_checkin_summary(document_id: str, summary_message: str) -> Dict[str, Any]:
+    async def add_checkin_summary(
+        document_id: str,
+        summary_message: str,
+        summary_hash: Optional[str] = None,
+        original_message: Any = None
+    ) -> Dict[str, Any]:
         """
         Update the message field of a specific checkin document with the generated summary
         
         Args:
             document_id: The MongoDB document ID (ObjectId string)
             summary_message: The generated summary message to store
+            summary_hash: CheckinSnapshot.summary_key() of the input the summary was generated from
+            original_message: The patient's own message, kept in originalMessage so it is not lost
             
         Returns:
             Dictionary containing the update result
         """
         try:
             db = get_database()
+
+            update_fields = {
+                "message": summary_message,
+                "updatedAt": datetime.now(UTC)
+            }
+            if summary_hash is not None:
+                update_fields["summaryHash"] = summary_hash
+                update_fields["originalMessage"] = original_message
             
             # Update the document with the new message
-            result = await db.dailycheckins.update_one(
+            updated_checkin = await db.dailycheckins.find_one_and_update(
                 {"_id": ObjectId(document_id)},
-                {
-                    "$set": {
-                        "message": summary_message,
-                        "updatedAt": datetime.now(UTC)
-                    }
-                }
+                {"$set": update_fields},
+                projection=CHECKIN_PROJECTION,
+                return_document=ReturnDocument.AFTER
             )
             
-            if result.modified_count == 1:
-                logger.info(f"Successfully updated message for document {document_id}")
+            if updated_checkin:
+                logger.info("Successfully updated message for document %s", document_id)
+
+                # Keep the patient's session document in sync with the new message
+                await DatabaseService._sync_session_checkin(updated_checkin)
+
                 return {
                     "document_id": document_id,
                     "success": True,
@@ -156,7 +203,9 @@ class DatabaseService:
     async def save_chat_message(
         patient_id: str,
         query: str,
-        response: str
+        response: str,
+        chat_id: Optional[str] = None,
+        degraded: bool = False
     ) -> Dict[str, Any]:
         """
         Save a chat message (query and response) to the chats collection
@@ -165,6 +214,8 @@ class DatabaseService:
             patient_id: ID of the patient (ObjectId string)
             query: User's message/question
             response: AI assistant's response
+            chat_id: ID to store the chat under (ObjectId string), e.g. the job ID so a retried job can't save twice
+            degraded: The response is the degraded-mode reply and should be regenerated later
             
         Returns:
             Dictionary containing the saved chat data
@@ -174,17 +225,36 @@ class DatabaseService:
             
             # Create chat document
             chat_document = {
+                "_id": ObjectId(chat_id) if chat_id else ObjectId(),
                 "patient": ObjectId(patient_id),
                 "query": query,
                 "response": response,
                 "createdAt": datetime.now(UTC),
                 "updatedAt": datetime.now(UTC)
             }
+            if degraded:
+                chat_document["degraded"] = True
+
+            # In write-behind mode the insert is batched by the background flusher
+            if settings.chat_write_behind and chat_write_queue.has_capacity():
+                DatabaseService._cache_session_turn(patient_id, ChatTurn.from_chat_document(chat_document))
+                chat_write_queue.enqueue(chat_document)
+                return {
+                    "chat_id": str(chat_document["_id"]),
+                    "patient_id": patient_id,
+                    "query": query,
+                    "response": response,
+                    "success": True,
+                    "queued": True
+                }
             
             # Insert the document
             result = await db.chats.insert_one(chat_document)
             
-            logger.info(f"Successfully saved chat message for patient {patient_id}")
+            logger.info("Successfully saved chat message for patient %s", patient_id)
+
+            # Append the turn to the patient's session document
+            await DatabaseService._push_session_turn(patient_id, chat_document)
             
             return {
                 "chat_id": str(result.inserted_id),
@@ -202,6 +272,67 @@ class DatabaseService:
                 "error": str(e)
             }
 
+    @staticmethod
+    async def get_chat_message(chat_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Get a single saved chat message
+
+        Args:
+            chat_id: ID of the chat (ObjectId string)
+
+        Returns:
+            Dictionary with the chat's patient ID, query and response, or None if it doesn't exist
+        """
+        db = get_database()
+        chat = await db.chats.find_one({"_id": ObjectId(chat_id)}, projection={"patient": 1, "query": 1, "response": 1})
+        if chat is None:
+            return None
+        return {
+            "chat_id": chat_id,
+            "patient_id": str(chat['patient']),
+            "query": chat['query'],
+            "response": chat['response']
+        }
+
+    @staticmethod
+    async def replace_chat_response(chat_id: str, patient_id: str, response: str) -> Dict[str, Any]:
+        """
+        Replace the response of a degraded-mode chat with a regenerated one, in the chats collection
+        and in the patient's session turns
+
+        Args:
+            chat_id: ID of the chat (ObjectId string)
+            patient_id: ID of the patient (ObjectId string)
+            response: The regenerated response
+
+        Returns:
+            Dictionary containing the update result
+        """
+        try:
+            db = get_database()
+            now = datetime.now(UTC)
+            result = await db.chats.update_one(
+                {"_id": ObjectId(chat_id), "degraded": True},
+                {"$set": {"response": response, "regeneratedAt": now, "updatedAt": now}, "$unset": {"degraded": ""}}
+            )
+            if result.matched_count == 0:
+                return {"chat_id": chat_id, "success": False, "message": "Chat not found or already regenerated"}
+
+            await db.patient_sessions.update_one(
+                {"_id": ObjectId(patient_id), "turns.chatId": chat_id},
+                {"$set": {"turns.$.response": response, "updatedAt": now}, "$unset": {"turns.$.degraded": ""}}
+            )
+            # Cached turns are stale now, here and in the other processes
+            DatabaseService.session_cache.invalidate(patient_id)
+            cache_invalidation.publish(patient_id)
+
+            logger.info("Replaced degraded response for chat %s", chat_id)
+            return {"chat_id": chat_id, "success": True, "message": "Response regenerated"}
+
+        except Exception as e:
+            logger.error(f"Error replacing response for chat {chat_id}: {e}")
+            return {"chat_id": chat_id, "success": False, "message": f"Error: {str(e)}"}
+
     @staticmethod
     async def get_patient_recent_chats(patient_id: str, limit: int = 20) -> Dict[str, Any]:
         """
@@ -212,40 +343,23 @@ class DatabaseService:
             limit: Maximum number of chat messages to return (default: 20)
             
         Returns:
-            Dictionary containing the recent chat conversations and formatted context string
+            Dictionary containing the recent chat turns (newest first) and formatted context string
         """
         try:
             db = get_database()
             
             # Query recent chat messages for the patient, sorted by creation date (newest first)
             chats = await db.chats.find(
-                {"patient": ObjectId(patient_id)}
-            ).sort("createdAt", -1).limit(limit).to_list(length=None)
+                {"patient": ObjectId(patient_id)},
+                CHAT_TURN_PROJECTION
+            ).sort("createdAt", -1).limit(limit).to_list(length=limit)
             
-            # Convert ObjectIds to strings for JSON serialization
-            chat_list = []
-            for chat in chats:
-                chat_data = dict(chat)
-                # Convert ObjectIds to strings
-                if "_id" in chat_data:
-                    chat_data["_id"] = str(chat_data["_id"])
-                if "patient" in chat_data:
-                    chat_data["patient"] = str(chat_data["patient"])
-                chat_list.append(chat_data)
+            chat_list = [ChatTurn.from_chat_document(chat) for chat in chats]
             
-            # Build conversational context string
-            conversational_context = ""
-            if chat_list:
-                # Use last 15 conversations for context
-                recent_chats = chat_list[:15]
-                chat_strings = []
-                for chat in recent_chats:
-                    chat_strings.append(f"User: {chat['query']}\nAssistant: {chat['response']}")
-                conversational_context = "\n\n".join(chat_strings)
-            else:
-                conversational_context = "This is the beginning of our conversation."
+            # Build conversational context string (use last 15 conversations for context)
+            conversational_context = DatabaseService._build_conversational_context(chat_list[:15])
             
-            logger.info(f"Retrieved {len(chat_list)} recent chats for patient {patient_id}")
+            logger.info("Retrieved %s recent chats for patient %s", len(chat_list), patient_id)
             
             return {
                 "patient_id": patient_id,
@@ -260,13 +374,588 @@ class DatabaseService:
             return {
                 "patient_id": patient_id,
                 "chats": [],
-                "conversational_context": "This is the beginning of our conversation.",
+                "conversational_context": DatabaseService.DEFAULT_CONVERSATIONAL_CONTEXT,
                 "total_count": 0,
                 "limit": limit,
                 "error": str(e)
             }
 
 
+    @staticmethod
+    def _session_checkin_from_result(checkin_result: Dict[str, Any]) -> Dict[str, Any]:
+        """Convert a get_patient_checkin_context result into the session's checkin sub-document"""
+        if not checkin_result.get('found'):
+            return {"found": False}
+        return {
+            "found": True,
+            "documentId": checkin_result['document_id'],
+            "contextString": checkin_result['context_string'],
+            "checkinType": checkin_result['checkin_type']
+        }
+
+    @staticmethod
+    def _checkin_result_from_session(patient_id: str, session_checkin: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """Convert the session's checkin sub-document back into a get_patient_checkin_context result"""
+        if not session_checkin or not session_checkin.get('found'):
+            return {
+                "patient_id": patient_id,
+                "checkin": None,
+                "found": False
+            }
+        return {
+            "patient_id": patient_id,
+            "document_id": session_checkin['documentId'],
+            "context_string": session_checkin['contextString'],
+            "checkin_type": session_checkin.get('checkinType', 'Unknown'),
+            "found": True
+        }
+
+    @staticmethod
+    def _is_session_checkin_stale(session: Dict[str, Any]) -> bool:
+        """Check whether the session's checkin section is older than the configured refresh interval"""
+        synced_at = session.get('checkinSyncedAt')
+        if synced_at is None:
+            return True
+        if synced_at.tzinfo is None:
+            synced_at = synced_at.replace(tzinfo=UTC)
+        age_seconds = (datetime.now(UTC) - synced_at).total_seconds()
+        return age_seconds > settings.session_checkin_refresh_seconds
+
+    @staticmethod
+    def _merge_pending_turns(patient_id: str, turns: List[ChatTurn], pending: List[Dict[str, Any]]) -> List[ChatTurn]:
+        """
+        Append chats still waiting in the write-behind queue to a list of session turns (oldest first)
+
+        Args:
+            patient_id: ID of the patient (ObjectId string)
+            turns: Turns read from the database, oldest first
+            pending: Pending chat documents captured before the database read
+
+        Returns:
+            The merged turns, capped at session_max_turns
+        """
+        if not pending:
+            return turns
+        persisted_ids = {turn.chat_id for turn in turns}
+        merged = turns + [
+            ChatTurn.from_chat_document(doc) for doc in pending if str(doc['_id']) not in persisted_ids
+        ]
+        return merged[-settings.session_max_turns:]
+
+    @staticmethod
+    def _cache_session_turn(patient_id: str, turn: ChatTurn) -> None:
+        """Write a new turn through to the cached session so this process's next read sees it"""
+        cached = DatabaseService.session_cache.peek(patient_id)
+        if cached is not None:
+            turns = (cached['turns'] + [turn])[-settings.session_max_turns:]
+            DatabaseService.session_cache.set(patient_id, {**cached, "turns": turns})
+
+    @staticmethod
+    async def _push_session_turn(patient_id: str, chat_document: Dict[str, Any]) -> None:
+        """
+        Append a chat turn to the turns on the patient's session document. Turns leave the session when
+        a memory fold summarizes them; session_max_turns only trims if folds keep failing.
+
+        Args:
+            patient_id: ID of the patient (ObjectId string)
+            chat_document: The chat document that was inserted into the chats collection
+        """
+        turn = ChatTurn.from_chat_document(chat_document)
+        DatabaseService._cache_session_turn(patient_id, turn)
+
+        try:
+            db = get_database()
+            await db.patient_sessions.update_one(
+                {"_id": ObjectId(patient_id)},
+                {
+                    "$push": {"turns": {"$each": [turn.to_session_turn()], "$slice": -settings.session_max_turns}},
+                    "$set": {"updatedAt": datetime.now(UTC)}
+                },
+                upsert=True
+            )
+            cache_invalidation.publish(patient_id)
+        except Exception as e:
+            # The chats collection remains the source of truth, the session is rebuilt on next read
+            logger.warning(f"Failed to update session turns for patient {patient_id}: {e}")
+
+    @staticmethod
+    async def _sync_session_checkin(checkin: Dict[str, Any]) -> None:
+        """
+        Re-render the checkin section of a patient's session after the check-in document changed
+
+        Args:
+            checkin: The updated dailycheckins document
+        """
+        await DatabaseService._sync_session_checkins([CheckinSnapshot.from_document(checkin)])
+
+    @staticmethod
+    async def _sync_session_checkins(checkins: List[CheckinSnapshot]) -> None:
+        """
+        Re-render the checkin section of each patient's session after their check-in documents changed,
+        with one bulk write for all sessions
+
+        Args:
+            checkins: The updated check-ins
+        """
+        now = datetime.now(UTC)
+        operations = []
+        for checkin in checkins:
+            patient_id = checkin.patient_id
+            document_id = checkin.document_id
+            checkin_result = DatabaseService._checkin_result_from_snapshot(patient_id, checkin)
+            session_checkin = DatabaseService._session_checkin_from_result(checkin_result)
+
+            # Write-through to the caches that currently hold this check-in
+            cached_checkin = DatabaseService.checkin_cache.peek(patient_id)
+            if cached_checkin is not None and cached_checkin.get('document_id') == document_id:
+                DatabaseService.checkin_cache.set(patient_id, checkin_result)
+            cached_session = DatabaseService.session_cache.peek(patient_id)
+            if cached_session is not None and (cached_session.get('checkin') or {}).get('documentId') == document_id:
+                DatabaseService.session_cache.set(patient_id, {**cached_session, "checkin": session_checkin})
+
+            # Only touch sessions that currently point at this check-in
+            operations.append(UpdateOne(
+                {"_id": ObjectId(patient_id), "checkin.documentId": document_id},
+                {"$set": {"checkin": session_checkin, "updatedAt": now}}
+            ))
+
+        if not operations:
+            return
+        try:
+            db = get_database()
+            await db.patient_sessions.bulk_write(operations, ordered=False)
+        except Exception as e:
+            logger.warning(f"Failed to sync session checkins for {len(operations)} documents: {e}")
+        # The check-in documents changed even if the session sync failed
+        cache_invalidation.publish(*(checkin.patient_id for checkin in checkins))
+
+    @staticmethod
+    async def get_latest_checkins(patient_ids: List[str]) -> Dict[str, CheckinSnapshot]:
+        """
+        Get the most recent daily checkin for many patients with a single aggregation
+
+        Args:
+            patient_ids: IDs of the patients (ObjectId strings)
+
+        Returns:
+            Dictionary mapping patient ID to its latest check-in (patients without check-ins are omitted)
+        """
+        db = get_database()
+        pipeline = [
+            {"$match": {"patient": {"$in": [ObjectId(patient_id) for patient_id in patient_ids]}}},
+            # Walks the (patient, createdAt desc) index so $first is each patient's latest check-in
+            {"$sort": {"patient": 1, "createdAt": -1}},
+            {"$group": {"_id": "$patient", "checkin": {"$first": "$$ROOT"}}},
+            {"$replaceRoot": {"newRoot": "$checkin"}},
+            {"$project": CHECKIN_PROJECTION}
+        ]
+
+        latest: Dict[str, CheckinSnapshot] = {}
+        async for checkin in db.dailycheckins.aggregate(pipeline):
+            patient_id = str(checkin['patient'])
+            checkin_result = DatabaseService._checkin_result_from_document(patient_id, checkin)
+            DatabaseService.checkin_cache.set(patient_id, checkin_result)
+            latest[patient_id] = checkin_result['checkin']
+
+        logger.info("Retrieved latest daily checkins for %d of %d patients", len(latest), len(patient_ids))
+        return latest
+
+    @staticmethod
+    async def add_checkin_summaries_bulk(summaries: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        """
+        Store generated summaries on many checkin documents with a single unordered bulk write
+
+        Args:
+            summaries: One entry per check-in with checkin (the CheckinSnapshot it was generated from),
+                summary and summary_hash
+
+        Returns:
+            Dictionary mapping document ID to its update result (success and message)
+        """
+        if not summaries:
+            return {}
+
+        db = get_database()
+        now = datetime.now(UTC)
+        operations = [
+            UpdateOne(
+                {"_id": ObjectId(entry['checkin'].document_id)},
+                {
+                    "$set": {
+                        "message": entry['summary'],
+                        "summaryHash": entry['summary_hash'],
+                        "originalMessage": entry['checkin'].summary_source_message,
+                        "updatedAt": now
+                    }
+                }
+            )
+            for entry in summaries
+        ]
+
+        failed: Dict[int, str] = {}
+        try:
+            await db.dailycheckins.bulk_write(operations, ordered=False)
+        except BulkWriteError as e:
+            failed = {error['index']: error.get('errmsg', 'Write failed') for error in e.details.get('writeErrors', [])}
+            logger.warning(f"Bulk checkin summary update had {len(failed)} failures out of {len(operations)}")
+        except Exception as e:
+            logger.error(f"Error bulk updating {len(operations)} checkin summaries: {e}")
+            return {
+                entry['checkin'].document_id: {"success": False, "message": f"Error: {str(e)}"}
+                for entry in summaries
+            }
+
+        results: Dict[str, Dict[str, Any]] = {}
+        updated_checkins = []
+        for index, entry in enumerate(summaries):
+            checkin = entry['checkin']
+            if index in failed:
+                results[checkin.document_id] = {"success": False, "message": f"Error: {failed[index]}"}
+                continue
+            results[checkin.document_id] = {"success": True, "message": "Message updated successfully"}
+            updated_checkins.append(checkin.with_summary(entry['summary'], entry['summary_hash']))
+
+        # Keep the patients' session documents and caches in sync with the new messages
+        await DatabaseService._sync_session_checkins(updated_checkins)
+
+        logger.info("Bulk updated %d checkin summaries", len(updated_checkins))
+        return results
+
+    @staticmethod
+    async def refresh_session_checkin(patient_id: str) -> Dict[str, Any]:
+        """
+        Reload the latest check-in for a patient and store it on the session document
+
+        Args:
+            patient_id: ID of the patient (ObjectId string)
+
+        Returns:
+            Dictionary containing the latest checkin context (same shape as get_patient_checkin_context)
+        """
+        checkin_result = await DatabaseService.get_patient_checkin_context(patient_id)
+        if 'error' in checkin_result:
+            return checkin_result
+
+        session_checkin = DatabaseService._session_checkin_from_result(checkin_result)
+        cached_session = DatabaseService.session_cache.peek(patient_id)
+        if cached_session is not None:
+            DatabaseService.session_cache.set(patient_id, {**cached_session, "checkin": session_checkin})
+
+        try:
+            db = get_database()
+            now = datetime.now(UTC)
+            await db.patient_sessions.update_one(
+                {"_id": ObjectId(patient_id)},
+                {
+                    "$set": {
+                        "checkin": session_checkin,
+                        "checkinSyncedAt": now,
+                        "updatedAt": now
+                    }
+                },
+                upsert=True
+            )
+        except Exception as e:
+            logger.warning(f"Failed to store session checkin for patient {patient_id}: {e}")
+
+        return checkin_result
+
+    @staticmethod
+    async def _rebuild_patient_session(patient_id: str) -> Dict[str, Any]:
+        """
+        Backfill a patient's session document from the chats and dailycheckins collections
+
+        Args:
+            patient_id: ID of the patient (ObjectId string)
+
+        Returns:
+            The rebuilt session with decoded turns (oldest first) and checkin sub-document
+        """
+        db = get_database()
+        chat_history_result = await DatabaseService.get_patient_recent_chats(
+            patient_id, limit=settings.session_history_size
+        )
+        checkin_result = await DatabaseService.get_patient_checkin_context(patient_id)
+
+        # Recent chats come back newest first, the session turns are stored oldest first
+        turns = list(reversed(chat_history_result['chats']))
+        now = datetime.now(UTC)
+        session = {
+            "turns": [turn.to_session_turn() for turn in turns],
+            "initialized": True,
+            "updatedAt": now
+        }
+        if 'error' not in checkin_result:
+            session["checkin"] = DatabaseService._session_checkin_from_result(checkin_result)
+            session["checkinSyncedAt"] = now
+
+        if 'error' not in chat_history_result:
+            await db.patient_sessions.update_one(
+                {"_id": ObjectId(patient_id)},
+                {"$set": session},
+                upsert=True
+            )
+            logger.info("Rebuilt session document for patient %s with %s turns", patient_id, len(turns))
+
+        return {
+            "turns": turns,
+            "checkin": DatabaseService._session_checkin_from_result(checkin_result),
+            "summary": ""
+        }
+
+    @staticmethod
+    async def get_patient_session(patient_id: str) -> Dict[str, Any]:
+        """
+        Get the conversation and check-in context for a patient with a single read.
+
+        The patient_sessions document (keyed by patient ID) holds the turns not yet folded into
+        the running summary and the rendered context string of the latest check-in. It is
+        kept current by save_chat_message and add_checkin_summary, backfilled the first
+        time a patient is seen, and its check-in section is re-synced once it is older
+        than session_checkin_refresh_seconds. The turns and check-in are also held in
+        session_cache so repeat reads from this process skip the database entirely.
+
+        Args:
+            patient_id: ID of the patient (ObjectId string)
+
+        Returns:
+            Dictionary containing the recent turns (newest first), the running conversation
+            summary and the checkin context
+        """
+        try:
+            session = DatabaseService.session_cache.get(patient_id)
+
+            if session is None:
+                # Capture queued writes before reading so none can slip between the read and the merge
+                pending = chat_write_queue.pending_for(patient_id)
+
+                db = get_database()
+                session = await db.patient_sessions.find_one({"_id": ObjectId(patient_id)}, SESSION_PROJECTION)
+
+                if not session or not session.get('initialized'):
+                    session = await DatabaseService._rebuild_patient_session(patient_id)
+                else:
+                    session['turns'] = [ChatTurn.from_session_turn(turn) for turn in session.get('turns', [])]
+                    if DatabaseService._is_session_checkin_stale(session):
+                        checkin_result = await DatabaseService.refresh_session_checkin(patient_id)
+                        if 'error' not in checkin_result:
+                            session['checkin'] = DatabaseService._session_checkin_from_result(checkin_result)
+
+                turns = DatabaseService._merge_pending_turns(patient_id, session['turns'], pending)
+                session = {"turns": turns, "checkin": session.get('checkin'), "summary": session.get('summary', "")}
+                DatabaseService.session_cache.set(patient_id, session)
+
+            # Session turns are stored oldest first, the context builder expects newest first
+            turns = list(reversed(session.get('turns', [])))
+
+            return {
+                "patient_id": patient_id,
+                "turns": turns,
+                "summary": session.get('summary', ""),
+                "total_count": len(turns),
+                "checkin": DatabaseService._checkin_result_from_session(patient_id, session.get('checkin'))
+            }
+
+        except Exception as e:
+            logger.error(f"Error retrieving session for patient {patient_id}: {e}")
+            return {
+                "patient_id": patient_id,
+                "turns": [],
+                "summary": "",
+                "total_count": 0,
+                "checkin": {
+                    "patient_id": patient_id,
+                    "checkin": None,
+                    "found": False
+                },
+                "error": str(e)
+            }
+
+    @staticmethod
+    async def get_patient_memory(patient_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Read the session turns and running conversation summary straight from the database
+
+        Args:
+            patient_id: ID of the patient (ObjectId string)
+
+        Returns:
+            Dictionary with turns (oldest first), summary and summarizedThrough, or None if there is no session
+        """
+        try:
+            db = get_database()
+            session = await db.patient_sessions.find_one(
+                {"_id": ObjectId(patient_id)},
+                {"turns": 1, "summary": 1, "summarizedThrough": 1}
+            )
+            if not session:
+                return None
+            return {
+                "turns": [ChatTurn.from_session_turn(turn) for turn in session.get('turns', [])],
+                "summary": session.get('summary', ""),
+                "summarized_through": session.get('summarizedThrough')
+            }
+        except Exception as e:
+            logger.error(f"Error retrieving conversation memory for patient {patient_id}: {e}")
+            return None
+
+    @staticmethod
+    async def fold_patient_memory(
+        patient_id: str,
+        summary: str,
+        folded_through: datetime,
+        previous_through: Optional[datetime]
+    ) -> bool:
+        """
+        Store an updated running summary and drop the turns it now covers from the session.
+        Degraded turns stay until they are regenerated and folded later.
+        The update only applies if nobody else folded the session since it was read.
+
+        Args:
+            patient_id: ID of the patient (ObjectId string)
+            summary: The updated running summary
+            folded_through: createdAt of the newest turn folded into the summary
+            previous_through: summarizedThrough value the fold was based on
+
+        Returns:
+            bool: True if the fold was applied
+        """
+        try:
+            db = get_database()
+            result = await db.patient_sessions.update_one(
+                {"_id": ObjectId(patient_id), "summarizedThrough": previous_through},
+                {
+                    "$set": {
+                        "summary": summary,
+                        "summarizedThrough": folded_through,
+                        "updatedAt": datetime.now(UTC)
+                    },
+                    "$pull": {"turns": {"createdAt": {"$lte": folded_through}, "degraded": {"$ne": True}}}
+                }
+            )
+            # Cached turns no longer match the stored session, reload them on the next read
+            DatabaseService.session_cache.invalidate(patient_id)
+            if result.modified_count == 1:
+                cache_invalidation.publish(patient_id)
+                return True
+            return False
+        except Exception as e:
+            logger.error(f"Error storing conversation summary for patient {patient_id}: {e}")
+            return False
+
+    @staticmethod
+    async def invalidate_patient_cache(patient_id: str) -> Dict[str, Any]:
+        """
+        Drop a patient's cached context and re-sync their session with the latest check-in.
+        Called when another service (e.g. the Node.js server) writes a new check-in.
+
+        Args:
+            patient_id: ID of the patient (ObjectId string)
+
+        Returns:
+            Dictionary containing which caches were invalidated and the refreshed checkin context
+        """
+        checkin_invalidated = DatabaseService.checkin_cache.invalidate(patient_id)
+        session_invalidated = DatabaseService.session_cache.invalidate(patient_id)
+        # The request reaches one process; the others drop their copies too
+        cache_invalidation.publish(patient_id)
+        checkin_result = await DatabaseService.refresh_session_checkin(patient_id)
+
+        logger.info("Invalidated cached context for patient %s", patient_id)
+
+        return {
+            "patient_id": patient_id,
+            "checkin_cache_invalidated": checkin_invalidated,
+            "session_cache_invalidated": session_invalidated,
+            "checkin_found": checkin_result['found'],
+            "success": 'error' not in checkin_result
+        }
+
+    @staticmethod
+    async def save_chat_messages_bulk(chat_documents: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Insert a batch of chat documents and append them to their patients' session documents.
+        Used by the write-behind queue; every document must already carry its _id.
+
+        Args:
+            chat_documents: Chat documents to insert, oldest first
+
+        Returns:
+            The documents that failed to insert and should be retried
+        """
+        db = get_database()
+        failed: List[Dict[str, Any]] = []
+
+        try:
+            await db.chats.insert_many(chat_documents, ordered=False)
+        except BulkWriteError as e:
+            # Duplicate keys mean a previous attempt already inserted the document
+            failed_indexes = {
+                error['index'] for error in e.details.get('writeErrors', []) if error.get('code') != 11000
+            }
+            failed = [chat_documents[index] for index in sorted(failed_indexes)]
+            logger.warning(f"Bulk chat insert had {len(failed)} failures out of {len(chat_documents)}")
+        except Exception as e:
+            logger.error(f"Error bulk saving {len(chat_documents)} chat messages: {e}")
+            return chat_documents
+
+        # Group the persisted turns by patient, keeping their order, for one session update each
+        failed_ids = {doc['_id'] for doc in failed}
+        turns_by_patient: Dict[ObjectId, List[Dict[str, Any]]] = {}
+        for doc in chat_documents:
+            if doc['_id'] not in failed_ids:
+                turns_by_patient.setdefault(doc['patient'], []).append(ChatTurn.from_chat_document(doc).to_session_turn())
+
+        if turns_by_patient:
+            now = datetime.now(UTC)
+            operations = [
+                UpdateOne(
+                    {"_id": patient},
+                    {
+                        "$push": {"turns": {"$each": turns, "$slice": -settings.session_max_turns}},
+                        "$set": {"updatedAt": now}
+                    },
+                    upsert=True
+                )
+                for patient, turns in turns_by_patient.items()
+            ]
+            try:
+                await db.patient_sessions.bulk_write(operations, ordered=False)
+                cache_invalidation.publish(*(str(patient) for patient in turns_by_patient))
+            except Exception as e:
+                # The chats collection remains the source of truth, the session is rebuilt on next read
+                logger.warning(f"Failed to update session turns for {len(operations)} patients: {e}")
+
+        logger.info("Bulk saved %d chat messages", len(chat_documents) - len(failed))
+        return failed
+
+    @staticmethod
+    def get_cache_stats() -> Dict[str, Any]:
+        """
+        Get statistics for the in-process context caches (for debugging/monitoring)
+
+        Returns:
+            dict: Stats for each cache
+        """
+        return {
+            "checkin": DatabaseService.checkin_cache.get_stats(),
+            "session": DatabaseService.session_cache.get_stats(),
+            "invalidation": cache_invalidation.get_stats()
+        }
+
+
+cache_invalidation.register(DatabaseService.checkin_cache, DatabaseService.session_cache)
+
+
+# Write-behind queue for chat inserts, started/drained by the application lifecycle when enabled
+chat_write_queue = ChatWriteBehindQueue(
+    flush_callback=DatabaseService.save_chat_messages_bulk,
+    batch_size=settings.chat_write_batch_size,
+    flush_interval_ms=settings.chat_write_flush_interval_ms,
+    max_pending=settings.chat_write_max_pending
+)
+
+
 if __name__ == "__main__":
     import asyncio
     from models.database_models import connect_to_mongo
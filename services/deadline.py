@@ -0,0 +1,113 @@
+"""
+End-to-end request deadlines
+A request starts with a time budget; each stage (DB reads, LLM calls) runs with whatever remains
+"""
+
+import time
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Awaitable, Deque, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class DeadlineExceeded(Exception):
+    """Raised when a stage runs out of the request's remaining time budget"""
+
+    def __init__(self, stage: str):
+        super().__init__(f"Deadline exceeded during {stage}")
+        self.stage = stage
+
+
+class Deadline:
+    """The time budget of a single request"""
+
+    __slots__ = ("budget", "expires_at")
+
+    def __init__(self, budget_seconds: float):
+        self.budget = budget_seconds
+        self.expires_at = time.monotonic() + budget_seconds
+
+    def remaining(self) -> float:
+        """Seconds left in the budget (0 once expired)"""
+        return max(self.expires_at - time.monotonic(), 0.0)
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+
+class StageStats:
+    """Call and timeout counters per request stage"""
+
+    def __init__(self):
+        self._stages: Dict[str, Dict[str, int]] = {}
+
+    def record(self, stage: str, timed_out: bool) -> None:
+        stats = self._stages.setdefault(stage, {"calls": 0, "timeouts": 0})
+        stats["calls"] += 1
+        stats["timeouts"] += int(timed_out)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get per-stage timeout counts (for debugging/monitoring)
+
+        Returns:
+            dict: Calls, timeouts and timeout rate per stage
+        """
+        return {
+            stage: {**stats, "timeout_rate": round(stats["timeouts"] / stats["calls"], 4) if stats["calls"] else 0.0}
+            for stage, stats in self._stages.items()
+        }
+
+
+class LatencyTracker:
+    """Rolling window of call latencies, used to pick the hedging threshold"""
+
+    def __init__(self, window: int):
+        self._samples: Deque[float] = deque(maxlen=window)
+
+    def record(self, seconds: float) -> None:
+        self._samples.append(seconds)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def percentile(self, fraction: float) -> Optional[float]:
+        """The given percentile (0-1) of the window, or None if empty"""
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)]
+
+
+async def run_stage(stage: str, awaitable: Awaitable, deadline: Optional[Deadline]) -> Any:
+    """
+    Await a stage within the request's remaining budget
+
+    Args:
+        stage: Stage name for the timeout counters (e.g. "db_context", "llm_kay_chat")
+        awaitable: The stage's coroutine
+        deadline: The request deadline, or None to run without a limit
+
+    Returns:
+        The stage's result
+
+    Raises:
+        DeadlineExceeded: If the budget runs out before the stage finishes
+    """
+    if deadline is None:
+        return await awaitable
+
+    try:
+        result = await asyncio.wait_for(awaitable, timeout=deadline.remaining())
+    except asyncio.TimeoutError:
+        stage_stats.record(stage, timed_out=True)
+        logger.warning(f"[DEADLINE] {stage} ran out of the {deadline.budget}s request budget")
+        raise DeadlineExceeded(stage)
+    stage_stats.record(stage, timed_out=False)
+    return result
+
+
+stage_stats = StageStats()
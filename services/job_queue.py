@@ -0,0 +1,279 @@
+"""
+Durable job queue backed by the MongoDB jobs collection
+The API enqueues Kay bot and summary work; worker.py claims jobs with a lease, runs them and stores the result
+"""
+
+import asyncio
+import logging
+from datetime import datetime, timedelta, UTC
+from typing import Any, Dict, Optional
+
+from bson import ObjectId
+from pymongo import ReturnDocument
+
+from config import settings
+from models.database_models import get_database
+
+logger = logging.getLogger(__name__)
+
+# Job types handled by the worker
+JOB_TYPES = ("kay_bot", "checkin_summary", "bulk_summary", "kay_regenerate")
+
+# Job statuses; queued and running jobs are claimable once availableAt has passed
+# (for running jobs that means the worker's lease expired)
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+FINISHED_STATUSES = (JOB_SUCCEEDED, JOB_FAILED)
+
+
+class JobDeferred(Exception):
+    """Raised by a job handler that can't run yet (e.g. its dependency is down); the attempt isn't counted"""
+
+    def __init__(self, reason: str, delay_seconds: float):
+        super().__init__(reason)
+        self.delay_seconds = delay_seconds
+
+
+class JobQueue:
+    """Enqueue, claim, complete and poll jobs stored in the jobs collection"""
+
+    def __init__(self, lease_seconds: float, max_attempts: int, result_ttl_seconds: float, poll_interval_ms: int):
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.result_ttl_seconds = result_ttl_seconds
+        self.poll_interval = poll_interval_ms / 1000
+
+    async def enqueue(self, job_type: str, payload: Dict[str, Any], delay_seconds: float = 0) -> str:
+        """
+        Add a job to the queue
+
+        Args:
+            job_type: One of JOB_TYPES
+            payload: JSON-serializable job arguments
+            delay_seconds: Keep the job from being claimed for this long
+
+        Returns:
+            str: The job ID
+        """
+        if job_type not in JOB_TYPES:
+            raise ValueError(f"Unknown job type {job_type!r}")
+
+        db = get_database()
+        now = datetime.now(UTC)
+        job = {
+            "_id": ObjectId(),
+            "type": job_type,
+            "payload": payload,
+            "status": JOB_QUEUED,
+            "attempts": 0,
+            "availableAt": now + timedelta(seconds=delay_seconds),
+            "createdAt": now,
+            "updatedAt": now
+        }
+        await db.jobs.insert_one(job)
+        logger.info("[JOBS] Enqueued %s job %s", job_type, job['_id'])
+        return str(job["_id"])
+
+    async def claim(self, worker_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Claim the oldest available job, leasing it to this worker
+
+        Args:
+            worker_id: Identifier of the claiming worker
+
+        Returns:
+            The claimed job document, or None if no job is available
+        """
+        db = get_database()
+        now = datetime.now(UTC)
+        return await db.jobs.find_one_and_update(
+            {"status": {"$in": [JOB_QUEUED, JOB_RUNNING]}, "availableAt": {"$lte": now}},
+            {
+                "$set": {
+                    "status": JOB_RUNNING,
+                    "workerId": worker_id,
+                    "availableAt": now + timedelta(seconds=self.lease_seconds),
+                    "updatedAt": now
+                },
+                "$inc": {"attempts": 1}
+            },
+            sort=[("availableAt", 1)],
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def extend_lease(self, job: Dict[str, Any]) -> bool:
+        """
+        Push back a running job's lease so other workers don't reclaim it (called periodically while it runs)
+
+        Args:
+            job: The claimed job document
+
+        Returns:
+            bool: False if the lease was already lost to another worker
+        """
+        db = get_database()
+        now = datetime.now(UTC)
+        result = await db.jobs.update_one(
+            {"_id": job["_id"], "status": JOB_RUNNING, "workerId": job["workerId"]},
+            {"$set": {"availableAt": now + timedelta(seconds=self.lease_seconds), "updatedAt": now}}
+        )
+        return result.modified_count == 1
+
+    async def complete(self, job: Dict[str, Any], result: Dict[str, Any]) -> bool:
+        """
+        Store a job's result and mark it succeeded
+
+        Args:
+            job: The claimed job document
+            result: JSON-serializable job result
+
+        Returns:
+            bool: False if the lease was lost to another worker and the result was discarded
+        """
+        return await self._finish(job, {"status": JOB_SUCCEEDED, "result": result})
+
+    async def fail(self, job: Dict[str, Any], error: str, retry: bool = True) -> bool:
+        """
+        Record a job failure, re-queueing it with backoff until max_attempts is reached
+
+        Args:
+            job: The claimed job document
+            error: Error description
+            retry: Set to False for failures a retry can't fix (e.g. an invalid payload)
+
+        Returns:
+            bool: False if the lease was lost to another worker
+        """
+        if retry and job["attempts"] < self.max_attempts:
+            db = get_database()
+            now = datetime.now(UTC)
+            backoff = min(2 ** job["attempts"], 60)
+            result = await db.jobs.update_one(
+                {"_id": job["_id"], "status": JOB_RUNNING, "workerId": job["workerId"]},
+                {"$set": {
+                    "status": JOB_QUEUED,
+                    "error": error,
+                    "availableAt": now + timedelta(seconds=backoff),
+                    "updatedAt": now
+                }}
+            )
+            logger.warning(f"[JOBS] Job {job['_id']} attempt {job['attempts']} failed, retrying in {backoff}s: {error}")
+            return result.modified_count == 1
+
+        logger.error(f"[JOBS] Job {job['_id']} failed after {job['attempts']} attempts: {error}")
+        return await self._finish(job, {"status": JOB_FAILED, "error": error})
+
+    async def defer(self, job: Dict[str, Any], delay_seconds: float, reason: str) -> bool:
+        """
+        Put a claimed job back in the queue without counting the attempt
+
+        Args:
+            job: The claimed job document
+            delay_seconds: Seconds before the job may be claimed again
+            reason: Why the job was deferred
+
+        Returns:
+            bool: False if the lease was lost to another worker
+        """
+        db = get_database()
+        now = datetime.now(UTC)
+        result = await db.jobs.update_one(
+            {"_id": job["_id"], "status": JOB_RUNNING, "workerId": job["workerId"]},
+            {
+                "$set": {
+                    "status": JOB_QUEUED,
+                    "availableAt": now + timedelta(seconds=delay_seconds),
+                    "updatedAt": now
+                },
+                "$inc": {"attempts": -1}
+            }
+        )
+        logger.info("[JOBS] Job %s deferred for %.0fs: %s", job['_id'], delay_seconds, reason)
+        return result.modified_count == 1
+
+    async def _finish(self, job: Dict[str, Any], fields: Dict[str, Any]) -> bool:
+        db = get_database()
+        now = datetime.now(UTC)
+        result = await db.jobs.update_one(
+            # Only the worker holding the lease may finish the job
+            {"_id": job["_id"], "status": JOB_RUNNING, "workerId": job["workerId"]},
+            {"$set": {
+                **fields,
+                "finishedAt": now,
+                "updatedAt": now,
+                # Finished jobs are removed by the TTL index on expireAt
+                "expireAt": now + timedelta(seconds=self.result_ttl_seconds)
+            }}
+        )
+        return result.modified_count == 1
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Get a job's status and result
+
+        Args:
+            job_id: The job ID (ObjectId string)
+
+        Returns:
+            Dictionary with job_id, type, status, attempts, result, error and timestamps, or None if not found
+        """
+        db = get_database()
+        job = await db.jobs.find_one(
+            {"_id": ObjectId(job_id)},
+            projection={"payload": 0, "workerId": 0, "availableAt": 0, "expireAt": 0}
+        )
+        if job is None:
+            return None
+        return {
+            "job_id": job_id,
+            "type": job["type"],
+            "status": job["status"],
+            "attempts": job["attempts"],
+            "result": job.get("result"),
+            "error": job.get("error"),
+            "created_at": job["createdAt"],
+            "updated_at": job["updatedAt"],
+            "finished_at": job.get("finishedAt")
+        }
+
+    async def wait(self, job_id: str, timeout: float) -> Optional[Dict[str, Any]]:
+        """
+        Long-poll a job until it finishes or the timeout passes
+
+        Args:
+            job_id: The job ID (ObjectId string)
+            timeout: Maximum seconds to wait
+
+        Returns:
+            The job as returned by get(), or None if not found
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while True:
+            job = await self.get(job_id)
+            if job is None or job["status"] in FINISHED_STATUSES or loop.time() >= deadline:
+                return job
+            await asyncio.sleep(min(self.poll_interval, max(deadline - loop.time(), 0)))
+
+    async def get_stats(self) -> Dict[str, Any]:
+        """
+        Get job counts per status (for debugging/monitoring)
+
+        Returns:
+            dict: Number of jobs in each status
+        """
+        db = get_database()
+        counts = {status: 0 for status in (JOB_QUEUED, JOB_RUNNING, JOB_SUCCEEDED, JOB_FAILED)}
+        async for row in db.jobs.aggregate([{"$group": {"_id": "$status", "count": {"$sum": 1}}}]):
+            counts[row["_id"]] = row["count"]
+        return counts
+
+
+job_queue = JobQueue(
+    lease_seconds=settings.job_lease_seconds,
+    max_attempts=settings.job_max_attempts,
+    result_ttl_seconds=settings.job_result_ttl_seconds,
+    poll_interval_ms=settings.job_poll_interval_ms
+)
@@ -0,0 +1,174 @@
+"""
+Record/replay backend for LLM calls
+In record mode every call's prompt, response, token usage and timing is appended to a cassette file;
+in replay mode calls are answered from the cassette with the recorded latency (scaled or zeroed),
+so performance runs are deterministic and don't touch OpenAI. Entries are keyed by a hash of the
+model and the rendered prompt, so any prompt change shows up as a cassette miss.
+"""
+
+import gzip
+import json
+import time
+import asyncio
+import hashlib
+import logging
+from collections import defaultdict
+from typing import TYPE_CHECKING, Any, AsyncIterator, Dict, List, Optional
+
+if TYPE_CHECKING:
+    from langchain_core.messages import AIMessage, AIMessageChunk
+
+logger = logging.getLogger(__name__)
+
+
+class CassetteMiss(Exception):
+    """Raised in replay mode for a prompt the cassette has no recording of"""
+
+    def __init__(self, task: str, key: str):
+        super().__init__(f"No cassette recording for {task} prompt {key}")
+        self.task = task
+        self.key = key
+
+
+def prompt_key(model: str, messages: list) -> str:
+    """Hash of the model and the rendered prompt messages"""
+    rendered = json.dumps([model, [(message.type, message.content) for message in messages]], ensure_ascii=False)
+    return hashlib.sha256(rendered.encode("utf-8")).hexdigest()[:24]
+
+
+class Cassette:
+    """
+    The recorded calls, stored as gzipped JSON lines (one call per line, appended as calls finish).
+    Recordings are buffered and written off the event loop by one writer task; call flush() before
+    exiting. A prompt recorded several times is replayed round-robin through its recordings, so a
+    replay sees the same sequence of responses on every run.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._entries: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        self._next: Dict[str, int] = defaultdict(int)
+        self._pending: List[Dict[str, Any]] = []
+        self._writer: Optional[asyncio.Task] = None
+        self.stats = {"recorded": 0, "hits": 0, "misses": 0, "write_errors": 0}
+
+    def load(self) -> None:
+        try:
+            with gzip.open(self.path, "rt", encoding="utf-8") as f:
+                for line in f:
+                    entry = json.loads(line)
+                    self._entries[entry["key"]].append(entry)
+        except FileNotFoundError:
+            logger.warning(f"[CASSETTE] {self.path} not found, every call will miss")
+            return
+        logger.info("[CASSETTE] Loaded %s recordings from %s", sum(len(v) for v in self._entries.values()), self.path)
+
+    def append(self, entry: Dict[str, Any]) -> None:
+        self._entries[entry["key"]].append(entry)
+        self.stats["recorded"] += 1
+        self._pending.append(entry)
+        if self._writer is None or self._writer.done():
+            self._writer = asyncio.create_task(self._write_pending())
+
+    async def _write_pending(self) -> None:
+        # Entries appended while a batch is being written go out in the next one, in order
+        while self._pending:
+            batch, self._pending = self._pending, []
+            try:
+                await asyncio.to_thread(self._write, batch)
+            except Exception as e:
+                self.stats["write_errors"] += 1
+                logger.error(f"[CASSETTE] Failed to write {len(batch)} recordings to {self.path}: {e}")
+
+    def _write(self, batch: List[Dict[str, Any]]) -> None:
+        # Each write adds a gzip member; readers see them as one stream
+        with gzip.open(self.path, "at", encoding="utf-8") as f:
+            f.writelines(json.dumps(entry, ensure_ascii=False) + "\n" for entry in batch)
+
+    async def flush(self) -> None:
+        """Wait until every recording appended so far is written to the file"""
+        if self._writer is not None:
+            await self._writer
+
+    def lookup(self, task: str, key: str) -> Dict[str, Any]:
+        recordings = self._entries.get(key)
+        if not recordings:
+            self.stats["misses"] += 1
+            raise CassetteMiss(task, key)
+        self.stats["hits"] += 1
+        index = self._next[key]
+        self._next[key] = index + 1
+        return recordings[index % len(recordings)]
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {"path": self.path, "prompts": len(self._entries), "unwritten": len(self._pending), **self.stats}
+
+
+class CassetteClient:
+    """Wraps a task's chat client (ainvoke/astream) to record its calls or replay them from a cassette"""
+
+    def __init__(self, client, task: str, model: str, cassette: Cassette, mode: str, latency_scale: float = 1.0):
+        self.client = client
+        self.task = task
+        self.model = model
+        self.cassette = cassette
+        self.mode = mode
+        self.latency_scale = latency_scale
+
+    def _entry(self, key: str, messages: list, content: str, usage: Optional[Dict[str, Any]],
+               latency: float, first_token: float) -> Dict[str, Any]:
+        return {
+            "key": key,
+            "task": self.task,
+            "model": self.model,
+            "prompt_chars": sum(len(str(message.content)) for message in messages),
+            "content": content,
+            "usage": usage,
+            "latency": round(latency, 4),
+            "first_token": round(first_token, 4)
+        }
+
+    async def ainvoke(self, messages: list, **kwargs) -> "AIMessage":
+        key = prompt_key(self.model, messages)
+        if self.mode == "replay":
+            from langchain_core.messages import AIMessage
+
+            entry = self.cassette.lookup(self.task, key)
+            await asyncio.sleep(entry["latency"] * self.latency_scale)
+            return AIMessage(content=entry["content"], usage_metadata=entry["usage"])
+
+        started = time.monotonic()
+        response = await self.client.ainvoke(messages, **kwargs)
+        latency = time.monotonic() - started
+        self.cassette.append(self._entry(key, messages, response.content, response.usage_metadata, latency, latency))
+        return response
+
+    async def astream(self, messages: list, **kwargs) -> AsyncIterator["AIMessageChunk"]:
+        key = prompt_key(self.model, messages)
+        if self.mode == "replay":
+            from langchain_core.messages import AIMessageChunk
+
+            entry = self.cassette.lookup(self.task, key)
+            await asyncio.sleep(entry["first_token"] * self.latency_scale)
+            words = entry["content"].split(" ")
+            gap = max(entry["latency"] - entry["first_token"], 0.0) * self.latency_scale / max(len(words), 1)
+            for index, word in enumerate(words):
+                if index:
+                    await asyncio.sleep(gap)
+                yield AIMessageChunk(content=word if index == len(words) - 1 else word + " ")
+            yield AIMessageChunk(content="", usage_metadata=entry["usage"])
+            return
+
+        started = time.monotonic()
+        first_token = None
+        parts = []
+        usage = None
+        async for chunk in self.client.astream(messages, **kwargs):
+            if chunk.content and first_token is None:
+                first_token = time.monotonic() - started
+            parts.append(chunk.content)
+            if chunk.usage_metadata:
+                usage = chunk.usage_metadata
+            yield chunk
+        latency = time.monotonic() - started
+        self.cassette.append(self._entry(key, messages, "".join(parts), usage, latency, first_token or latency))
@@ -0,0 +1,171 @@
+"""
+Logging pipeline
+Request handlers only put log records on a bounded queue; a background thread formats them (text or
+JSON with the request ID), masks PHI and writes them to stdout, so a slow stdout never adds latency to
+a chat response. INFO lines logged while handling a request can be sampled per request.
+"""
+
+import re
+import sys
+import json
+import zlib
+import queue
+import atexit
+import logging
+import logging.handlers
+from datetime import datetime, UTC
+from typing import Optional
+
+from config import settings
+from services.tracing import current_trace
+from services.metrics import current_endpoint, LOG_RECORDS_DROPPED
+
+TEXT_FORMAT = '%(asctime)s | %(levelname)-8s | %(message)s'
+
+# Loggers whose INFO lines are never sampled away (the request trace records are sampled on their own)
+UNSAMPLED_LOGGERS = ("services.tracing",)
+
+# Patient-identifying values that can end up in log text through exception messages or request data
+PHI_PATTERNS = (
+    (re.compile(r"[\w.+-]+@[\w-]+\.[\w.-]+"), "[email]"),
+    (re.compile(r"\b\d{3}-\d{2}-\d{4}\b"), "[ssn]"),
+    # Separated groups only, so dates, durations and database IDs are left alone
+    (re.compile(r"(?<![\w+])(?:\+\d{1,3}[\s.-]?)?\(?\d{3}\)?[\s.-]\d{3}[\s.-]\d{4}\b"), "[phone]"),
+)
+
+
+def redact(text: str) -> str:
+    """Mask emails, phone numbers and social security numbers"""
+    for pattern, replacement in PHI_PATTERNS:
+        text = pattern.sub(replacement, text)
+    return text
+
+
+class RequestContextFilter(logging.Filter):
+    """
+    Runs where the record is logged: attaches the request ID and endpoint (which live in context
+    variables the log thread can't see) and drops INFO lines of requests that aren't sampled
+    """
+
+    def __init__(self, sample_rate: float = 1.0):
+        super().__init__()
+        self.sample_rate = sample_rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        trace = current_trace.get()
+        record.request_id = trace.request_id if trace is not None else None
+        record.endpoint = current_endpoint.get()
+        if (
+            trace is None
+            or self.sample_rate >= 1.0
+            or record.levelno > logging.INFO
+            or record.name in UNSAMPLED_LOGGERS
+        ):
+            return True
+        # Decided per request ID, so a sampled request keeps all of its lines
+        return zlib.crc32(trace.request_id.encode()) % 10_000 < self.sample_rate * 10_000
+
+
+class RedactingFormatter(logging.Formatter):
+    """The usual text format, with PHI masked"""
+
+    def __init__(self, fmt: Optional[str] = None, redact_phi: bool = True):
+        super().__init__(fmt)
+        self.redact_phi = redact_phi
+
+    def formatMessage(self, record: logging.LogRecord) -> str:
+        if self.redact_phi:
+            record.message = redact(record.message)
+        return super().formatMessage(record)
+
+    def formatException(self, exc_info) -> str:
+        text = super().formatException(exc_info)
+        return redact(text) if self.redact_phi else text
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per line: timestamp, level, logger, message, request_id, endpoint and exception"""
+
+    def __init__(self, redact_phi: bool = True):
+        super().__init__()
+        self.redact_phi = redact_phi
+
+    def format(self, record: logging.LogRecord) -> str:
+        message = record.getMessage()
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, UTC).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": redact(message) if self.redact_phi else message,
+            "request_id": getattr(record, "request_id", None),
+            "endpoint": getattr(record, "endpoint", None)
+        }
+        if record.exc_info:
+            exception = self.formatException(record.exc_info)
+            entry["exception"] = redact(exception) if self.redact_phi else exception
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that never waits: records are handed over unformatted (the log thread resolves the
+    message and traceback) and dropped, with a counter, when the queue is full
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # The listener runs in this process, so the record doesn't need to be made picklable
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_RECORDS_DROPPED.inc()
+
+
+class LogListener(logging.handlers.QueueListener):
+    """QueueListener whose shutdown waits for room on a full queue instead of raising"""
+
+    def enqueue_sentinel(self) -> None:
+        self.queue.put(self._sentinel)
+
+
+_listener: Optional[LogListener] = None
+
+
+def configure_logging() -> None:
+    """
+    Set up the root logger from settings (log_format, log_async, log_queue_size,
+    log_request_sample_rate, log_redact_phi). Does nothing if logging is already configured,
+    like logging.basicConfig.
+    """
+    global _listener
+    root = logging.getLogger()
+    if root.handlers:
+        return
+
+    stream_handler = logging.StreamHandler(sys.stdout)
+    if settings.log_format == "json":
+        stream_handler.setFormatter(JSONFormatter(redact_phi=settings.log_redact_phi))
+    else:
+        stream_handler.setFormatter(RedactingFormatter(TEXT_FORMAT, redact_phi=settings.log_redact_phi))
+
+    if settings.log_async:
+        handler = NonBlockingQueueHandler(queue.Queue(maxsize=settings.log_queue_size))
+        _listener = LogListener(handler.queue, stream_handler)
+        _listener.start()
+        atexit.register(stop_logging)
+    else:
+        handler = stream_handler
+
+    handler.addFilter(RequestContextFilter(settings.log_request_sample_rate))
+    root.addHandler(handler)
+    root.setLevel(logging.INFO)
+
+
+def stop_logging() -> None:
+    """Write out the queued records and stop the log thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
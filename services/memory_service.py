@@ -0,0 +1,100 @@
+"""
+Rolling conversation memory
+Folds older session turns into a stored running summary in the background
+"""
+
+import asyncio
+import logging
+from typing import Any, Dict, Set
+
+from config import settings
+from services.db_service import DatabaseService
+from services.metrics import current_endpoint
+from services.tracing import current_trace
+
+logger = logging.getLogger(__name__)
+
+
+class ConversationMemoryService:
+    """Keeps each patient's prompt history bounded by summarizing older turns"""
+
+    def __init__(self, llm_service):
+        self.llm_service = llm_service
+        self._folding: Set[str] = set()
+        self._tasks: Set[asyncio.Task] = set()
+        self.folds = 0
+        self.fold_failures = 0
+        self.fold_conflicts = 0
+
+    def schedule_fold(self, patient_id: str, session_turns: int) -> None:
+        """
+        Start a background fold if the patient's session has grown past the threshold
+
+        Args:
+            patient_id: ID of the patient (ObjectId string)
+            session_turns: Number of turns currently in the patient's session
+        """
+        if session_turns < settings.memory_fold_threshold or patient_id in self._folding:
+            return
+        self._folding.add(patient_id)
+        task = asyncio.create_task(self._fold(patient_id))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _fold(self, patient_id: str) -> None:
+        # Runs in a copy of the scheduling request's context; keep its stages out of that request's timings
+        current_endpoint.set("background:memory_fold")
+        current_trace.set(None)
+        try:
+            memory = await DatabaseService.get_patient_memory(patient_id)
+            if memory is None or len(memory['turns']) < settings.memory_fold_threshold:
+                return
+
+            turns = memory['turns']
+            # Degraded-mode replies aren't part of the conversation until they are regenerated
+            to_fold = [turn for turn in turns[:len(turns) - settings.memory_keep_recent] if not turn.degraded]
+            if not to_fold:
+                return
+
+            summary = await self.llm_service.summarize_conversation(memory['summary'], to_fold)
+            if not summary:
+                self.fold_failures += 1
+                return
+
+            applied = await DatabaseService.fold_patient_memory(
+                patient_id,
+                summary=summary,
+                folded_through=to_fold[-1].created_at,
+                previous_through=memory['summarized_through']
+            )
+            if applied:
+                self.folds += 1
+                logger.info("[MEMORY] Folded %d turns into the running summary for patient %s", len(to_fold), patient_id)
+            else:
+                # Another worker folded this session first
+                self.fold_conflicts += 1
+
+        except Exception as e:
+            self.fold_failures += 1
+            logger.error(f"[MEMORY] Error folding conversation memory for patient {patient_id}: {e}")
+        finally:
+            self._folding.discard(patient_id)
+
+    async def wait_idle(self, timeout: float = 30.0) -> None:
+        """Wait for in-flight folds to finish (used on shutdown)"""
+        if self._tasks:
+            await asyncio.wait(list(self._tasks), timeout=timeout)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get conversation memory statistics (for debugging/monitoring)
+
+        Returns:
+            dict: In-flight and completed fold counts
+        """
+        return {
+            "in_flight": len(self._folding),
+            "folds": self.folds,
+            "fold_failures": self.fold_failures,
+            "fold_conflicts": self.fold_conflicts
+        }
@@ -0,0 +1,151 @@
+"""
+Prometheus metrics
+Request rate, errors and latency per route, latency per pipeline stage (session read, prompt render,
+LLM call, chat insert, ...), LLM token counts and in-flight gauges, served from /metrics
+"""
+
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Coroutine, Iterator
+
+from fastapi import Request, Response
+from fastapi.routing import APIRoute
+from prometheus_client import Counter, Gauge, Histogram
+
+from services.admission import get_admission_stats
+from services.tracing import record_span
+
+# Route template (e.g. /agent/kay-bot) or job type the current stage belongs to
+current_endpoint: ContextVar[str] = ContextVar("current_endpoint", default="none")
+
+# Seconds; LLM calls run from well under a second to the request budget
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0)
+
+HTTP_REQUESTS = Counter(
+    "kay_http_requests_total", "HTTP requests handled", ["route", "method", "status"]
+)
+HTTP_LATENCY = Histogram(
+    "kay_http_request_duration_seconds", "Time until the response starts", ["route", "method"],
+    buckets=LATENCY_BUCKETS
+)
+HTTP_IN_FLIGHT = Gauge(
+    "kay_http_requests_in_flight", "HTTP requests being handled", ["route"]
+)
+STAGE_LATENCY = Histogram(
+    "kay_stage_duration_seconds", "Time spent in each pipeline stage", ["endpoint", "stage"],
+    buckets=LATENCY_BUCKETS
+)
+STAGE_ERRORS = Counter(
+    "kay_stage_errors_total", "Pipeline stages that raised", ["endpoint", "stage"]
+)
+LLM_CALLS = Counter(
+    "kay_llm_calls_total", "LLM calls by outcome (ok, error, cancelled, rejected)", ["task", "outcome"]
+)
+LLM_IN_FLIGHT = Gauge(
+    "kay_llm_calls_in_flight", "LLM calls in progress", ["task"]
+)
+LLM_TOKENS = Counter(
+    "kay_llm_tokens_total", "Provider-reported LLM tokens (input, cached_input, output)", ["task", "model", "kind"]
+)
+RATE_LIMIT_DECISIONS = Counter(
+    "kay_rate_limit_decisions_total", "Rate limit checks by bucket scope, API key name and result",
+    ["scope", "key", "result"]
+)
+LOG_RECORDS_DROPPED = Counter(
+    "kay_log_records_dropped_total", "Log records dropped because the log thread's queue was full"
+)
+
+# Point-in-time gauges copied from the services' own stats when /metrics is scraped
+ADMISSION_IN_FLIGHT = Gauge("kay_admission_in_flight", "LLM slots held", ["limiter"])
+ADMISSION_WAITING = Gauge("kay_admission_waiting", "Requests waiting for an LLM slot", ["limiter"])
+ADMISSION_REJECTED = Gauge("kay_admission_rejected", "Requests shed since startup", ["limiter", "reason"])
+BREAKER_OPEN = Gauge("kay_llm_breaker_open", "1 while the task's circuit breaker is not closed", ["task"])
+CHAT_WRITE_QUEUE_DEPTH = Gauge("kay_chat_write_queue_depth", "Chats waiting in the write-behind queue")
+MEMORY_FOLDS_IN_FLIGHT = Gauge("kay_memory_folds_in_flight", "Conversation memory folds running")
+
+
+@contextmanager
+def track_stage(stage: str) -> Iterator[None]:
+    """
+    Time a pipeline stage under the current endpoint (and in the current request's trace)
+
+    Args:
+        stage: Stage name (e.g. "session_read", "prompt_render", "llm_call", "chat_insert")
+    """
+    endpoint = current_endpoint.get()
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        STAGE_ERRORS.labels(endpoint, stage).inc()
+        raise
+    finally:
+        duration = time.perf_counter() - started
+        STAGE_LATENCY.labels(endpoint, stage).observe(duration)
+        record_span(stage, started, duration)
+
+
+@contextmanager
+def track_llm_call(task: str) -> Iterator[None]:
+    """Count an LLM call and hold it in the in-flight gauge while it runs (timed as the llm_call stage)"""
+    LLM_IN_FLIGHT.labels(task).inc()
+    outcome = "error"
+    try:
+        with track_stage("llm_call"):
+            yield
+        outcome = "ok"
+    except BaseException as e:
+        if not isinstance(e, Exception):
+            outcome = "cancelled"
+        raise
+    finally:
+        LLM_IN_FLIGHT.labels(task).dec()
+        LLM_CALLS.labels(task, outcome).inc()
+
+
+def record_llm_tokens(task: str, model: str, input_tokens: int, cached_tokens: int, output_tokens: int) -> None:
+    LLM_TOKENS.labels(task, model, "input").inc(input_tokens)
+    LLM_TOKENS.labels(task, model, "cached_input").inc(cached_tokens)
+    LLM_TOKENS.labels(task, model, "output").inc(output_tokens)
+
+
+def refresh_service_gauges(llm_service, memory_service, chat_write_queue) -> None:
+    """Copy point-in-time state from the services into their gauges (called on each scrape)"""
+    for limiter, stats in get_admission_stats().items():
+        ADMISSION_IN_FLIGHT.labels(limiter).set(stats["in_flight"])
+        ADMISSION_WAITING.labels(limiter).set(stats["waiting"])
+        for reason, count in stats["rejected"].items():
+            ADMISSION_REJECTED.labels(limiter, reason).set(count)
+    for task, stats in llm_service.get_breaker_stats().items():
+        BREAKER_OPEN.labels(task).set(0 if stats["state"] == "closed" else 1)
+    CHAT_WRITE_QUEUE_DEPTH.set(chat_write_queue.depth)
+    MEMORY_FOLDS_IN_FLIGHT.set(memory_service.get_stats()["in_flight"])
+
+
+class MetricsRoute(APIRoute):
+    """APIRoute that records request count, latency and in-flight requests under the route's path template"""
+
+    def get_route_handler(self) -> Callable[[Request], Coroutine[Any, Any, Response]]:
+        handler = super().get_route_handler()
+        route = self.path_format
+
+        async def timed_handler(request: Request) -> Response:
+            # Not reset afterwards: a streamed body runs after the handler returns, still within this request's context
+            current_endpoint.set(route)
+            HTTP_IN_FLIGHT.labels(route).inc()
+            started = time.perf_counter()
+            status_code = 500
+            try:
+                response = await handler(request)
+                status_code = response.status_code
+                return response
+            except Exception as e:
+                status_code = getattr(e, "status_code", 500)
+                raise
+            finally:
+                HTTP_LATENCY.labels(route, request.method).observe(time.perf_counter() - started)
+                HTTP_REQUESTS.labels(route, request.method, str(status_code)).inc()
+                HTTP_IN_FLIGHT.labels(route).dec()
+
+        return timed_handler
@@ -1,39 +1,555 @@
 from config import settings
-import os
 import time
-import inspect
-from rich import print
+import asyncio
 import logging
-from prompt_registry import *
-from langchain_openai import ChatOpenAI
-from langchain_core.messages import SystemMessage, HumanMessage
+import threading
+from prompt_registry import registry, PromptTemplate
+from typing import AsyncIterator, List, Dict, Any, Optional
+from models.context_records import ChatTurn
+from services.context_builder import ContextBuilder, PromptContext
+from services.deadline import Deadline, DeadlineExceeded, LatencyTracker, stage_stats
+from services.circuit_breaker import CircuitBreaker, CircuitOpenError, CLOSED
+from services.metrics import track_stage, track_llm_call, record_llm_tokens, LLM_CALLS
+from services.llm_cassette import Cassette, CassetteClient
+
+KAY_FALLBACK_RESPONSE = "I'm sorry, I'm having trouble responding right now. Please try again."
+
+# Sent without calling the model while the kay_chat breaker is open; the turn is regenerated once it recovers
+KAY_DEGRADED_RESPONSE = (
+    "I'm having a little trouble putting my thoughts together right now, but I'm still here with you. "
+    "While I catch up, try this: breathe in slowly for 4 counts, hold for 4, and breathe out for 6. "
+    "Repeat it a few times and notice your feet resting on the floor.\n\n"
+    "If you're in crisis or thinking about harming yourself, please reach out right now: call or text 988 "
+    "(Suicide & Crisis Lifeline) or text HOME to 741741 (Crisis Text Line). "
+    "If you're in immediate danger, call 911."
+)
 
 class LLMService:
     def __init__(self):
-        self.chat_openai = ChatOpenAI(api_key=settings.openai_api_key, model="gpt-4o", temperature=0.8,timeout=None, max_retries=2)
         self.logger = logging.getLogger(__name__)
 
+        # One client per task, configured from the routing table in settings
+        self.routes = settings.get_llm_routes()
+        self.tasks: List[str] = []
+        for task, route in self.routes.items():
+            if not route.get("model"):
+                self.logger.warning(f"[LLM] Route for {task} has no model, skipping")
+                continue
+            self.tasks.append(task)
+        # Built on first use (or by the startup warm-up): importing langchain_openai takes seconds
+        self._clients: Optional[Dict[str, Any]] = None
+        self._clients_lock = threading.Lock()
+
+        # Record calls to, or replay them from, a cassette file (deterministic offline performance runs)
+        self.cassette: Optional[Cassette] = None
+        if settings.llm_cassette_mode != "off":
+            self.cassette = Cassette(settings.llm_cassette_path)
+            if settings.llm_cassette_mode == "replay":
+                self.cassette.load()
+            self.logger.warning(f"[LLM] Cassette {settings.llm_cassette_mode} mode using {settings.llm_cassette_path}")
+
+        # Recent latencies per task (hedging threshold) and hedging counters
+        self.latency = {task: LatencyTracker(settings.llm_latency_window) for task in self.tasks}
+        self.hedge_stats = {task: {"hedged": 0, "hedge_wins": 0} for task in self.tasks}
+
+        # Fail fast while a route's upstream is unhealthy
+        self.breakers = {
+            task: CircuitBreaker(
+                f"llm_{task}",
+                window_seconds=settings.llm_breaker_window_seconds,
+                min_calls=settings.llm_breaker_min_calls,
+                error_rate_threshold=settings.llm_breaker_error_rate,
+                slow_call_seconds=settings.llm_breaker_slow_call_seconds,
+                slow_rate_threshold=settings.llm_breaker_slow_rate,
+                open_seconds=settings.llm_breaker_open_seconds,
+                half_open_probes=settings.llm_breaker_half_open_probes
+            )
+            for task in self.tasks
+        }
+
+        self.context_builder = ContextBuilder(
+            history_token_budget=settings.history_token_budget,
+            checkin_token_budget=settings.checkin_token_budget,
+            summary_token_budget=settings.memory_summary_token_budget
+        )
+        # Static Kay prompt token count per template variant (content hash -> tokens)
+        self._kay_prompt_tokens: Dict[str, int] = {}
+        self.prompt_token_stats = {
+            "requests": 0,
+            "system_tokens": 0,
+            "checkin_tokens": 0,
+            "summary_tokens": 0,
+            "history_tokens": 0,
+            "message_tokens": 0,
+            "checkin_truncated": 0,
+            "history_turns_dropped": 0,
+            "last": None
+        }
+        # Token usage reported by the provider, per task
+        self.usage_stats: Dict[str, Dict[str, Any]] = {}
+
+        # Prompt variants configured for startup
+        for name, weights in settings.prompt_variant_weights.items():
+            try:
+                registry.set_variant_weights(name, weights)
+            except (KeyError, ValueError) as e:
+                self.logger.warning(f"[LLM] Ignoring prompt variant weights for {name}: {e}")
+
+    def _record_usage(self, task: str, usage_metadata: Optional[Dict[str, Any]], template: PromptTemplate) -> None:
+        """
+        Add the provider-reported token usage (including prompt-cache hits) for a call to the per-task totals,
+        counting calls per prompt template version so A/B variants can be compared
+        """
+        if not usage_metadata:
+            return
+        input_tokens = usage_metadata.get("input_tokens", 0)
+        cached_tokens = (usage_metadata.get("input_token_details") or {}).get("cache_read", 0) or 0
+        output_tokens = usage_metadata.get("output_tokens", 0)
+
+        stats = self.usage_stats.setdefault(task, {
+            "model": self.routes[task]["model"],
+            "calls": 0,
+            "input_tokens": 0,
+            "cached_input_tokens": 0,
+            "output_tokens": 0,
+            "prompts": {}
+        })
+        stats["calls"] += 1
+        stats["prompts"][template.key] = stats["prompts"].get(template.key, 0) + 1
+        stats["input_tokens"] += input_tokens
+        stats["cached_input_tokens"] += cached_tokens
+        stats["output_tokens"] += output_tokens
+        record_llm_tokens(task, stats["model"], input_tokens, cached_tokens, output_tokens)
+
+        self.logger.info(
+            "[LLM] %s usage (%s): input=%s cached=%s output=%s", task, template.key, input_tokens, cached_tokens, output_tokens
+        )
+
+    def get_usage_stats(self) -> Dict[str, Any]:
+        """
+        Get provider-reported token usage per task (for debugging/monitoring)
+
+        Returns:
+            dict: Per-task token totals and prompt-cache hit ratio
+        """
+        return {
+            task: {
+                **stats,
+                "cache_hit_ratio": round(stats["cached_input_tokens"] / stats["input_tokens"], 4)
+                if stats["input_tokens"] else 0.0
+            }
+            for task, stats in self.usage_stats.items()
+        }
+
+    def _record_prompt_tokens(self, prompt_context: PromptContext, user_message: str, kay_template: PromptTemplate) -> None:
+        """Log the Kay prompt token breakdown and add it to the running totals"""
+        counter = self.context_builder.counter
+        system_tokens = self._kay_prompt_tokens.get(kay_template.content_hash)
+        if system_tokens is None:
+            # Static Kay prompt (the cacheable prefix)
+            system_tokens = self._kay_prompt_tokens[kay_template.content_hash] = counter.count(kay_template.render())
+
+        breakdown = {
+            "system_tokens": system_tokens,
+            "checkin_tokens": prompt_context.checkin_tokens,
+            "summary_tokens": prompt_context.summary_tokens,
+            "history_tokens": prompt_context.history_tokens,
+            "message_tokens": counter.count(user_message),
+            "history_turns": prompt_context.turns_included,
+            "history_turns_available": prompt_context.turns_available,
+            "checkin_truncated": prompt_context.checkin_truncated,
+            "exact": counter.exact
+        }
+        breakdown["total_tokens"] = (
+            breakdown["system_tokens"] + breakdown["checkin_tokens"] + breakdown["summary_tokens"]
+            + breakdown["history_tokens"] + breakdown["message_tokens"]
+        )
+
+        stats = self.prompt_token_stats
+        stats["requests"] += 1
+        for key in ("system_tokens", "checkin_tokens", "summary_tokens", "history_tokens", "message_tokens"):
+            stats[key] += breakdown[key]
+        stats["checkin_truncated"] += int(prompt_context.checkin_truncated)
+        stats["history_turns_dropped"] += prompt_context.turns_available - prompt_context.turns_included
+        stats["last"] = breakdown
 
-    async def get_chat_summary(self, context_string: str):
+        self.logger.info(
+            "[KAY-BOT] Prompt tokens: total=%s system=%s checkin=%s summary=%s history=%s (%s/%s turns) message=%s",
+            breakdown['total_tokens'], breakdown['system_tokens'], breakdown['checkin_tokens'],
+            breakdown['summary_tokens'], breakdown['history_tokens'],
+            prompt_context.turns_included, prompt_context.turns_available, breakdown['message_tokens']
+        )
+
+    def get_prompt_token_stats(self) -> Dict[str, Any]:
         """
-        Generates a summary of the checkin data using LangChain and GPT-4o-mini.
+        Get Kay prompt token statistics (for debugging/monitoring)
+
+        Returns:
+            dict: Running totals, per-request averages and the last breakdown
         """
+        stats = dict(self.prompt_token_stats)
+        requests = stats["requests"]
+        stats["avg_total_tokens"] = round(
+            sum(
+                stats[key]
+                for key in ("system_tokens", "checkin_tokens", "summary_tokens", "history_tokens", "message_tokens")
+            ) / requests,
+            1
+        ) if requests else 0.0
+        return stats
+
+
+    @property
+    def clients(self) -> Dict[str, Any]:
+        """The per-task clients, built on first access (blocking; on the event loop use get_clients)"""
+        if self._clients is None:
+            with self._clients_lock:
+                if self._clients is None:
+                    self._clients = self._build_clients()
+        return self._clients
+
+    @clients.setter
+    def clients(self, clients: Dict[str, Any]) -> None:
+        self._clients = clients
+
+    def _build_clients(self) -> Dict[str, Any]:
+        from langchain_openai import ChatOpenAI
+
+        clients = {}
+        for task in self.tasks:
+            route = self.routes[task]
+            clients[task] = ChatOpenAI(
+                api_key=settings.openai_api_key,
+                model=route["model"],
+                temperature=route.get("temperature"),
+                max_tokens=route.get("max_tokens"),
+                timeout=route.get("timeout"),
+                max_retries=route.get("max_retries", 2),
+                stream_usage=True
+            )
+            self.logger.info("[LLM] %s routed to %s", task, route['model'])
+            if self.cassette is not None:
+                clients[task] = CassetteClient(
+                    clients[task], task, route["model"], self.cassette,
+                    mode=settings.llm_cassette_mode, latency_scale=settings.llm_cassette_latency_scale
+                )
+        return clients
+
+    async def get_clients(self) -> Dict[str, Any]:
+        """
+        The per-task clients. If the startup warm-up hasn't built them yet they are built in a thread,
+        since importing langchain and constructing the clients would block the event loop for seconds.
+        """
+        if self._clients is None:
+            await asyncio.to_thread(lambda: self.clients)
+        return self._clients
+
+    async def client(self, task: str):
+        """
+        Get the client for a task
+
+        Args:
+            task: Task name from the routing table (kay_chat, checkin_summary, memory_summary, ...)
+
+        Returns:
+            ChatOpenAI: The client configured for the task's model, temperature, max_tokens, timeout and retries
+        """
+        return (await self.get_clients())[task]
+
+    async def warm_up(self) -> Dict[str, Any]:
+        """
+        Build the clients and open their HTTP connections (TCP and TLS) with a models request, so the
+        first chat doesn't pay for the import and the handshakes. Clients that share a connection pool
+        are only warmed once.
+
+        Returns:
+            dict: Tasks warmed and connection errors per task
+        """
+        clients = await self.get_clients()
+        warmed, errors, pools = [], {}, set()
+        for task, client in clients.items():
+            # Cassette and stand-in clients have no OpenAI connection to open
+            root_client = getattr(client, "root_async_client", None)
+            if root_client is None:
+                continue
+            pool = id(getattr(root_client, "_client", root_client))
+            if pool in pools:
+                continue
+            pools.add(pool)
+            try:
+                # A copy with other options still uses the client's connection pool
+                await root_client.with_options(max_retries=0, timeout=10.0).models.list()
+                warmed.append(task)
+            except Exception as e:
+                errors[task] = str(e)
+                self.logger.warning(f"[LLM] Connection warm-up for {task} failed: {e}")
+        return {"warmed": warmed, "errors": errors}
+
+    def warm_prompts(self) -> Dict[str, int]:
+        """
+        Load the tokenizer and count the static Kay prompt tokens of every served variant
+        (done per request otherwise); blocking, run it in a thread
+
+        Returns:
+            dict: Static token count per Kay prompt template key
+        """
+        counter = self.context_builder.counter
+        tokens = {}
+        for template in registry.variants("kay_bot"):
+            if template.content_hash not in self._kay_prompt_tokens:
+                self._kay_prompt_tokens[template.content_hash] = counter.count(template.render())
+            tokens[template.key] = self._kay_prompt_tokens[template.content_hash]
+        return tokens
+
+    def _hedge_delay(self, task: str) -> Optional[float]:
+        """Seconds to wait on the first attempt before starting a hedged one, None if the task isn't hedged yet"""
+        if self.cassette is not None:
+            # A duplicate attempt would record an extra entry, or advance the replay to the next recording
+            return None
+        tracker = self.latency[task]
+        if not self.routes[task].get("hedge") or len(tracker) < settings.llm_hedge_min_samples:
+            return None
+        return max(tracker.percentile(settings.llm_hedge_percentile), settings.llm_hedge_min_delay_seconds)
+
+    async def _invoke(self, task: str, messages: list, deadline: Optional[Deadline] = None):
+        """
+        Call the task's client within the request deadline, hedging slow calls:
+        once the first attempt runs past the task's p95 latency a second attempt starts and the first to finish wins
+
+        Args:
+            task: Task name from the routing table
+            messages: The prompt messages
+            deadline: The request deadline, or None for no limit beyond the client's own timeout
+
+        Returns:
+            The model's response message
+
+        Raises:
+            CircuitOpenError: If the task's breaker is open (the model is not called)
+            DeadlineExceeded: If no attempt finishes within the remaining budget
+        """
+        breaker = self.breakers[task]
+        generation = breaker.allow_request()
+        if generation is None:
+            LLM_CALLS.labels(task, "rejected").inc()
+            raise CircuitOpenError(breaker.name, breaker.retry_after())
+
+        started = time.monotonic()
         try:
-            # Use string replacement to avoid format conflicts
-            formatted_prompt = summary_prompt.replace("{{context_string}}", context_string)
-            
-            messages = [
-                SystemMessage(formatted_prompt),
-                HumanMessage("Please provide a summary of the checkin data.")
-            ]
-            response = await self.chat_openai.ainvoke(messages)
+            with track_llm_call(task):
+                response = await self._invoke_hedged(task, messages, deadline, started)
+        except asyncio.CancelledError:
+            breaker.record_cancelled(generation)
+            raise
+        except Exception:
+            breaker.record_failure(generation)
+            raise
+        breaker.record_success(generation, time.monotonic() - started)
+        return response
+
+    async def _invoke_hedged(self, task: str, messages: list, deadline: Optional[Deadline], started: float):
+        stage = f"llm_{task}"
+        client = await self.client(task)
+        attempts = [asyncio.create_task(client.ainvoke(messages))]
+
+        def remaining() -> Optional[float]:
+            return deadline.remaining() if deadline is not None else None
+
+        try:
+            hedge_delay = self._hedge_delay(task)
+            if hedge_delay is not None:
+                budget = remaining()
+                done, _ = await asyncio.wait(
+                    attempts, timeout=hedge_delay if budget is None else min(hedge_delay, budget)
+                )
+                if not done and (deadline is None or not deadline.expired):
+                    self.hedge_stats[task]["hedged"] += 1
+                    self.logger.info("[LLM] %s exceeded %.2fs, starting a hedged attempt", task, hedge_delay)
+                    attempts.append(asyncio.create_task(client.ainvoke(messages)))
+
+            pending = set(attempts)
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, timeout=remaining(), return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    stage_stats.record(stage, timed_out=True)
+                    self.logger.warning(f"[DEADLINE] {stage} ran out of the {deadline.budget}s request budget")
+                    raise DeadlineExceeded(stage)
+                for attempt in done:
+                    if attempt.exception() is None:
+                        if attempt is not attempts[0]:
+                            self.hedge_stats[task]["hedge_wins"] += 1
+                        self.latency[task].record(time.monotonic() - started)
+                        stage_stats.record(stage, timed_out=False)
+                        return attempt.result()
+                    error = attempt.exception()
+            raise error
+        finally:
+            for attempt in attempts:
+                if not attempt.done():
+                    attempt.cancel()
+                elif not attempt.cancelled():
+                    # Mark a losing attempt's error as retrieved
+                    attempt.exception()
+
+    def is_available(self, task: str) -> bool:
+        """Whether the task's breaker is closed (an open or probing breaker means the upstream is degraded)"""
+        return self.breakers[task].state == CLOSED
+
+    async def flush_cassette(self) -> None:
+        """Write the cassette's buffered recordings (used on shutdown)"""
+        if self.cassette is not None:
+            await self.cassette.flush()
+
+    def get_cassette_stats(self) -> Optional[Dict[str, Any]]:
+        """
+        Get cassette recording/replay counters (for debugging/monitoring)
+
+        Returns:
+            dict: Cassette path, recorded prompts, recorded calls, hits and misses, or None if not in use
+        """
+        return self.cassette.get_stats() if self.cassette else None
+
+    def get_breaker_stats(self) -> Dict[str, Any]:
+        """
+        Get circuit breaker state per task (for debugging/monitoring)
+
+        Returns:
+            dict: Breaker state and rolling-window rates per task
+        """
+        return {task: breaker.get_stats() for task, breaker in self.breakers.items()}
+
+    def get_latency_stats(self) -> Dict[str, Any]:
+        """
+        Get per-task LLM latency percentiles and hedging counters (for debugging/monitoring)
+
+        Returns:
+            dict: Samples, p50/p95 latency, current hedge threshold and hedge counts per task
+        """
+        stats = {}
+        for task, tracker in self.latency.items():
+            p50 = tracker.percentile(0.5)
+            p95 = tracker.percentile(0.95)
+            hedge_delay = self._hedge_delay(task)
+            stats[task] = {
+                "samples": len(tracker),
+                "p50_ms": round(p50 * 1000, 1) if p50 is not None else None,
+                "p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+                "hedge_after_ms": round(hedge_delay * 1000, 1) if hedge_delay is not None else None,
+                **self.hedge_stats[task]
+            }
+        return stats
+
+    async def get_chat_summary(self, context_string: str, deadline: Optional[Deadline] = None):
+        """
+        Generates a summary of the checkin data using LangChain and the checkin_summary route (GPT-4o-mini by default).
+        """
+        try:
+            # Loads langchain off the event loop if nothing has built the clients yet
+            await self.get_clients()
+            from langchain_core.messages import SystemMessage, HumanMessage
+
+            with track_stage("prompt_render"):
+                template = registry.get("checkin_summary")
+                messages = [
+                    SystemMessage(template.render(context_string=context_string)),
+                    HumanMessage("Please provide a summary of the checkin data.")
+                ]
+            response = await self._invoke("checkin_summary", messages, deadline)
+            self._record_usage("checkin_summary", response.usage_metadata, template)
             return response.content
+        except CircuitOpenError as e:
+            self.logger.warning(f"Skipping chat summary: {e}")
+            return None
         except Exception as e:
             self.logger.error(f"Error generating chat summary: {str(e)}")
             import traceback
             self.logger.error(f"Full traceback: {traceback.format_exc()}")
             return None
 
+    async def summarize_conversation(self, running_summary: str, turns: List[ChatTurn]) -> Optional[str]:
+        """
+        Fold older conversation turns into the running conversation summary.
+
+        Args:
+            running_summary: The existing running summary ("" if none yet)
+            turns: The turns to fold in, oldest first
+
+        Returns:
+            The updated running summary, or None if generation failed
+        """
+        try:
+            await self.get_clients()
+            from langchain_core.messages import SystemMessage, HumanMessage
+
+            with track_stage("prompt_render"):
+                new_turns = "\n\n".join(f"User: {turn.query}\nAssistant: {turn.response}" for turn in turns)
+                template = registry.get("memory_summary")
+                messages = [
+                    SystemMessage(template.render(running_summary=running_summary or "No summary yet.", new_turns=new_turns)),
+                    HumanMessage("Please provide the updated running summary.")
+                ]
+            response = await self._invoke("memory_summary", messages)
+            self._record_usage("memory_summary", response.usage_metadata, template)
+            return response.content
+        except Exception as e:
+            self.logger.error(f"Error generating conversation summary: {str(e)}")
+            import traceback
+            self.logger.error(f"Full traceback: {traceback.format_exc()}")
+            return None
+
+    def _build_kay_messages(
+        self,
+        user_message: str,
+        patient_name: str,
+        patient_age: str,
+        patient_gender: str,
+        checkin_context: str,
+        conversation_turns: List[ChatTurn],
+        conversation_summary: str,
+        kay_template: PromptTemplate,
+        prompt_bucket: Optional[str]
+    ) -> list:
+        """
+        Build the message list for a Kay bot turn from patient context and conversation history,
+        fitting the check-in and history sections into their token budgets
+        """
+        from langchain_core.messages import SystemMessage, HumanMessage, AIMessage
+
+        prompt_context = self.context_builder.build(checkin_context, conversation_turns, conversation_summary)
+        self._record_prompt_tokens(prompt_context, user_message, kay_template)
+
+        # Create checkin context for the prompt
+        complete_checkin_context_data = {
+            "first_name": patient_name,
+            "age": int(patient_age) if patient_age.isdigit() else 25,
+            "gender": patient_gender,
+            "checkin_data": prompt_context.checkin_context
+        }
+        
+        # Convert to string format
+        checkin_string = f"Name: {complete_checkin_context_data['first_name']}, Age: {complete_checkin_context_data['age']}, Gender: {complete_checkin_context_data['gender']}\nCheck-in Data: {complete_checkin_context_data['checkin_data']}"
+        
+        # Per-patient context goes in its own system message so the static prompt stays a cacheable prefix
+        context_prompt = registry.get("kay_bot_context", prompt_bucket).render(checkin_context=checkin_string)
+        if prompt_context.summary:
+            context_prompt += registry.get("kay_bot_summary_section", prompt_bucket).render(
+                conversation_summary=prompt_context.summary
+            )
+
+        messages = [
+            SystemMessage(kay_template.render()),
+            SystemMessage(context_prompt)
+        ]
+
+        # Conversation history as real turns, oldest first, so the list only grows by appending
+        for turn in prompt_context.history_turns:
+            messages.append(HumanMessage(turn.query))
+            messages.append(AIMessage(turn.response))
+
+        messages.append(HumanMessage(user_message))
+        return messages
+
     async def generate_kay_response(
         self,
         user_message: str,
@@ -41,39 +557,119 @@ class LLMService:
         patient_age: str,
         patient_gender: str,
         checkin_context: str,
-        conversational_context: str
+        conversation_turns: List[ChatTurn],
+        conversation_summary: str = "",
+        prompt_bucket: Optional[str] = None,
+        deadline: Optional[Deadline] = None
     ) -> str:
         """
         Generate a response from Kay bot using patient context and conversation history
+
+        prompt_bucket (the patient ID) keeps each patient on the same prompt variant during an A/B split.
+        The LLM call gets whatever remains of deadline; DeadlineExceeded is raised if it runs out, so the
+        caller can answer with a timeout instead of saving the fallback message as the patient's reply.
         """
         try:
-            # Create checkin context for the prompt
-            complete_checkin_context_data = {
-                "first_name": patient_name,
-                "age": int(patient_age) if patient_age.isdigit() else 25,
-                "gender": patient_gender,
-                "checkin_data": checkin_context
-            }
-            
-            # Convert to string format
-            checkin_string = f"Name: {complete_checkin_context_data['first_name']}, Age: {complete_checkin_context_data['age']}, Gender: {complete_checkin_context_data['gender']}\nCheck-in Data: {complete_checkin_context_data['checkin_data']}"
-            
-            # Use conversation agent prompt for ongoing conversations
-            formatted_prompt = kay_bot_prompt.replace("{{checkin_context}}", checkin_string)
-            formatted_prompt = formatted_prompt.replace("{{conversation_history}}", conversational_context)
-            
-            messages = [
-                SystemMessage(formatted_prompt),
-                HumanMessage(user_message)
-            ]
+            await self.get_clients()
+            with track_stage("prompt_render"):
+                kay_template = registry.get("kay_bot", prompt_bucket)
+                messages = self._build_kay_messages(
+                    user_message, patient_name, patient_age, patient_gender,
+                    checkin_context, conversation_turns, conversation_summary, kay_template, prompt_bucket
+                )
             
-            response = await self.chat_openai.ainvoke(messages)
+            response = await self._invoke("kay_chat", messages, deadline)
+            self._record_usage("kay_chat", response.usage_metadata, kay_template)
             return response.content
-            
+
+        except (CircuitOpenError, DeadlineExceeded):
+            # The caller answers with the degraded response or a timeout
+            raise
         except Exception as e:
             self.logger.error(f"Error generating Kay response: {str(e)}")
             import traceback
             self.logger.error(f"Full traceback: {traceback.format_exc()}")
-            return "I'm sorry, I'm having trouble responding right now. Please try again."
-        
-    
\ No newline at end of file
+            return KAY_FALLBACK_RESPONSE
+
+    async def stream_kay_response(
+        self,
+        user_message: str,
+        patient_name: str,
+        patient_age: str,
+        patient_gender: str,
+        checkin_context: str,
+        conversation_turns: List[ChatTurn],
+        conversation_summary: str = "",
+        prompt_bucket: Optional[str] = None,
+        deadline: Optional[Deadline] = None
+    ) -> AsyncIterator[str]:
+        """
+        Stream a response from Kay bot token by token, each chunk within whatever remains of deadline.
+        Streams are not hedged, since tokens already sent can't be taken back.
+
+        Yields the fallback message if the model fails before producing any output.
+        A failure after tokens were sent is re-raised so the caller can drop the partial reply.
+        CircuitOpenError is raised before any output while the kay_chat breaker is open, and
+        DeadlineExceeded whenever the budget runs out (the fallback message is not a reply to save).
+        """
+        tokens_sent = False
+        breaker = self.breakers["kay_chat"]
+        # Breaker generation the call runs in, once it has been let through
+        generation = None
+        try:
+            await self.get_clients()
+            with track_stage("prompt_render"):
+                kay_template = registry.get("kay_bot", prompt_bucket)
+                messages = self._build_kay_messages(
+                    user_message, patient_name, patient_age, patient_gender,
+                    checkin_context, conversation_turns, conversation_summary, kay_template, prompt_bucket
+                )
+
+            generation = breaker.allow_request()
+            if generation is None:
+                LLM_CALLS.labels("kay_chat", "rejected").inc()
+                raise CircuitOpenError(breaker.name, breaker.retry_after())
+            started = time.monotonic()
+
+            usage_metadata = None
+            with track_llm_call("kay_chat"):
+                chunks = (await self.client("kay_chat")).astream(messages).__aiter__()
+                while True:
+                    try:
+                        if deadline is None:
+                            chunk = await chunks.__anext__()
+                        else:
+                            chunk = await asyncio.wait_for(chunks.__anext__(), timeout=deadline.remaining())
+                    except StopAsyncIteration:
+                        break
+                    except asyncio.TimeoutError:
+                        stage_stats.record("llm_kay_chat_stream", timed_out=True)
+                        raise DeadlineExceeded("llm_kay_chat_stream")
+                    if chunk.usage_metadata:
+                        usage_metadata = chunk.usage_metadata
+                    if chunk.content:
+                        tokens_sent = True
+                        yield chunk.content
+                stage_stats.record("llm_kay_chat_stream", timed_out=False)
+            breaker.record_success(generation, time.monotonic() - started)
+            self._record_usage("kay_chat", usage_metadata, kay_template)
+
+        except CircuitOpenError:
+            raise
+        except DeadlineExceeded:
+            if generation is not None:
+                breaker.record_failure(generation)
+            raise
+        except (asyncio.CancelledError, GeneratorExit):
+            if generation is not None:
+                breaker.record_cancelled(generation)
+            raise
+        except Exception as e:
+            if generation is not None:
+                breaker.record_failure(generation)
+            self.logger.error(f"Error streaming Kay response: {str(e)}")
+            import traceback
+            self.logger.error(f"Full traceback: {traceback.format_exc()}")
+            if tokens_sent:
+                raise
+            yield KAY_FALLBACK_RESPONSE
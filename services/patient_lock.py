@@ -0,0 +1,224 @@
+"""
+Per-patient request serialization and single-flight
+Kay bot turns for one patient run one at a time so each reads the history the previous one saved,
+and an identical message already in flight is answered by that request's LLM call instead of a new one.
+With redis_url set, turns are also serialized across API processes and workers with a Redis lock.
+"""
+
+import time
+import uuid
+import asyncio
+import hashlib
+import logging
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple, TypeVar
+
+from config import settings
+from services.db_service import DatabaseService
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Deletes the lock only if it still holds our token, so an expired lock taken over by someone else is left alone
+RELEASE_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+
+class PatientBusy(Exception):
+    """Raised when a patient's previous turn doesn't finish within the lock wait budget"""
+
+    def __init__(self, patient_id: str):
+        super().__init__(f"Another message for patient {patient_id} is still being processed")
+        self.patient_id = patient_id
+
+
+class PatientLock:
+    """A held per-patient lock; release() is idempotent so it can be called from more than one cleanup path"""
+
+    __slots__ = ("_serializer", "patient_id", "_token", "_released")
+
+    def __init__(self, serializer: "PatientSerializer", patient_id: str, token: Optional[str]):
+        self._serializer = serializer
+        self.patient_id = patient_id
+        self._token = token
+        self._released = False
+
+    async def release(self) -> None:
+        if self._released:
+            return
+        self._released = True
+        await self._serializer._release(self.patient_id, self._token)
+
+
+class PatientSerializer:
+    """Per-patient locks (in-process, optionally backed by Redis) plus single-flight for identical messages"""
+
+    def __init__(self, wait_seconds: float, lock_ttl_seconds: float, redis_url: Optional[str] = None):
+        self.wait_seconds = wait_seconds
+        self.lock_ttl_seconds = lock_ttl_seconds
+        self.redis_url = redis_url
+        self._redis = None
+
+        # patient_id -> (lock, number of holders and waiters); entries are dropped once unused
+        self._locks: Dict[str, Tuple[asyncio.Lock, int]] = {}
+        # (patient_id, message hash) -> the in-flight turn
+        self._in_flight: Dict[Tuple[str, str], asyncio.Future] = {}
+
+        self.serialized = 0
+        self.coalesced = 0
+        self.busy = 0
+
+    @property
+    def distributed(self) -> bool:
+        return self.redis_url is not None
+
+    def _get_redis(self):
+        if self._redis is None:
+            # Only needed for multi-process deployments
+            import redis.asyncio as redis
+            self._redis = redis.from_url(self.redis_url)
+        return self._redis
+
+    async def acquire(self, patient_id: str) -> PatientLock:
+        """
+        Wait for the patient's lock
+
+        Args:
+            patient_id: ID of the patient
+
+        Returns:
+            PatientLock: The held lock, to be released once the turn is saved
+
+        Raises:
+            PatientBusy: If the lock isn't free within wait_seconds
+        """
+        lock, users = self._locks.get(patient_id, (None, 0))
+        if lock is None:
+            lock = asyncio.Lock()
+        self._locks[patient_id] = (lock, users + 1)
+        if users:
+            # Someone else holds or is waiting for the lock (the lock itself may not be taken yet)
+            self.serialized += 1
+
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(lock.acquire(), timeout=self.wait_seconds)
+        except asyncio.TimeoutError:
+            self._drop_user(patient_id)
+            self.busy += 1
+            raise PatientBusy(patient_id)
+        except BaseException:
+            self._drop_user(patient_id)
+            raise
+
+        token = None
+        if self.distributed:
+            try:
+                token = await self._acquire_redis(patient_id, self.wait_seconds - (time.monotonic() - started))
+            except BaseException:
+                lock.release()
+                self._drop_user(patient_id)
+                raise
+            # The previous turn may have been saved by another process, so this one's cached session is stale
+            DatabaseService.session_cache.invalidate(patient_id)
+        return PatientLock(self, patient_id, token)
+
+    async def _acquire_redis(self, patient_id: str, timeout: float) -> str:
+        client = self._get_redis()
+        key = f"kay:patient-lock:{patient_id}"
+        token = uuid.uuid4().hex
+        deadline = time.monotonic() + max(timeout, 0.0)
+        delay = 0.01
+        waited = False
+        while True:
+            if await client.set(key, token, nx=True, px=int(self.lock_ttl_seconds * 1000)):
+                return token
+            if time.monotonic() >= deadline:
+                self.busy += 1
+                raise PatientBusy(patient_id)
+            if not waited:
+                waited = True
+                self.serialized += 1
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 0.2)
+
+    async def _release(self, patient_id: str, token: Optional[str]) -> None:
+        lock, _ = self._locks[patient_id]
+        try:
+            if token is not None:
+                await self._get_redis().eval(RELEASE_SCRIPT, 1, f"kay:patient-lock:{patient_id}", token)
+        except Exception as e:
+            # The lock expires on its own after lock_ttl_seconds
+            logger.warning(f"[PATIENT-LOCK] Error releasing the Redis lock for patient {patient_id}: {e}")
+        finally:
+            lock.release()
+            self._drop_user(patient_id)
+
+    def _drop_user(self, patient_id: str) -> None:
+        lock, users = self._locks[patient_id]
+        if users <= 1:
+            del self._locks[patient_id]
+        else:
+            self._locks[patient_id] = (lock, users - 1)
+
+    async def run(self, patient_id: str, message: str, turn: Callable[[], Awaitable[T]]) -> T:
+        """
+        Run a turn under the patient's lock, sharing the result with identical messages that arrive while it runs
+
+        Args:
+            patient_id: ID of the patient
+            message: The patient's message (identical in-flight messages are coalesced)
+            turn: Generates and saves the reply
+
+        Returns:
+            The turn's result
+
+        Raises:
+            PatientBusy: If the patient's previous turn doesn't finish within wait_seconds
+        """
+        key = (patient_id, hashlib.sha256(message.encode("utf-8")).hexdigest())
+        shared = self._in_flight.get(key)
+        if shared is not None:
+            self.coalesced += 1
+            logger.info("[PATIENT-LOCK] Coalescing a duplicate message for patient %s", patient_id)
+            return await asyncio.shield(shared)
+
+        async def locked_turn() -> T:
+            lock = await self.acquire(patient_id)
+            try:
+                return await turn()
+            finally:
+                await lock.release()
+
+        shared = asyncio.ensure_future(locked_turn())
+        self._in_flight[key] = shared
+        shared.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        # Shielded so one caller disconnecting doesn't cancel the turn for the others (or its save)
+        return await asyncio.shield(shared)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get serialization counters (for debugging/monitoring)
+
+        Returns:
+            dict: Mode, patients currently locked, in-flight turns, and serialized/coalesced/busy counts
+        """
+        return {
+            "mode": "redis" if self.distributed else "local",
+            "locked_patients": len(self._locks),
+            "in_flight": len(self._in_flight),
+            "serialized": self.serialized,
+            "coalesced": self.coalesced,
+            "busy": self.busy
+        }
+
+
+patient_serializer = PatientSerializer(
+    wait_seconds=settings.patient_lock_wait_seconds,
+    lock_ttl_seconds=settings.patient_lock_ttl_seconds,
+    redis_url=settings.redis_url
+)
@@ -0,0 +1,109 @@
+"""
+Prompt variant weights shared by every process
+PUT /agent/prompts/{name}/variants stores the weights in the prompt_variants collection. Every API
+process and job worker loads the stored weights at startup and re-reads them every
+prompt_weights_refresh_seconds, so a change reaches all of them within that interval.
+Stored weights take precedence over settings.prompt_variant_weights.
+"""
+
+import asyncio
+import logging
+from datetime import datetime, UTC
+from typing import Any, Dict, Optional
+
+from config import settings
+from models.database_models import get_database
+from prompt_registry import registry
+
+logger = logging.getLogger(__name__)
+
+
+class PromptWeightsStore:
+    """Stores prompt variant weights in MongoDB and applies the stored weights to this process's registry"""
+
+    def __init__(self, refresh_seconds: float):
+        self.refresh_seconds = refresh_seconds
+        self._refresher: Optional[asyncio.Task] = None
+        self.refreshes = 0
+        self.errors = 0
+        self.last_refresh: Optional[datetime] = None
+
+    async def save(self, name: str, weights: Dict[str, int]) -> None:
+        """
+        Serve these variant weights in this process now, and in the others from their next refresh
+
+        Args:
+            name: Template name
+            weights: Relative weight per registered variant
+
+        Raises:
+            KeyError: If the template or a variant is not registered
+            ValueError: If no variant has a positive weight
+        """
+        registry.set_variant_weights(name, weights)
+        await get_database().prompt_variants.update_one(
+            {"_id": name},
+            {"$set": {"weights": weights, "updatedAt": datetime.now(UTC)}},
+            upsert=True
+        )
+
+    async def refresh(self) -> None:
+        """Apply the stored weights to the registry"""
+        async for document in get_database().prompt_variants.find():
+            name, weights = document["_id"], document["weights"]
+            served = {variant: weight for variant, weight in weights.items() if weight > 0}
+            if registry.get_variant_weights(name) == served:
+                continue
+            try:
+                registry.set_variant_weights(name, weights)
+            except (KeyError, ValueError) as e:
+                # e.g. a variant registered by a newer deployment that this process doesn't have yet
+                logger.warning(f"[PROMPTS] Ignoring stored variant weights for {name}: {e}")
+                continue
+            logger.info("[PROMPTS] Variant weights for %s set to %s", name, weights)
+        self.refreshes += 1
+        self.last_refresh = datetime.now(UTC)
+
+    async def _refresh_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self.refresh_seconds)
+            try:
+                await self.refresh()
+            except Exception as e:
+                self.errors += 1
+                logger.warning(f"[PROMPTS] Failed to refresh prompt variant weights: {e}")
+
+    async def start(self) -> None:
+        """Load the stored weights, then keep re-reading them in the background"""
+        try:
+            await self.refresh()
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"[PROMPTS] Failed to load prompt variant weights, serving the configured ones: {e}")
+        if self.refresh_seconds > 0 and self._refresher is None:
+            self._refresher = asyncio.create_task(self._refresh_periodically())
+
+    async def stop(self) -> None:
+        """Stop refreshing"""
+        if self._refresher is not None:
+            self._refresher.cancel()
+            await asyncio.gather(self._refresher, return_exceptions=True)
+            self._refresher = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get weight refresh counters (for debugging/monitoring)
+
+        Returns:
+            dict: Refresh interval, completed refreshes and errors, and when the weights were last read
+        """
+        return {
+            "refresh_seconds": self.refresh_seconds,
+            "refreshes": self.refreshes,
+            "errors": self.errors,
+            "last_refresh": self.last_refresh.isoformat() if self.last_refresh else None
+        }
+
+
+# Global prompt weights instance
+prompt_weights = PromptWeightsStore(settings.prompt_weights_refresh_seconds)
@@ -0,0 +1,242 @@
+"""
+Token-bucket rate limiting per API key and per patient
+Each API key name and each patient has a bucket that refills at a steady rate up to a burst size
+(patients have separate buckets for Kay bot turns and for check-in summaries); a request takes one
+token from each of its buckets or is rejected with 429. Bulk summary requests also take one token per
+patient from the API key's bulk bucket. Buckets live in process memory, or in Redis
+(redis_url) so every API process draws from the same buckets.
+"""
+
+import math
+import time
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+from config import settings
+from services.metrics import RATE_LIMIT_DECISIONS
+
+logger = logging.getLogger(__name__)
+
+# (bucket key, capacity, tokens per second, tokens to take)
+Bucket = Tuple[str, int, float, int]
+
+# Refills each bucket (KEYS[i], capacity ARGV[3i-2], tokens per second ARGV[3i-1]) for the time since it
+# was last used, then takes its cost (ARGV[3i]) from every bucket only if all of them have enough, so a
+# request rejected by one bucket doesn't use up the others. Uses the Redis clock so processes with skewed clocks share
+# buckets correctly. Returns {allowed, tokens left per bucket...} with the tokens as strings (Lua numbers
+# are truncated to integers on return).
+TOKEN_BUCKET_SCRIPT = """
+local clock = redis.call("time")
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local levels = {}
+local allowed = 1
+for i, key in ipairs(KEYS) do
+    local capacity = tonumber(ARGV[3 * i - 2])
+    local rate = tonumber(ARGV[3 * i - 1])
+    local state = redis.call("hmget", key, "tokens", "ts")
+    local tokens = tonumber(state[1]) or capacity
+    local updated = tonumber(state[2]) or now
+    levels[i] = math.min(capacity, tokens + math.max(now - updated, 0) * rate)
+    if levels[i] < tonumber(ARGV[3 * i]) then
+        allowed = 0
+    end
+end
+local result = {allowed}
+for i, key in ipairs(KEYS) do
+    local capacity = tonumber(ARGV[3 * i - 2])
+    local rate = tonumber(ARGV[3 * i - 1])
+    local tokens = levels[i] - allowed * tonumber(ARGV[3 * i])
+    redis.call("hset", key, "tokens", tostring(tokens), "ts", tostring(now))
+    redis.call("pexpire", key, math.ceil((capacity - tokens) / rate * 1000) + 1000)
+    result[i + 1] = tostring(tokens)
+end
+return result
+"""
+
+
+class RateLimitDecision:
+    """Outcome of taking tokens from one bucket, with what the RateLimit-* headers report"""
+
+    __slots__ = ("scope", "allowed", "limit", "remaining", "reset_after", "retry_after")
+
+    def __init__(
+        self, scope: str, allowed: bool, capacity: int, tokens: float, per_second: float, cost: int = 1
+    ):
+        self.scope = scope
+        self.allowed = allowed
+        self.limit = capacity
+        self.remaining = max(int(tokens), 0)
+        # Seconds until the bucket is full again, and until it has enough tokens when rejected
+        self.reset_after = (capacity - tokens) / per_second
+        self.retry_after = 0.0 if allowed else (cost - tokens) / per_second
+
+    def headers(self) -> Dict[str, str]:
+        headers = {
+            "RateLimit-Limit": str(self.limit),
+            "RateLimit-Remaining": str(self.remaining),
+            "RateLimit-Reset": str(math.ceil(self.reset_after))
+        }
+        if not self.allowed:
+            headers["Retry-After"] = str(max(math.ceil(self.retry_after), 1))
+        return headers
+
+
+class RateLimitExceeded(Exception):
+    """Raised when the API key's or the patient's bucket is empty"""
+
+    def __init__(self, decision: RateLimitDecision):
+        super().__init__(f"Rate limit exceeded for {decision.scope}, retry in {decision.retry_after:.1f}s")
+        self.decision = decision
+
+
+class RateLimiter:
+    """Token buckets keyed by scope and identity, in memory or in Redis"""
+
+    def __init__(self, redis_url: Optional[str] = None, max_local_buckets: int = 100_000):
+        self.redis_url = redis_url
+        self.max_local_buckets = max_local_buckets
+        self._redis = None
+        self._script = None
+
+        # bucket key -> (tokens, monotonic time of last update, monotonic time it will be full again)
+        self._buckets: Dict[str, Tuple[float, float, float]] = {}
+
+        self.allowed = 0
+        self.limited: Dict[str, int] = {"api_key": 0, "patient": 0, "summary": 0, "bulk": 0}
+        self.redis_errors = 0
+
+    @property
+    def distributed(self) -> bool:
+        return self.redis_url is not None
+
+    def _get_script(self):
+        if self._script is None:
+            # Only needed for multi-process deployments
+            import redis.asyncio as redis
+            self._redis = redis.from_url(self.redis_url)
+            self._script = self._redis.register_script(TOKEN_BUCKET_SCRIPT)
+        return self._script
+
+    def _take_local(self, buckets: List[Bucket]) -> Tuple[bool, List[float]]:
+        now = time.monotonic()
+        levels = []
+        for key, capacity, per_second, _ in buckets:
+            tokens, updated, _ = self._buckets.get(key, (float(capacity), now, now))
+            levels.append(min(float(capacity), tokens + (now - updated) * per_second))
+        allowed = all(tokens >= cost for (_, _, _, cost), tokens in zip(buckets, levels))
+        if allowed:
+            levels = [tokens - cost for (_, _, _, cost), tokens in zip(buckets, levels)]
+
+        for (key, capacity, per_second, _), tokens in zip(buckets, levels):
+            if key not in self._buckets and len(self._buckets) >= self.max_local_buckets:
+                self._prune(now)
+            self._buckets[key] = (tokens, now, now + (capacity - tokens) / per_second)
+        return allowed, levels
+
+    def _prune(self, now: float) -> None:
+        """Drop buckets that have refilled; a missing bucket starts full, so no limit changes"""
+        self._buckets = {key: bucket for key, bucket in self._buckets.items() if bucket[2] > now}
+
+    async def _take(self, buckets: List[Bucket]) -> Tuple[bool, List[float]]:
+        """Take each bucket's cost from it if all of them have enough tokens (all or nothing)"""
+        if not self.distributed:
+            return self._take_local(buckets)
+        args = []
+        for _, capacity, per_second, cost in buckets:
+            args.extend((capacity, per_second, cost))
+        try:
+            allowed, *levels = await self._get_script()(
+                keys=[f"kay:ratelimit:{key}" for key, _, _, _ in buckets], args=args
+            )
+            return bool(allowed), [float(tokens) for tokens in levels]
+        except Exception as e:
+            # Keep limiting per process rather than failing requests while Redis is unreachable
+            self.redis_errors += 1
+            logger.warning(f"[RATE-LIMIT] Redis unavailable, using local buckets: {e}")
+            return self._take_local(buckets)
+
+    async def check(
+        self, key_name: str, patient_id: Optional[str] = None, patient_scope: str = "patient",
+        bulk_patients: int = 0
+    ) -> RateLimitDecision:
+        """
+        Take a token from the API key's bucket and, if given, the patient's bucket, and one token per
+        patient from the API key's bulk bucket for bulk requests. All buckets are checked before any is
+        charged, so a request rejected by one doesn't use up the others.
+
+        Args:
+            key_name: Name of the authenticated API key
+            patient_id: ID of the patient the request is for
+            patient_scope: Which of the patient's buckets to charge ("patient" for Kay bot turns,
+                "summary" for check-in summaries)
+            bulk_patients: Number of distinct patients in a bulk summary request
+
+        Returns:
+            RateLimitDecision: The decision of the bucket with the fewest tokens left (for the response headers)
+
+        Raises:
+            RateLimitExceeded: If any bucket doesn't have enough tokens
+        """
+        key_limits = settings.rate_limit_key_overrides.get(key_name, {})
+        # (scope, metrics label, identity, per minute, burst, cost)
+        limits = [(
+            "api_key", key_name, key_name,
+            key_limits.get("per_minute", settings.rate_limit_key_per_minute),
+            key_limits.get("burst", settings.rate_limit_key_burst), 1
+        )]
+        if patient_id:
+            if patient_scope == "summary":
+                per_minute, burst = settings.rate_limit_summary_per_minute, settings.rate_limit_summary_burst
+            else:
+                per_minute, burst = settings.rate_limit_patient_per_minute, settings.rate_limit_patient_burst
+            limits.append((patient_scope, "patient", patient_id, per_minute, burst, 1))
+        if bulk_patients > 0:
+            burst = settings.rate_limit_bulk_burst
+            # A request for more patients than the bucket holds takes all of it rather than never passing
+            limits.append((
+                "bulk", key_name, key_name, settings.rate_limit_bulk_per_minute, burst, min(bulk_patients, burst)
+            ))
+
+        allowed, levels = await self._take([
+            (f"{scope}:{identity}", burst, per_minute / 60, cost)
+            for scope, _, identity, per_minute, burst, cost in limits
+        ])
+        decisions: List[RateLimitDecision] = [
+            # When rejected nothing was taken, so a bucket with enough tokens left isn't the one limiting
+            RateLimitDecision(scope, allowed or tokens >= cost, burst, tokens, per_minute / 60, cost)
+            for (scope, _, _, per_minute, burst, cost), tokens in zip(limits, levels)
+        ]
+
+        if not allowed:
+            for (scope, label, _, _, _, _), decision in zip(limits, decisions):
+                if not decision.allowed:
+                    RATE_LIMIT_DECISIONS.labels(scope, label, "limited").inc()
+                    self.limited[scope] += 1
+            limiting = next(decision for decision in decisions if not decision.allowed)
+            logger.info("[RATE-LIMIT] %s %s limited, retry in %.1fs", limiting.scope, key_name, limiting.retry_after)
+            raise RateLimitExceeded(limiting)
+
+        for scope, label, _, _, _, _ in limits:
+            RATE_LIMIT_DECISIONS.labels(scope, label, "allowed").inc()
+        self.allowed += 1
+        return min(decisions, key=lambda decision: decision.remaining)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get rate limiting counters (for debugging/monitoring)
+
+        Returns:
+            dict: Backend, allowed and limited requests and Redis errors
+        """
+        return {
+            "enabled": settings.rate_limit_enabled,
+            "backend": "redis" if self.distributed else "local",
+            "allowed": self.allowed,
+            "limited": dict(self.limited),
+            "local_buckets": len(self._buckets),
+            "redis_errors": self.redis_errors
+        }
+
+
+# Global rate limiter instance
+rate_limiter = RateLimiter(settings.redis_url)
@@ -0,0 +1,122 @@
+"""
+Startup warm-up and readiness
+After the MongoDB connection is up, the API fills the Mongo connection pool, provisions indexes and checks
+query plans, builds the LLM clients and opens their connections, and loads the tokenizer with the static
+prompt token counts, all concurrently in the background. /ready reports 503 until that has finished.
+"""
+
+import time
+import asyncio
+import logging
+from typing import Any, Awaitable, Dict, Optional
+
+from config import settings
+from models.database_models import warm_connection_pool, provision_database
+
+logger = logging.getLogger(__name__)
+
+
+class StartupWarmup:
+    """Runs the warm-up steps and keeps their timings for /ready"""
+
+    def __init__(self):
+        self.timings: Dict[str, float] = {}
+        self.results: Dict[str, Any] = {}
+        self.errors: Dict[str, str] = {}
+        self.ready = False
+        self.draining = False
+        self._task: Optional[asyncio.Task] = None
+
+    def record(self, step: str, seconds: float) -> None:
+        self.timings[step] = round(seconds, 3)
+
+    async def timed(self, step: str, awaitable: Awaitable, required: bool = True) -> Any:
+        """
+        Await a step and record how long it took
+
+        Args:
+            step: Name reported in the timing breakdown
+            awaitable: The step
+            required: Whether a failure keeps the instance from becoming ready
+
+        Returns:
+            The step's result, or None if an optional step failed
+        """
+        started = time.perf_counter()
+        try:
+            result = await awaitable
+        except Exception as e:
+            self.errors[step] = str(e)
+            if required:
+                raise
+            logger.warning(f"[STARTUP] Optional step {step} failed: {e}")
+            return None
+        finally:
+            self.record(step, time.perf_counter() - started)
+        if result is not None:
+            self.results[step] = result
+        return result
+
+    async def run(self, llm_service) -> None:
+        """
+        Run the warm-up steps concurrently and mark the instance ready if the required ones succeeded
+
+        Args:
+            llm_service: The LLMService whose clients and prompt token counts are warmed
+        """
+        started = time.perf_counter()
+        steps = [
+            self.timed("mongo_pool", warm_connection_pool()),
+            self.timed("prompts", asyncio.to_thread(llm_service.warm_prompts)),
+        ]
+        if settings.mongodb_verify_query_plans != "fail":
+            # In fail mode main.py provisions before startup completes
+            steps.append(self.timed("mongo_provision", provision_database()))
+        if settings.startup_warm_llm:
+            # The breaker and fallbacks handle an unreachable provider; it doesn't keep the instance unready
+            steps.append(self.timed("llm_connections", llm_service.warm_up(), required=False))
+
+        outcomes = await asyncio.gather(*steps, return_exceptions=True)
+        self.record("warmup_total", time.perf_counter() - started)
+
+        failed = [outcome for outcome in outcomes if isinstance(outcome, BaseException)]
+        for error in failed:
+            logger.error(f"[STARTUP] Warm-up step failed: {error}")
+        self.ready = not failed and not self.draining
+        logger.info("[STARTUP] Warm-up %s: %s", "finished" if self.ready else "failed", self.timings)
+
+    def start(self, llm_service) -> asyncio.Task:
+        """Start the warm-up in the background"""
+        self._task = asyncio.create_task(self.run(llm_service))
+        return self._task
+
+    def drain(self) -> None:
+        """Report not ready from now on (shutting down)"""
+        self.draining = True
+        self.ready = False
+
+    def get_status(self) -> Dict[str, Any]:
+        """
+        Get readiness and the startup timing breakdown (for /ready)
+
+        Returns:
+            dict: Status (ready, warming_up, failed or draining), per-step seconds, results and errors
+        """
+        if self.ready:
+            status = "ready"
+        elif self.draining:
+            status = "draining"
+        elif self._task is None or not self._task.done():
+            status = "warming_up"
+        else:
+            status = "failed"
+        return {
+            "status": status,
+            "startup_seconds": dict(self.timings),
+            "warmup": dict(self.results),
+            "errors": dict(self.errors)
+        }
+
+
+# Global startup warm-up instance
+startup_warmup = StartupWarmup()
@@ -0,0 +1,145 @@
+"""
+Per-request stage traces
+Every response carries an X-Request-ID and a Server-Timing header splitting its time into database,
+prompt, LLM and serialization stages; sampled and slow requests also log a structured trace record
+"""
+
+import re
+import json
+import time
+import uuid
+import random
+import logging
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi.responses import JSONResponse
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# Server-Timing metric each pipeline stage is reported under; unlisted stages are database work
+STAGE_CATEGORIES = {
+    "prompt_render": "prompt",
+    "llm_call": "llm",
+    "serialize": "serialize",
+}
+CATEGORY_ORDER = ("db", "prompt", "llm", "serialize")
+
+REQUEST_ID_HEADER = "x-request-id"
+# Incoming request IDs are echoed back in a header and logged, so only plain tokens are accepted
+REQUEST_ID_PATTERN = re.compile(r"^[A-Za-z0-9._:-]{1,128}$")
+
+
+class RequestTrace:
+    """Stage timings collected while one request is handled"""
+
+    __slots__ = ("request_id", "method", "path", "started", "spans")
+
+    def __init__(self, request_id: str, method: str, path: str):
+        self.request_id = request_id
+        self.method = method
+        self.path = path
+        self.started = time.perf_counter()
+        # (stage, offset from request start, duration), both in seconds
+        self.spans: List[Tuple[str, float, float]] = []
+
+    def add(self, stage: str, started: float, duration: float) -> None:
+        self.spans.append((stage, started - self.started, duration))
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def server_timing(self) -> str:
+        """Server-Timing header value: time per stage category so far, plus the total"""
+        totals: Dict[str, float] = {}
+        for stage, _, duration in self.spans:
+            category = STAGE_CATEGORIES.get(stage, "db")
+            totals[category] = totals.get(category, 0.0) + duration
+        entries = [f"{category};dur={totals[category] * 1000:.1f}" for category in CATEGORY_ORDER if category in totals]
+        entries.append(f"total;dur={self.elapsed() * 1000:.1f}")
+        return ", ".join(entries)
+
+    def to_record(self, status_code: Optional[int]) -> Dict[str, Any]:
+        return {
+            "request_id": self.request_id,
+            "method": self.method,
+            "path": self.path,
+            "status": status_code,
+            "duration_ms": round(self.elapsed() * 1000, 1),
+            "spans": [
+                {"stage": stage, "start_ms": round(offset * 1000, 1), "duration_ms": round(duration * 1000, 1)}
+                for stage, offset, duration in self.spans
+            ]
+        }
+
+
+current_trace: ContextVar[Optional[RequestTrace]] = ContextVar("current_trace", default=None)
+
+
+def record_span(stage: str, started: float, duration: float) -> None:
+    """Add a finished stage to the current request's trace, if there is one"""
+    trace = current_trace.get()
+    if trace is not None:
+        trace.add(stage, started, duration)
+
+
+class TimedJSONResponse(JSONResponse):
+    """JSONResponse that records rendering the body as the serialize stage"""
+
+    def render(self, content: Any) -> bytes:
+        started = time.perf_counter()
+        try:
+            return super().render(content)
+        finally:
+            record_span("serialize", started, time.perf_counter() - started)
+
+
+class RequestTraceMiddleware:
+    """
+    ASGI middleware that starts a trace per HTTP request, adds X-Request-ID and Server-Timing to the response
+    and logs the trace for sampled (trace_sample_rate) or slow (trace_slow_request_seconds) requests.
+    An incoming X-Request-ID (e.g. from the Node server) is reused so both sides log the same ID.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for name, value in scope.get("headers", []):
+            if name == REQUEST_ID_HEADER.encode():
+                value = value.decode("latin-1")
+                if REQUEST_ID_PATTERN.match(value):
+                    request_id = value
+                break
+        trace = RequestTrace(request_id or uuid.uuid4().hex, scope.get("method", ""), scope.get("path", ""))
+        current_trace.set(trace)
+        status_code = None
+
+        async def send_with_headers(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                headers = list(message.get("headers", []))
+                headers.append((b"x-request-id", trace.request_id.encode("latin-1")))
+                if settings.server_timing_enabled:
+                    # Streamed responses only include the stages finished before the first byte
+                    headers.append((b"server-timing", trace.server_timing().encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_headers)
+        finally:
+            # Log the route template rather than the raw path, which carries patient IDs
+            route = scope.get("route")
+            if route is not None:
+                trace.path = getattr(route, "path_format", trace.path)
+            if trace.elapsed() >= settings.trace_slow_request_seconds or random.random() < settings.trace_sample_rate:
+                logger.info("[TRACE] %s", json.dumps(trace.to_record(status_code)))
@@ -0,0 +1,11 @@
+import os
+import sys
+
+# Settings are read on import; the unit tests don't connect to anything
+os.environ.setdefault("MONGODB_URL", "mongodb://localhost:27017")
+os.environ.setdefault("MONGODB_DATABASE", "kay_test")
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+ROOT_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_PATH not in sys.path:
+    sys.path.insert(0, ROOT_PATH)
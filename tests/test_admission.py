@@ -0,0 +1,89 @@
+import asyncio
+
+import pytest
+
+from services.admission import AdmissionController, AdmissionRejected, retry_after_header
+from services.deadline import Deadline
+
+
+def make_controller(**overrides) -> AdmissionController:
+    options = dict(name="llm_test", max_concurrent=1, max_queue=1, max_wait_seconds=1.0)
+    options.update(overrides)
+    return AdmissionController(**options)
+
+
+def test_admits_up_to_max_concurrent():
+    async def scenario():
+        controller = make_controller(max_concurrent=2)
+        first = await controller.acquire()
+        second = await controller.acquire()
+        assert controller.in_flight == 2
+        first.release()
+        second.release()
+        # Releasing twice doesn't free a second slot
+        second.release()
+        assert controller.in_flight == 0
+        assert controller.admitted == 2
+
+    asyncio.run(scenario())
+
+
+def test_rejects_when_queue_is_full():
+    async def scenario():
+        controller = make_controller()
+        permit = await controller.acquire()
+        waiter = asyncio.create_task(controller.acquire())
+        await asyncio.sleep(0)
+        assert controller.waiting == 1
+
+        with pytest.raises(AdmissionRejected) as rejected:
+            await controller.acquire()
+        assert rejected.value.reason == "queue_full"
+        assert controller.rejected["queue_full"] == 1
+
+        # The queued request gets the slot once it frees up
+        permit.release()
+        (await waiter).release()
+        assert controller.in_flight == 0
+
+    asyncio.run(scenario())
+
+
+def test_rejects_after_wait_timeout():
+    async def scenario():
+        controller = make_controller(max_wait_seconds=0.05)
+        permit = await controller.acquire()
+        with pytest.raises(AdmissionRejected) as rejected:
+            await controller.acquire()
+        assert rejected.value.reason == "wait_timeout"
+        assert controller.waiting == 0
+        permit.release()
+
+    asyncio.run(scenario())
+
+
+def test_wait_never_runs_past_the_deadline():
+    async def scenario():
+        controller = make_controller(max_wait_seconds=10.0)
+        async with controller.slot():
+            started = asyncio.get_running_loop().time()
+            with pytest.raises(AdmissionRejected):
+                await controller.acquire(Deadline(0.05))
+            assert asyncio.get_running_loop().time() - started < 1.0
+        assert controller.in_flight == 0
+
+    asyncio.run(scenario())
+
+
+def test_retry_after_header_is_whole_seconds():
+    controller = make_controller(max_concurrent=2)
+    controller._hold_seconds = 3.0
+    controller.waiting = 2
+    error = AdmissionRejected(controller.name, "queue_full", controller.retry_after())
+    assert error.retry_after == 4.5
+    assert retry_after_header(error) == {"Retry-After": "5"}
+
+    # Never suggests retrying in under a second
+    controller._hold_seconds = 0.01
+    controller.waiting = 0
+    assert controller.retry_after() == 1.0
@@ -0,0 +1,130 @@
+import time
+
+from services.circuit_breaker import CircuitBreaker, CLOSED, OPEN, HALF_OPEN
+
+
+def make_breaker(**overrides) -> CircuitBreaker:
+    options = dict(
+        name="llm_test",
+        window_seconds=60.0,
+        min_calls=4,
+        error_rate_threshold=0.5,
+        slow_call_seconds=10.0,
+        slow_rate_threshold=0.5,
+        open_seconds=30.0,
+        half_open_probes=2
+    )
+    options.update(overrides)
+    return CircuitBreaker(**options)
+
+
+def open_breaker(breaker: CircuitBreaker) -> None:
+    for _ in range(breaker.min_calls):
+        breaker.record_failure(breaker.allow_request())
+    assert breaker.state == OPEN
+
+
+def end_cool_down(breaker: CircuitBreaker) -> None:
+    breaker._opened_at = time.monotonic() - breaker.open_seconds
+
+
+def test_stays_closed_below_min_calls():
+    breaker = make_breaker()
+    for _ in range(breaker.min_calls - 1):
+        breaker.record_failure(breaker.allow_request())
+    assert breaker.state == CLOSED
+
+
+def test_opens_on_error_rate_and_rejects():
+    breaker = make_breaker()
+    breaker.record_success(breaker.allow_request(), 0.1)
+    breaker.record_success(breaker.allow_request(), 0.1)
+    breaker.record_failure(breaker.allow_request())
+    assert breaker.state == CLOSED
+    breaker.record_failure(breaker.allow_request())
+    assert breaker.state == OPEN
+
+    assert breaker.allow_request() is None
+    assert breaker.rejected == 1
+    assert 0 < breaker.retry_after() <= breaker.open_seconds
+
+
+def test_opens_on_slow_call_rate():
+    breaker = make_breaker()
+    for _ in range(breaker.min_calls):
+        breaker.record_success(breaker.allow_request(), 12.0)
+    assert breaker.state == OPEN
+
+
+def test_half_open_limits_probes_and_closes_after_successes():
+    breaker = make_breaker()
+    open_breaker(breaker)
+    end_cool_down(breaker)
+
+    first = breaker.allow_request()
+    assert breaker.state == HALF_OPEN
+    second = breaker.allow_request()
+    assert first is not None and second is not None
+    assert breaker.allow_request() is None
+
+    breaker.record_success(first, 0.1)
+    assert breaker.state == HALF_OPEN
+    breaker.record_success(second, 0.1)
+    assert breaker.state == CLOSED
+
+
+def test_failed_or_slow_probe_reopens():
+    breaker = make_breaker()
+    open_breaker(breaker)
+    end_cool_down(breaker)
+    breaker.record_failure(breaker.allow_request())
+    assert breaker.state == OPEN
+
+    end_cool_down(breaker)
+    breaker.record_success(breaker.allow_request(), 12.0)
+    assert breaker.state == OPEN
+
+
+def test_cancelled_probe_frees_its_slot():
+    breaker = make_breaker(half_open_probes=1)
+    open_breaker(breaker)
+    end_cool_down(breaker)
+    probe = breaker.allow_request()
+    assert breaker.allow_request() is None
+    breaker.record_cancelled(probe)
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow_request() is not None
+
+
+def test_calls_from_an_earlier_state_are_not_probes():
+    breaker = make_breaker()
+    # Calls that start while closed and are still running when the breaker opens
+    stragglers = [breaker.allow_request() for _ in range(3)]
+    open_breaker(breaker)
+    end_cool_down(breaker)
+
+    probe = breaker.allow_request()
+    assert breaker.state == HALF_OPEN
+
+    # Their results neither free probe slots nor count as probe successes
+    for generation in stragglers:
+        breaker.record_success(generation, 0.1)
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow_request() is not None
+    assert breaker.allow_request() is None
+
+    breaker.record_failure(stragglers[0])
+    assert breaker.state == HALF_OPEN
+    breaker.record_success(probe, 0.1)
+    assert breaker.state == HALF_OPEN
+
+
+def test_closing_starts_a_clean_window():
+    breaker = make_breaker(half_open_probes=1)
+    open_breaker(breaker)
+    end_cool_down(breaker)
+    breaker.record_success(breaker.allow_request(), 0.1)
+    assert breaker.state == CLOSED
+    assert breaker.get_stats()["window_calls"] == 0
+    breaker.record_failure(breaker.allow_request())
+    assert breaker.state == CLOSED
@@ -0,0 +1,70 @@
+import asyncio
+
+import pytest
+
+from services.patient_lock import PatientSerializer, PatientBusy
+
+
+def test_turns_for_one_patient_run_one_at_a_time():
+    async def scenario():
+        serializer = PatientSerializer(wait_seconds=1.0, lock_ttl_seconds=5.0)
+        running, overlaps = set(), []
+
+        async def turn(name: str) -> str:
+            overlaps.append(bool(running))
+            running.add(name)
+            await asyncio.sleep(0.01)
+            running.discard(name)
+            return name
+
+        results = await asyncio.gather(*(
+            serializer.run("p1", f"message {i}", lambda i=i: turn(f"turn {i}")) for i in range(3)
+        ))
+        assert results == ["turn 0", "turn 1", "turn 2"]
+        assert overlaps == [False, False, False]
+        assert serializer.serialized == 2
+        assert serializer.get_stats()["locked_patients"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_identical_in_flight_messages_share_one_turn():
+    async def scenario():
+        serializer = PatientSerializer(wait_seconds=1.0, lock_ttl_seconds=5.0)
+        calls = []
+
+        async def turn() -> str:
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return "reply"
+
+        results = await asyncio.gather(*(serializer.run("p1", "hello", turn) for _ in range(3)))
+        assert results == ["reply"] * 3
+        assert len(calls) == 1
+        assert serializer.coalesced == 2
+
+        # Once it has finished, the same message runs again
+        assert await serializer.run("p1", "hello", turn) == "reply"
+        assert len(calls) == 2
+
+    asyncio.run(scenario())
+
+
+def test_busy_after_wait_budget():
+    async def scenario():
+        serializer = PatientSerializer(wait_seconds=0.05, lock_ttl_seconds=5.0)
+        held = await serializer.acquire("p1")
+        with pytest.raises(PatientBusy):
+            await serializer.acquire("p1")
+        # Other patients aren't blocked
+        other = await serializer.acquire("p2")
+        await other.release()
+
+        await held.release()
+        await held.release()
+        again = await serializer.acquire("p1")
+        await again.release()
+        assert serializer.busy == 1
+        assert serializer.get_stats()["locked_patients"] == 0
+
+    asyncio.run(scenario())
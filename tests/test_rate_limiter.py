@@ -0,0 +1,196 @@
+import asyncio
+
+import pytest
+
+from config import settings
+from services.rate_limiter import RateLimiter, RateLimitDecision, RateLimitExceeded, TOKEN_BUCKET_SCRIPT
+
+
+@pytest.fixture(autouse=True)
+def limits(monkeypatch):
+    monkeypatch.setattr(settings, "rate_limit_key_per_minute", 60)
+    monkeypatch.setattr(settings, "rate_limit_key_burst", 5)
+    monkeypatch.setattr(settings, "rate_limit_key_overrides", {"tools": {"per_minute": 60, "burst": 1}})
+    monkeypatch.setattr(settings, "rate_limit_patient_per_minute", 60)
+    monkeypatch.setattr(settings, "rate_limit_patient_burst", 2)
+    monkeypatch.setattr(settings, "rate_limit_summary_per_minute", 60)
+    monkeypatch.setattr(settings, "rate_limit_summary_burst", 3)
+    monkeypatch.setattr(settings, "rate_limit_bulk_per_minute", 1000)
+    monkeypatch.setattr(settings, "rate_limit_bulk_burst", 500)
+
+
+def redis_limiter(server) -> RateLimiter:
+    fakeredis = pytest.importorskip("fakeredis")
+    limiter = RateLimiter("redis://rate-limit-test")
+    limiter._redis = fakeredis.FakeAsyncRedis(server=server)
+    limiter._script = limiter._redis.register_script(TOKEN_BUCKET_SCRIPT)
+    return limiter
+
+
+def local_limiter() -> RateLimiter:
+    return RateLimiter()
+
+
+def backdate_local(limiter: RateLimiter, key: str, seconds: float) -> None:
+    tokens, updated, full_at = limiter._buckets[key]
+    limiter._buckets[key] = (tokens, updated - seconds, full_at - seconds)
+
+
+def test_decision_headers():
+    allowed = RateLimitDecision("patient", True, capacity=5, tokens=3.5, per_second=1.0)
+    assert allowed.headers() == {"RateLimit-Limit": "5", "RateLimit-Remaining": "3", "RateLimit-Reset": "2"}
+
+    limited = RateLimitDecision("patient", False, capacity=5, tokens=0.25, per_second=0.5)
+    assert limited.retry_after == 1.5
+    assert limited.headers()["Retry-After"] == "2"
+    assert limited.headers()["RateLimit-Remaining"] == "0"
+
+
+def test_patient_bucket_rejects_after_burst():
+    async def scenario():
+        limiter = local_limiter()
+        remaining = [(await limiter.check("default", "p1")).remaining for _ in range(2)]
+        assert remaining == [1, 0]
+        with pytest.raises(RateLimitExceeded) as limited:
+            await limiter.check("default", "p1")
+        assert limited.value.decision.scope == "patient"
+        assert 0 < limited.value.decision.retry_after <= 1.0
+        # Other patients have their own buckets
+        await limiter.check("default", "p2")
+        assert limiter.limited["patient"] == 1
+
+    asyncio.run(scenario())
+
+
+def test_local_bucket_refills():
+    async def scenario():
+        limiter = local_limiter()
+        for _ in range(2):
+            await limiter.check("default", "p1")
+        backdate_local(limiter, "patient:p1", 1.0)
+        assert (await limiter.check("default", "p1")).remaining == 0
+        with pytest.raises(RateLimitExceeded):
+            await limiter.check("default", "p1")
+
+        # Never refills past the burst size
+        backdate_local(limiter, "patient:p1", 3600.0)
+        assert (await limiter.check("default", "p1")).remaining == 1
+
+    asyncio.run(scenario())
+
+
+def test_rejected_request_takes_no_token_from_other_bucket():
+    async def scenario():
+        limiter = local_limiter()
+        for _ in range(2):
+            await limiter.check("default", "p1")
+        for _ in range(3):
+            with pytest.raises(RateLimitExceeded):
+                await limiter.check("default", "p1")
+        # Only the two allowed requests were charged to the key
+        assert limiter._buckets["api_key:default"][0] == pytest.approx(3, abs=0.01)
+
+        with pytest.raises(RateLimitExceeded) as limited:
+            await limiter.check("tools", "p3")
+            await limiter.check("tools", "p3")
+        assert limited.value.decision.scope == "api_key"
+        assert limiter._buckets["patient:p3"][0] == pytest.approx(1, abs=0.01)
+
+    asyncio.run(scenario())
+
+
+def test_summary_bucket_is_separate_from_kay_bucket():
+    async def scenario():
+        limiter = local_limiter()
+        for _ in range(3):
+            await limiter.check("default", "p1", "summary")
+        with pytest.raises(RateLimitExceeded) as limited:
+            await limiter.check("default", "p1", "summary")
+        assert limited.value.decision.scope == "summary"
+        assert (await limiter.check("default", "p1")).remaining == 1
+
+    asyncio.run(scenario())
+
+
+@pytest.mark.parametrize("backend", ["local", "redis"])
+def test_bulk_request_charges_per_patient(backend):
+    if backend == "redis":
+        fakeredis = pytest.importorskip("fakeredis")
+
+    async def scenario():
+        limiter = local_limiter() if backend == "local" else redis_limiter(fakeredis.FakeServer())
+        # A 500-patient request uses up the whole bulk budget, though it is one request for the key
+        assert (await limiter.check("default", bulk_patients=500)).remaining == 0
+        with pytest.raises(RateLimitExceeded) as limited:
+            await limiter.check("default", bulk_patients=1)
+        assert limited.value.decision.scope == "bulk"
+        assert limited.value.decision.retry_after > 0
+
+        # Waiting for a token covers a one-patient request, not a 100-patient one
+        if backend == "local":
+            backdate_local(limiter, "bulk:default", 0.1)
+        else:
+            ts = float(await limiter._redis.hget("kay:ratelimit:bulk:default", "ts"))
+            await limiter._redis.hset("kay:ratelimit:bulk:default", "ts", str(ts - 0.1))
+        with pytest.raises(RateLimitExceeded) as limited:
+            await limiter.check("default", bulk_patients=100)
+        assert limited.value.decision.retry_after == pytest.approx(98.3 * 60 / 1000, abs=0.1)
+        await limiter.check("default", bulk_patients=1)
+        assert limiter.limited["bulk"] == 2
+
+    asyncio.run(scenario())
+
+
+def test_key_override():
+    async def scenario():
+        limiter = local_limiter()
+        decision = await limiter.check("tools")
+        assert (decision.limit, decision.remaining) == (1, 0)
+        with pytest.raises(RateLimitExceeded):
+            await limiter.check("tools")
+        assert (await limiter.check("default")).limit == 5
+
+    asyncio.run(scenario())
+
+
+def test_redis_buckets_are_shared_between_limiters():
+    fakeredis = pytest.importorskip("fakeredis")
+
+    async def scenario():
+        server = fakeredis.FakeServer()
+        first, second = redis_limiter(server), redis_limiter(server)
+        assert (await first.check("default", "p1")).remaining == 1
+        assert (await second.check("default", "p1")).remaining == 0
+        with pytest.raises(RateLimitExceeded) as limited:
+            await first.check("default", "p1")
+        assert limited.value.decision.scope == "patient"
+        assert first.redis_errors == 0
+
+        # The rejected request left the key bucket alone
+        tokens = await first._redis.hget("kay:ratelimit:api_key:default", "tokens")
+        assert float(tokens) == pytest.approx(3, abs=0.01)
+
+        # Refill is computed from the stored timestamp
+        ts = float(await first._redis.hget("kay:ratelimit:patient:p1", "ts"))
+        await first._redis.hset("kay:ratelimit:patient:p1", "ts", str(ts - 1.0))
+        assert (await second.check("default", "p1")).remaining == 0
+
+    asyncio.run(scenario())
+
+
+def test_redis_errors_fall_back_to_local_buckets():
+    async def scenario():
+        limiter = RateLimiter("redis://127.0.0.1:1/0")
+
+        class Unreachable:
+            async def __call__(self, keys, args):
+                raise ConnectionError("connection refused")
+
+        limiter._script = Unreachable()
+        for _ in range(2):
+            await limiter.check("default", "p1")
+        with pytest.raises(RateLimitExceeded):
+            await limiter.check("default", "p1")
+        assert limiter.redis_errors == 3
+
+    asyncio.run(scenario())
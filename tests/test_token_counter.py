@@ -0,0 +1,44 @@
+import sys
+import time
+import types
+import threading
+
+from services.context_builder import TokenCounter
+
+
+class FakeEncoding:
+    def encode(self, text, disallowed_special=()):
+        return text.split()
+
+    def decode(self, tokens):
+        return " ".join(tokens)
+
+
+def test_count_waits_for_encoding_loading_in_another_thread(monkeypatch):
+    loading = threading.Event()
+
+    def get_encoding(name):
+        loading.set()
+        time.sleep(0.2)
+        return FakeEncoding()
+
+    monkeypatch.setitem(sys.modules, "tiktoken", types.SimpleNamespace(get_encoding=get_encoding))
+    counter = TokenCounter("test")
+    warm_up = threading.Thread(target=counter._load)
+    warm_up.start()
+    loading.wait()
+
+    # Counted with the encoding, not the length estimate (which would be 5)
+    assert counter.count("one two three four five six") == 6
+    assert counter.exact
+    warm_up.join()
+
+
+def test_unavailable_encoding_falls_back_to_estimate(monkeypatch):
+    def get_encoding(name):
+        raise OSError("offline")
+
+    monkeypatch.setitem(sys.modules, "tiktoken", types.SimpleNamespace(get_encoding=get_encoding))
+    counter = TokenCounter("test")
+    assert counter.count("12345678") == 2
+    assert not counter.exact
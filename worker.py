@@ -0,0 +1,214 @@
+"""
+Job worker: processes the Kay bot and summary jobs queued through /agent/jobs (see services/job_queue.py)
+
+Run one or more alongside the API with JOB_QUEUE_ENABLED=true:
+    python worker.py
+"""
+
+import sys
+import os
+import signal
+import socket
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict
+
+# Add project root to path for imports
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+# Configure logging to show in terminal (before the services log their startup lines)
+from services.log_pipeline import configure_logging
+configure_logging()
+
+from bson.errors import InvalidId
+from pydantic import ValidationError
+from models.database_models import connect_to_mongo, close_mongo_connection, provision_database
+from models.pydantic_models import KayBotPayload
+from services.agent_service import agent_service, llm_service, memory_service
+from services.db_service import DatabaseService, chat_write_queue
+from services.cache_invalidation import cache_invalidation
+from services.prompt_weights import prompt_weights
+from services.job_queue import job_queue, JobDeferred
+from services.circuit_breaker import CircuitOpenError
+from services.admission import AdmissionRejected
+from services.patient_lock import patient_serializer, PatientBusy
+from services.metrics import current_endpoint
+from config import settings
+from prometheus_client import start_http_server
+
+logger = logging.getLogger("worker")
+
+
+async def run_kay_bot_job(job: Dict[str, Any]) -> Dict[str, Any]:
+    payload = KayBotPayload(**job["payload"])
+    job_id = str(job["_id"])
+
+    # The chat is saved under the job ID, so a retry after the reply was saved returns it instead of saving twice
+    if job["attempts"] > 1:
+        saved = await DatabaseService.get_chat_message(job_id)
+        if saved is not None:
+            return {"response": saved["response"], "patient_id": saved["patient_id"], "chat_saved": True, "chat_id": job_id}
+
+    return await patient_serializer.run(
+        payload.patient_id, payload.message, lambda: agent_service.run_kay_bot(payload, chat_id=job_id)
+    )
+
+
+async def run_kay_regenerate_job(job: Dict[str, Any]) -> Dict[str, Any]:
+    payload = KayBotPayload(**job["payload"])
+    try:
+        patient_lock = await patient_serializer.acquire(payload.patient_id)
+        try:
+            return await agent_service.regenerate_kay_reply(payload, job["payload"]["chat_id"])
+        finally:
+            await patient_lock.release()
+    except CircuitOpenError as e:
+        # Wait out the outage without using up the job's attempts
+        raise JobDeferred(str(e), max(e.retry_after, job_queue.poll_interval))
+
+
+async def run_checkin_summary_job(job: Dict[str, Any]) -> Dict[str, Any]:
+    result = await agent_service.summarize_checkin(job["payload"]["patient_id"], force=job["payload"].get("force", False))
+    if result["status"] == "failed":
+        raise RuntimeError(f"Summary generation failed for patient {result['patient_id']}")
+    return result
+
+
+async def run_bulk_summary_job(job: Dict[str, Any]) -> Dict[str, Any]:
+    response = await agent_service.summarize_checkins_bulk(
+        job["payload"]["patient_ids"], force=job["payload"].get("force", False)
+    )
+    return response.model_dump()
+
+
+JOB_HANDLERS: Dict[str, Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]]] = {
+    "kay_bot": run_kay_bot_job,
+    "checkin_summary": run_checkin_summary_job,
+    "bulk_summary": run_bulk_summary_job,
+    "kay_regenerate": run_kay_regenerate_job,
+}
+
+
+class Worker:
+    """Claims jobs from the queue and runs up to `concurrency` of them at a time"""
+
+    def __init__(self, concurrency: int):
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self.concurrency = concurrency
+        self._stopping = asyncio.Event()
+        self.succeeded = 0
+        self.failed = 0
+
+    def stop(self) -> None:
+        """Stop claiming new jobs; jobs already running are finished"""
+        logger.info("[WORKER] %s stopping after in-flight jobs", self.worker_id)
+        self._stopping.set()
+
+    async def run(self) -> None:
+        logger.info("[WORKER] %s processing jobs with concurrency %s", self.worker_id, self.concurrency)
+        await asyncio.gather(*(self._slot() for _ in range(self.concurrency)))
+        logger.info("[WORKER] %s stopped: %s succeeded, %s failed", self.worker_id, self.succeeded, self.failed)
+
+    async def _slot(self) -> None:
+        while not self._stopping.is_set():
+            try:
+                job = await job_queue.claim(self.worker_id)
+            except Exception as e:
+                logger.error(f"[WORKER] Error claiming a job: {e}")
+                job = None
+
+            if job is None:
+                # Idle: wait for the next poll, waking early on shutdown
+                try:
+                    await asyncio.wait_for(self._stopping.wait(), timeout=job_queue.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            try:
+                await self._process(job)
+            except Exception as e:
+                # e.g. the database went away while recording the outcome; the job is retried once its lease expires
+                logger.error(f"[WORKER] Error processing job {job['_id']}: {e}")
+
+    async def _process(self, job: Dict[str, Any]) -> None:
+        logger.info("[WORKER] Running %s job %s (attempt %d)", job['type'], job['_id'], job['attempts'])
+        current_endpoint.set(f"job:{job['type']}")
+        heartbeat = asyncio.create_task(self._heartbeat(job))
+        try:
+            handler = JOB_HANDLERS.get(job["type"])
+            if handler is None:
+                raise ValueError(f"Unknown job type {job['type']!r}")
+            result = await handler(job)
+        except JobDeferred as e:
+            await job_queue.defer(job, e.delay_seconds, str(e))
+        except AdmissionRejected as e:
+            # This worker is saturated; let the job wait instead of counting a failed attempt
+            await job_queue.defer(job, e.retry_after, str(e))
+        except PatientBusy as e:
+            # The patient's previous turn is still running elsewhere
+            await job_queue.defer(job, job_queue.poll_interval, str(e))
+        except (ValidationError, InvalidId, ValueError) as e:
+            # A bad payload fails the same way on every attempt
+            self.failed += 1
+            await job_queue.fail(job, f"Invalid job: {e}", retry=False)
+        except Exception as e:
+            self.failed += 1
+            await job_queue.fail(job, str(e))
+        else:
+            if await job_queue.complete(job, result):
+                self.succeeded += 1
+            else:
+                logger.warning(f"[WORKER] Lease on job {job['_id']} was lost, result discarded")
+        finally:
+            heartbeat.cancel()
+
+    async def _heartbeat(self, job: Dict[str, Any]) -> None:
+        """Renew the job's lease while it runs so slow LLM calls aren't picked up by another worker"""
+        while True:
+            await asyncio.sleep(job_queue.lease_seconds / 3)
+            try:
+                if not await job_queue.extend_lease(job):
+                    logger.warning(f"[WORKER] Lost the lease on job {job['_id']}")
+                    return
+            except Exception as e:
+                logger.warning(f"[WORKER] Error renewing the lease on job {job['_id']}: {e}")
+
+
+async def main() -> None:
+    await connect_to_mongo(provision=False)
+    try:
+        await provision_database()
+    except RuntimeError as e:
+        # mongodb_verify_query_plans="fail": don't run jobs on collection scans
+        logger.error(f"[WORKER] Not starting: {e}")
+        await close_mongo_connection()
+        raise SystemExit(1)
+    # Load the tokenizer before claiming jobs (it reads the BPE file and builds the encoder)
+    await asyncio.to_thread(llm_service.warm_prompts)
+    if settings.chat_write_behind:
+        await chat_write_queue.start()
+    await cache_invalidation.start()
+    await prompt_weights.start()
+
+    if settings.worker_metrics_port:
+        start_http_server(settings.worker_metrics_port)
+
+    worker = Worker(settings.job_worker_concurrency)
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, worker.stop)
+
+    try:
+        await worker.run()
+    finally:
+        await memory_service.wait_idle()
+        await llm_service.flush_cassette()
+        await chat_write_queue.stop()
+        await cache_invalidation.stop()
+        await prompt_weights.stop()
+        await close_mongo_connection()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())